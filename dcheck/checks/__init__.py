@@ -2,12 +2,23 @@
 DFSG Checklists for DCheck
 '''
 # Python
+import getpass
 import importlib
 import inspect
+import os
+import pathlib
 
 # DCheck
+import dcheck.checks.approvals
+import dcheck.checks.artifacts
+import dcheck.checks.cache
+import dcheck.checks.scan
 import dcheck.core.config
 import dcheck.core.data
+import dcheck.core.manifest
+import dcheck.core.reviews
+import dcheck.core.revisions
+import dcheck.core.vfs
 
 from dcheck.i18n import t
 
@@ -15,6 +26,20 @@ from dcheck.i18n import t
 loaded_checklists = {}
 
 
+def reviewer() -> str:
+    '''
+    Return the name recorded with reviews; the configured reviewer, else
+    DEBEMAIL, else the login name.
+    '''
+    name = dcheck.core.config.get('reviewer') or os.environ.get('DEBEMAIL')
+    if name:
+        return name
+    try:
+        return getpass.getuser()
+    except (KeyError, OSError):
+        return 'unknown'
+
+
 def load_checklists():
     '''
     Load configured checklists.
@@ -38,6 +63,7 @@ def load_checklists():
         for name, check in inspect.getmembers(module, inspect.isclass):
             collection = getattr(check, 'collection', '')
             if collection in ['package', 'file'] and getattr(check, 'title'):
+                check.id = f'{checklist}.{name}'
                 loaded_checklists[checklist][collection][name] = {
                     'title': t(check.title),
                     'priority': check.priority,
@@ -70,21 +96,52 @@ def collect(target):
     return checks
 
 
+def get_check(check_id):
+    '''
+    Return the check class of a given id (<checklist>.<class>).
+    '''
+    checklist, name = check_id.split('.')
+    return getattr(importlib.import_module('.' + checklist, __name__), name)
+
+
 class PackageCheck:
     '''
     Standard template for a package check function.
     '''
     collection = 'package'
+    id = None  # <checklist>.<class>; set by load_checklists()
+    version = 1  # Increase when changes may alter results of run_check()
     title = None
     status = None
     priority = 500
     allow_auto = False
     package_name = None
+    timeout = None  # Seconds allowed per run_check() (default: check_timeout)
+    requires = ()  # Artifacts used by run_check(), see checks.artifacts
+    provides = ()  # Artifacts recorded by run_check() with provide()
+    artifacts = None  # Required artifacts, when computed by the runner
 
     def __init__(self, workspace):
-        # TODO: Get package hash from workspace
-        # package_name = dcheck.core.inspect.workspace_info(workspace).package
-        pass
+        self.workspace = workspace
+        self.package_name = pathlib.Path(workspace).name
+        self.package_hash = dcheck.core.revisions.package_hash(workspace)
+        self.provided = {}
+
+    def artifact(self, name):
+        '''
+        Returns a required artifact of the workspace.
+        '''
+        if self.artifacts is None:
+            return dcheck.checks.artifacts.resolve(self.workspace, name)
+        return self.artifacts[name]
+
+    def provide(self, name, value):
+        '''
+        Record an artifact for other checks; only listed in provides.
+        '''
+        if name not in self.provides:
+            raise KeyError(f'{self.id} does not provide {name}')
+        self.provided[name] = value
 
     def uuid(self):
         '''
@@ -96,31 +153,40 @@ class PackageCheck:
         '''
         Record outcome of review.
         '''
-        # TODO
-        USERNAME = 'FakeTestUser'
-
         if outcome == 'approve':
             outcome = True
         elif outcome == 'reject':
             outcome = False
         if not isinstance(outcome, bool):
             raise Exception('Invalid review outcome; bailing!')
-        dcheck.core.data.set(f'review/{self.uuid()}/){USERNAME}', outcome)
+        self.store_review(outcome)
         self.status = outcome
 
+    def store_review(self, outcome):
+        '''
+        Write a (validated) review outcome to the data engine.
+        '''
+        dcheck.core.data.set(f'review/{self.uuid()}/{reviewer()}', outcome)
+
     def run_check(self):
         '''
         Returns True if check passes, False if it fails, or None on failure.
         '''
         return None
 
+    def result(self):
+        '''
+        Returns the outcome of run_check().
+        '''
+        return self.run_check()
+
     def auto_accept(self):
         '''
         Run check and automatically mark accepted if check passes.
         '''
         if not self.allow_auto:
             return None
-        if self.run_check():
+        if self.result():
             self.save_review('approve-auto')
 
 
@@ -131,12 +197,92 @@ class FileCheck(PackageCheck):
     collection = 'file'
     filename = None
     filehash = None
-
-    def __init__(self, workspace):
-        pass
+    cacheable = True  # Result only depends on file contents (see result())
+    streaming = False  # Receive contents with feed() (see dcheck.checks.scan)
+    data = None  # Contents of the current file, shared during a scan
 
     def change_file(self, filename):
         '''
         Refresh check for a given filename
         '''
-        pass
+        self.filename = filename
+        manifest = dcheck.core.manifest.get_manifest(self.workspace)
+        info = manifest.get(filename) if manifest else None
+        self.filehash = info.sha256 if info else None
+
+    def uuid(self):
+        '''
+        Returns a unique string for a given package name / check id / file.
+        '''
+        return f'{self.package_hash}/{self.id}/{self.filename}'
+
+    def read(self):
+        '''
+        Returns contents (bytes-like) of the current file. Contents may be
+        mapped and only valid until the next file; keep slices (copies), not
+        views (see dcheck.checks.scan).
+        '''
+        if self.data is not None:
+            return self.data
+        return dcheck.core.vfs.get_workspace(self.workspace).read(
+                self.filename)
+
+    def lines(self):
+        '''
+        Returns an iterator over lines (bytes) of the current file.
+        '''
+        return dcheck.checks.scan.lines(self.read())
+
+    def store_review(self, outcome):
+        '''
+        Write a review outcome to the review state of the package (see
+        dcheck.core.reviews), and remember it for files with identical
+        contents (see dcheck.checks.approvals).
+        '''
+        name = reviewer()
+        dcheck.core.reviews.record(
+                self.workspace, self.id, self.filename, name, outcome)
+        dcheck.checks.approvals.record(self, self.filehash, outcome, name)
+
+    def start(self):
+        '''
+        Prepare a streaming check for a new file.
+        '''
+
+    def feed(self, chunk):
+        '''
+        Receive the next chunk of the current file (streaming checks).
+        '''
+
+    def finish(self):
+        '''
+        Returns the outcome of a streaming check once the file was fed.
+        '''
+        return None
+
+    def run_check(self):
+        '''
+        Returns True if check passes, False if it fails, or None on failure.
+
+        Streaming checks are fed the current file in chunks.
+        '''
+        if not self.streaming:
+            return None
+        self.start()
+        for chunk in dcheck.checks.scan.chunks(self.read()):
+            self.feed(chunk)
+        return self.finish()
+
+    def result(self):
+        '''
+        Returns the outcome of run_check(), reusing the result of a file with
+        identical contents (see dcheck.checks.cache).
+        '''
+        if not self.filehash:
+            return self.run_check()
+        if (result := dcheck.checks.cache.lookup(self, self.filehash)) \
+                is not None:
+            return result
+        result = self.run_check()
+        dcheck.checks.cache.store(self, self.filehash, result)
+        return result
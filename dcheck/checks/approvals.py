@@ -0,0 +1,132 @@
+'''
+DCheck Approval Index
+
+Remember approvals of file checks by file content, so a file approved once
+(such as a license text or a vendored library) is approved in every package
+which ships it. Only checks whose results depend on nothing but file
+contents (cacheable) are indexed.
+
+Reused approvals are recorded at ingest under a reviewer naming where they
+came from (see auto_reviewer()), never under the original reviewer.
+'''
+# Python
+import collections
+import pathlib
+
+# DCheck
+import dcheck.checks
+import dcheck.core.config
+import dcheck.core.data
+import dcheck.core.manifest
+import dcheck.core.reviews
+import dcheck.core.revisions
+
+
+def approval_key(check, sha256) -> str:
+    '''
+    Return the data key used for a check (class or instance) and file hash.
+    '''
+    return f'approved/{check.id}/{sha256}'
+
+
+def auto_reviewer(approval) -> str:
+    '''
+    Return the reviewer recorded for a reused approval.
+    '''
+    return f'auto:{approval["reviewer"]}@{approval["package"]}'
+
+
+def enabled(check) -> bool:
+    '''
+    Check if approvals of a given check may be reused.
+    '''
+    return bool(dcheck.core.config.get('approval_reuse') and check.cacheable
+                and check.id)
+
+
+def record(check, sha256, outcome, reviewer):
+    '''
+    Remember the review outcome of a check for a file hash; a rejection
+    forgets an earlier approval.
+    '''
+    if not sha256 or not enabled(check):
+        return
+    if outcome:
+        dcheck.core.data.set(approval_key(check, sha256), {
+                'reviewer': reviewer, 'package': check.package_name,
+                'path': check.filename})
+    else:
+        dcheck.core.data.delete(approval_key(check, sha256))
+
+
+def lookup_many(check, digests) -> list:
+    '''
+    Return approvals of a check for many file hashes (in order), with None
+    for files which were never approved.
+    '''
+    digests = list(digests)
+    if not enabled(check) or not digests:
+        return [None] * len(digests)
+    return dcheck.core.data.get_many(approval_key(check, x) for x in digests)
+
+
+def approved_checks() -> list:
+    '''
+    Return loaded file checks whose approvals may be reused.
+    '''
+    return [
+        check for check in (
+            dcheck.checks.get_check(x)
+            for title, x in dcheck.checks.collect('file') if x)
+        if enabled(check)]
+
+
+def find_many(digests) -> dict:
+    '''
+    Return {sha256: [approval, ...]} of file hashes approved by any check,
+    looking up all approvals at once.
+    '''
+    digests = sorted(set(digests))
+    wanted = [(check, x) for check in approved_checks() for x in digests]
+    found = collections.defaultdict(list)
+    if not wanted:
+        return found
+    for (check, sha256), approval in zip(wanted, dcheck.core.data.get_many(
+            approval_key(check, sha256) for check, sha256 in wanted)):
+        if approval:
+            found[sha256].append(approval)
+    return found
+
+
+def apply(workspace) -> int:
+    '''
+    Approve file checks of a workspace for files whose contents were
+    approved before, looking up all approvals at once. Files which were
+    already reviewed are left alone. Returns the number of reviews added.
+    '''
+    workspace = pathlib.Path(workspace)
+    manifest = dcheck.core.manifest.get_manifest(workspace)
+    package_hash = dcheck.core.revisions.package_hash(workspace)
+    if manifest is None or not package_hash:
+        return 0
+    checks = approved_checks()
+    digests = sorted({x.sha256 for x in manifest})
+    wanted = [(check, sha256) for check in checks for sha256 in digests]
+    if not wanted:
+        return 0
+    approvals = dict(zip(wanted, dcheck.core.data.get_many(
+            approval_key(check, sha256) for check, sha256 in wanted)))
+
+    reviewed = {
+        (check_id, number)
+        for (check_id, reviewer), state
+        in dcheck.core.reviews.load(workspace).items()
+        for number, value in state.items()}
+    reviews = []
+    for check in checks:
+        for number, info in enumerate(manifest):
+            if (check.id, number) not in reviewed \
+                    and (approval := approvals[(check, info.sha256)]):
+                reviews.append(
+                        (check.id, info.path, auto_reviewer(approval), True))
+    return dcheck.core.reviews.record_many(workspace, reviews)
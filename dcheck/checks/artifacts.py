@@ -0,0 +1,165 @@
+'''
+DCheck Check Artifacts
+
+Intermediate data shared by checks, such as the parsed .changes file,
+d/copyright, the file manifest, or the license of each file. Checks list
+the artifacts they need in requires and those they produce (with
+provide()) in provides; the runner orders checks and producers by these as
+a graph so every artifact is only computed once per workspace (see
+dcheck.checks.runner).
+
+Artifacts are passed between processes, so values must be picklable.
+'''
+# Python
+import graphlib
+import pathlib
+import threading
+
+# DCheck
+import dcheck.checks
+import dcheck.core.deb822
+import dcheck.core.dep5
+import dcheck.core.manifest
+import dcheck.core.revisions
+import dcheck.core.vfs
+
+# Registered producers {name: (function, requires)}
+producers = {}
+
+# Computed artifacts by (workspace, package hash) (see memo())
+loaded_artifacts = {}
+loaded_artifacts_lock = threading.Lock()
+
+
+def producer(name, requires=()):
+    '''
+    Register a function(workspace, inputs) computing an artifact, where
+    inputs maps each required artifact to its value.
+    '''
+    def register(function):
+        producers[name] = (function, tuple(requires))
+        return function
+    return register
+
+
+@producer('manifest')
+def produce_manifest(workspace, inputs):
+    return dcheck.core.manifest.get_manifest(workspace) \
+        or dcheck.core.manifest.build(workspace)
+
+
+@producer('changes')
+def produce_changes(workspace, inputs):
+    for path in sorted((pathlib.Path(workspace) / 'source').glob('*.changes')):
+        with open(path, 'r', encoding='utf-8', errors='replace') as fh:
+            return dcheck.core.deb822.parse_one(fh)
+    return None
+
+
+@producer('copyright')
+def produce_copyright(workspace, inputs):
+    manifest = dcheck.core.manifest.get_manifest(workspace)
+    found = dcheck.core.dep5.source_root(manifest) if manifest else None
+    try:
+        data = dcheck.core.vfs.get_workspace(workspace).read(
+                found[1] if found else 'debian/copyright')
+    except OSError:
+        return None
+    return dcheck.core.deb822.parse(data)
+
+
+@producer('licenses')
+def produce_licenses(workspace, inputs):
+    return dcheck.core.dep5.get_licenses(workspace)
+
+
+def memo(workspace) -> dict:
+    '''
+    Return the (shared) artifacts computed for the current upload of a
+    workspace.
+    '''
+    workspace = pathlib.Path(workspace)
+    key = (workspace, dcheck.core.revisions.package_hash(workspace))
+    with loaded_artifacts_lock:
+        for other in [x for x in loaded_artifacts if x[0] == workspace]:
+            if other != key:
+                del loaded_artifacts[other]
+        return loaded_artifacts.setdefault(key, {})
+
+
+def providers(check_ids) -> dict:
+    '''
+    Return {artifact: check_id} of package checks providing artifacts.
+    '''
+    provided = {}
+    for check_id in check_ids:
+        for name in dcheck.checks.get_check(check_id).provides:
+            provided.setdefault(name, check_id)
+    return provided
+
+
+def graph(package_checks, file_checks, known=()) -> dict:
+    '''
+    Return dependencies of work for the runner as {node: {node, ...}}.
+
+    Nodes are ('check', check_id) for package checks, ('artifact', name)
+    for producers, and ('files', None) for all file checks. Artifacts in
+    known are already computed. Package checks which provide a required
+    artifact are added when missing.
+    '''
+    loaded = [x for title, x in dcheck.checks.collect('package') if x]
+    provided = providers(list(package_checks) + loaded)
+    nodes = {}
+
+    def add(node, requires):
+        deps = nodes.setdefault(node, set())
+        for name in requires:
+            if name in known:
+                continue
+            if name in provided:
+                dep = ('check', provided[name])
+                if dep not in nodes:
+                    add(dep, dcheck.checks.get_check(provided[name]).requires)
+            elif name in producers:
+                dep = ('artifact', name)
+                if dep not in nodes:
+                    add(dep, producers[name][1])
+            else:
+                raise KeyError(f'No check or producer provides {name}')
+            deps.add(dep)
+
+    for check_id in package_checks:
+        add(('check', check_id), dcheck.checks.get_check(check_id).requires)
+    if file_checks:
+        add(('files', None), sorted({
+                name for check_id in file_checks
+                for name in dcheck.checks.get_check(check_id).requires}))
+    return nodes
+
+
+def resolve(workspace, name, stack=()):
+    '''
+    Return an artifact of a workspace, computing it (and anything it
+    requires) within this process if needed.
+    '''
+    artifacts = memo(workspace)
+    if name in artifacts:
+        return artifacts[name]
+    if name in stack:
+        raise graphlib.CycleError('Artifacts depend on each other', stack)
+
+    if name in producers:
+        function, requires = producers[name]
+        inputs = {x: resolve(workspace, x, stack + (name,)) for x in requires}
+        artifacts[name] = function(workspace, inputs)
+        return artifacts[name]
+
+    loaded = [x for title, x in dcheck.checks.collect('package') if x]
+    if name not in (provided := providers(loaded)):
+        raise KeyError(f'No check or producer provides {name}')
+    check = dcheck.checks.get_check(provided[name])(workspace)
+    check.artifacts = {
+            x: resolve(workspace, x, stack + (name,)) for x in check.requires}
+    check.run_check()
+    artifacts.update(check.provided)
+    return artifacts[name]
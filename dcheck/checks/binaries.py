@@ -0,0 +1,199 @@
+'''
+Checks which find files that are not the preferred form for modification;
+prebuilt binaries, fonts, and minified code.
+
+Files are profiled from a few blocks spread across their contents (see
+sample()) rather than read in full, so a large file costs no more than a
+small one. All checks of the same file share its profile.
+'''
+# Python
+import collections
+import math
+
+# DCheck
+import dcheck.core.manifest
+from dcheck.checks import FileCheck
+
+# Module information
+title = 'check_binaries_title'
+priority = 10
+
+# Size and number of blocks sampled from each file
+BLOCK_SIZE = 4096
+BLOCK_COUNT = 16
+
+# Bits per byte above which unrecognized binary data is considered
+# compressed or encrypted
+OPAQUE_ENTROPY = 7.5
+
+# Text with long lines and little whitespace is considered minified
+MINIFIED_LINE_LENGTH = 500
+MINIFIED_WHITESPACE = 0.1
+
+# Leading bytes of compiled code and fonts
+signatures = [
+        (b'\x7fELF', 'elf'),
+        (b'MZ', 'pe'),
+        (b'\xfe\xed\xfa\xce', 'mach-o'),
+        (b'\xce\xfa\xed\xfe', 'mach-o'),
+        (b'\xfe\xed\xfa\xcf', 'mach-o'),
+        (b'\xcf\xfa\xed\xfe', 'mach-o'),
+        (b'\xca\xfe\xba\xbe', 'java-class'),  # Or a universal Mach-O
+        (b'\x00asm', 'wasm'),
+        (b'dex\n', 'dex'),
+        (b'!<arch>\n', 'ar'),
+        (b'OTTO', 'font'),
+        (b'ttcf', 'font'),
+        (b'wOFF', 'font'),
+        (b'wOF2', 'font'),
+        (b'\x00\x01\x00\x00', 'font'),  # TrueType, if the header agrees
+        ]
+
+# Compiled code (see PrebuiltBinary)
+executable_kinds = {
+        'elf', 'pe', 'mach-o', 'java-class', 'wasm', 'dex', 'ar', 'jar',
+        'opaque'}
+
+# Leading bytes of well known media and archives, which are expected to
+# look random (in addition to dcheck.core.manifest.magic_numbers)
+containers = [
+        b'OggS', b'fLaC', b'ID3', b'RIFF', b'\x1a\x45\xdf\xa3',
+        b'7z\xbc\xaf\x27\x1c', b'Rar!\x1a\x07', b'SQLite format 3\x00',
+        ]
+
+# Members which make a zip archive a Java or Android package
+package_markers = [b'META-INF/', b'AndroidManifest.xml', b'classes.dex']
+
+# Characteristics of a file (see profile())
+Profile = collections.namedtuple(
+        'Profile', ['kind', 'binary', 'entropy', 'line_length', 'whitespace'])
+
+# Profile of the file most recently checked (see get_profile())
+loaded_profile = (None, None)
+
+
+def sample(data, size=BLOCK_SIZE, count=BLOCK_COUNT) -> list:
+    '''
+    Return count blocks of data evenly spread from its start to its end, or
+    all of data if it is small.
+    '''
+    if len(data) <= size * count:
+        return [data[:]]
+    step = (len(data) - size) // (count - 1)
+    return [data[x * step:x * step + size] for x in range(count)]
+
+
+def entropy(blocks) -> float:
+    '''
+    Return the Shannon entropy (bits per byte) of blocks of data.
+    '''
+    counts = collections.Counter()
+    for block in blocks:
+        counts.update(block)
+    total = sum(counts.values())
+    if not total:
+        return 0.0
+    return 0.0 - sum(
+            x / total * math.log2(x / total) for x in counts.values())
+
+
+def identify(head) -> str:
+    '''
+    Return the kind of binary data (see signatures) from its first bytes,
+    'container' for well known media and archives, or None.
+    '''
+    kind = next((kind for magic, kind in signatures
+                 if head.startswith(magic)), None)
+    if kind == 'java-class':
+        # Universal Mach-O headers count architectures where Java has its
+        # version (45 and up)
+        if int.from_bytes(head[4:8], 'big') < 45:
+            kind = 'mach-o'
+    elif kind == 'font' and head.startswith(b'\x00\x01'):
+        tables = int.from_bytes(head[4:6], 'big')
+        if not tables or int.from_bytes(head[6:8], 'big') \
+                != 16 << (tables.bit_length() - 1):
+            kind = None
+    if kind:
+        return kind
+    if head.startswith(b'PK\x03\x04'):
+        if any(x in head for x in package_markers):
+            return 'jar'
+        return 'container'
+    if any(head.startswith(x) for x in containers) or any(
+            head.startswith(x) for x, mime
+            in dcheck.core.manifest.magic_numbers):
+        return 'container'
+    return None
+
+
+def profile(data) -> Profile:
+    '''
+    Return the Profile of data, looking at no more than a few blocks.
+    '''
+    blocks = sample(data)
+    head = blocks[0][:dcheck.core.manifest.SAMPLE_SIZE]
+    if dcheck.core.manifest.is_binary(head):
+        kind = identify(head)
+        if kind is not None:
+            return Profile(kind, True, None, None, None)
+        level = entropy(blocks)
+        return Profile(
+                'opaque' if level > OPAQUE_ENTROPY else None, True, level,
+                None, None)
+
+    total = sum(len(x) for x in blocks)
+    breaks = sum(x.count(b'\n') for x in blocks)
+    spaces = sum(x.count(b' ') + x.count(b'\t') for x in blocks) + breaks
+    return Profile(
+            None, False, None, total / (breaks + len(blocks)),
+            spaces / total if total else 1.0)
+
+
+def get_profile(check) -> Profile:
+    '''
+    Return the Profile of the current file of a check, shared by all checks
+    of the same file.
+    '''
+    global loaded_profile
+    key = (check.workspace, check.filename, check.filehash)
+    if check.filehash and loaded_profile[0] == key:
+        return loaded_profile[1]
+    loaded_profile = (key, profile(check.read()))
+    return loaded_profile[1]
+
+
+class PrebuiltBinary(FileCheck):
+    '''
+    Verify file is not compiled code (executables, libraries, objects, Java
+    or Android packages, WebAssembly) or unrecognized opaque data.
+    '''
+    title = 'check_binaries_blob'
+
+    def run_check(self):
+        return get_profile(self).kind not in executable_kinds
+
+
+class Font(FileCheck):
+    '''
+    Verify file is not a compiled font (TrueType, OpenType, WOFF).
+    '''
+    title = 'check_binaries_font'
+    priority = 510
+
+    def run_check(self):
+        return get_profile(self).kind != 'font'
+
+
+class MinifiedCode(FileCheck):
+    '''
+    Verify file is not minified (or otherwise generated) text, such as
+    compressed JavaScript or CSS.
+    '''
+    title = 'check_binaries_minified'
+    priority = 520
+
+    def run_check(self):
+        found = get_profile(self)
+        return found.binary or found.line_length < MINIFIED_LINE_LENGTH \
+            or found.whitespace > MINIFIED_WHITESPACE
@@ -0,0 +1,63 @@
+'''
+DCheck Check Result Cache
+
+Remember automated results of file checks by file content, so identical
+files (across revisions and packages) are only checked once per version of
+a check.
+'''
+# DCheck
+import dcheck.core.cache
+import dcheck.core.config
+import dcheck.core.data
+
+# Result cache hits and misses
+stats = dcheck.core.cache.HitCounter()
+hit_rate = stats.hit_rate
+
+
+def cache_key(check, sha256) -> str:
+    '''
+    Return the data key used for a check (class or instance) and file hash.
+    '''
+    return f'result/{check.id}/{check.version}/{sha256}'
+
+
+def enabled(check) -> bool:
+    '''
+    Check if results of a given check may be cached.
+    '''
+    return bool(dcheck.core.config.get('result_cache') and check.cacheable
+                and check.id)
+
+
+def lookup_many(check, digests) -> list:
+    '''
+    Return cached results of a check for many file hashes (in order), with
+    None for files which were never checked.
+    '''
+    digests = list(digests)
+    if not enabled(check) or not digests:
+        # Lookups which could never hit do not count as misses
+        return [None] * len(digests)
+    results = dcheck.core.data.get_many(cache_key(check, x) for x in digests)
+
+    hits = sum(result is not None for result in results)
+    stats.count(hits, len(results) - hits)
+    return results
+
+
+def lookup(check, sha256):
+    '''
+    Return the cached result of a check for a file hash, or None.
+    '''
+    return lookup_many(check, [sha256])[0]
+
+
+def store(check, sha256, result):
+    '''
+    Record the result of a check for a file hash; None (could not run) is
+    never cached.
+    '''
+    if result is None or not enabled(check):
+        return
+    dcheck.core.data.set(cache_key(check, sha256), result)
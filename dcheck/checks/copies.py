@@ -0,0 +1,479 @@
+'''
+DCheck Embedded Code Copies
+
+Find files which were seen before in other workspaces, either identical
+(same sha256) or nearly identical (the same code with different
+whitespace, comments, or small edits), such as vendored copies of common
+libraries.
+
+Text files are fingerprinted by normalizing each line (dropping whitespace
+and comments, in the comment syntax of the file type, see syntaxes) and
+cutting lines into content-defined chunks; a chunk ends after any line
+whose hash is a multiple of CHUNK_LINES, so an edit only changes the chunks
+around it. Two files are near-identical when most of their chunks are
+shared.
+
+The index is kept in the data engine:
+
+- copies/file/<sha256>: fingerprint of a file and where it was seen
+- copies/chunk/<digest>: files containing a chunk, for a sample of chunks
+  (anchors) used to find candidates
+
+Updates of the index are serialized between threads and processes (see
+index_lock()).
+
+Copies of a workspace are found once after ingest and saved in its metadata
+directory (see save_copies()); reviewed_copies() narrows them down to those
+whose contents were approved in another package (see
+dcheck.checks.approvals).
+
+Usage::
+
+    python3 -m dcheck.checks.copies /path/to/workspace_dir/package_1.0-1
+'''
+# Python
+import collections
+import contextlib
+import fcntl
+import functools
+import hashlib
+import json
+import os
+import pathlib
+import re
+import sys
+import threading
+import zlib
+
+# DCheck
+import dcheck.checks.approvals
+import dcheck.checks.runner
+import dcheck.checks.scan
+import dcheck.core.bootstrap
+import dcheck.core.config
+import dcheck.core.data
+import dcheck.core.manifest
+import dcheck.core.vfs
+
+# Increase when fingerprints change; older fingerprints are computed again
+VERSION = 2
+
+# Files smaller than this (in bytes) are too common to be worth indexing
+MIN_SIZE = 512
+
+# Average number of (normalized) lines per chunk
+CHUNK_LINES = 8
+
+# One in ANCHOR_RATE chunks is indexed to find candidates
+ANCHOR_RATE = 4
+
+# Shortest fingerprint (in chunks) compared for near-identical files
+MIN_CHUNKS = 4
+
+# Largest number of places (and files per anchor) kept in the index
+MAX_SEEN = 10
+MAX_SHARED = 50
+
+# Comment syntax of a file type: markers starting a comment which runs to
+# the end of the line, and markers around block comments
+Syntax = collections.namedtuple('Syntax', ['line', 'start', 'end'])
+C_SYNTAX = Syntax((b'//',), b'/*', b'*/')
+HASH_SYNTAX = Syntax((b'#',), None, None)
+DASH_SYNTAX = Syntax((b'--',), None, None)
+LISP_SYNTAX = Syntax((b';',), None, None)
+XML_SYNTAX = Syntax((), b'<!--', b'-->')
+NO_SYNTAX = Syntax((), None, None)
+
+# Comment syntax by (lower case) file suffix; anything else uses
+# HASH_SYNTAX, as do most scripts and configuration files
+syntaxes = {
+        **dict.fromkeys([
+            '.c', '.h', '.cc', '.cpp', '.cxx', '.hh', '.hpp', '.hxx', '.m',
+            '.mm', '.java', '.js', '.mjs', '.ts', '.go', '.rs', '.cs',
+            '.swift', '.kt', '.scala', '.php', '.css', '.scss', '.less',
+            '.dart', '.groovy', '.proto', '.y', '.l'], C_SYNTAX),
+        **dict.fromkeys([
+            '.sql', '.lua', '.hs', '.ada', '.adb', '.ads', '.elm',
+            '.vhd', '.vhdl'], DASH_SYNTAX),
+        **dict.fromkeys([
+            '.el', '.lisp', '.scm', '.ss', '.clj', '.asm', '.s', '.ini'],
+            LISP_SYNTAX),
+        **dict.fromkeys([
+            '.html', '.htm', '.xml', '.xhtml', '.svg', '.xsl', '.xslt'],
+            XML_SYNTAX),
+        **dict.fromkeys([
+            '.md', '.rst', '.txt', '.json', '.csv', '.po', '.pot'],
+            NO_SYNTAX),
+        '.m4': Syntax((b'#', b'dnl '), None, None),
+        '.ac': Syntax((b'#', b'dnl '), None, None),
+        '.bat': Syntax((b'rem ', b'REM ', b'::'), None, None),
+        '.cmd': Syntax((b'rem ', b'REM ', b'::'), None, None),
+        }
+
+# Serializes updates of the index within this process (see index_lock())
+index_thread_lock = threading.Lock()
+
+# A place a file was seen, and the sha256 of its contents there (see
+# find_copies())
+Copy = collections.namedtuple(
+        'Copy', ['package', 'path', 'similarity', 'sha256'])
+
+# A copy whose contents were approved (see reviewed_copies())
+Reviewed = collections.namedtuple(
+        'Reviewed', ['package', 'path', 'similarity', 'reviewer'])
+
+# Saved copies of workspaces (see get_copies())
+loaded_copies = {}
+
+
+def get_syntax(name) -> Syntax:
+    '''
+    Return the comment Syntax of a file with a given name.
+    '''
+    path = pathlib.PurePath(name or '')
+    return syntaxes.get(path.suffix.lower(), HASH_SYNTAX)
+
+
+@functools.lru_cache()
+def comment_patterns(syntax) -> tuple:
+    '''
+    Return expressions matching (lines which only hold a comment, comments
+    following code on the same line) of a Syntax.
+    '''
+    markers = b'|'.join(re.escape(x) for x in syntax.line)
+    if syntax.start:
+        markers = markers + b'|' + re.escape(syntax.start) \
+            if markers else re.escape(syntax.start)
+    if not markers:
+        return (None, None)
+    # Words (such as dnl) only start a comment at the start of a line
+    inline = b'|'.join(
+            re.escape(x) for x in syntax.line if not x[:1].isalpha())
+    return (re.compile(rb'^\s*(?:' + markers + rb')'),
+            re.compile(rb'\s(?:' + inline + rb').*') if inline else None)
+
+
+def fingerprint(data, name=None) -> list:
+    '''
+    Return the sorted digests of all chunks of text, dropping comments in
+    the syntax of a file name.
+    '''
+    syntax = get_syntax(name)
+    comment_lines, inline_comments = comment_patterns(syntax)
+    digests = set()
+    chunk = []
+    block = False
+    for line in dcheck.checks.scan.lines(data):
+        if block:
+            # Within a block comment until its end marker
+            block = syntax.end not in line
+            continue
+        if comment_lines and comment_lines.match(line):
+            stripped = line.lstrip()
+            block = bool(syntax.start) and stripped.startswith(
+                    syntax.start) and syntax.end not in stripped[
+                    len(syntax.start):]
+            continue
+        if inline_comments:
+            line = inline_comments.sub(b'', line)
+        if not (line := b''.join(line.split())):
+            continue
+        chunk.append(line)
+        if not zlib.crc32(line) % CHUNK_LINES \
+                or len(chunk) >= CHUNK_LINES * 4:
+            digests.add(hashlib.blake2b(
+                    b'\n'.join(chunk), digest_size=8).hexdigest())
+            chunk = []
+    if chunk:
+        digests.add(hashlib.blake2b(
+                b'\n'.join(chunk), digest_size=8).hexdigest())
+    return sorted(digests)
+
+
+def fingerprint_file(workspace, filename):
+    '''
+    Return fingerprint() of a workspace file, or None if it cannot be read.
+    '''
+    try:
+        with dcheck.checks.scan.open_buffer(workspace, filename) as data:
+            return fingerprint(data, filename)
+    except OSError:
+        return None
+
+
+def fingerprint_chunk(workspace, filenames) -> list:
+    return [fingerprint_file(workspace, x) for x in filenames]
+
+
+@contextlib.contextmanager
+def index_lock():
+    '''
+    Hold the lock serializing updates of the index, between threads of
+    this process and other processes using the same workspace_dir.
+    '''
+    path = pathlib.Path(
+            dcheck.core.config.get('workspace_dir')) / '.copies.lock'
+    with index_thread_lock, open(path, 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def file_key(sha256) -> str:
+    return f'copies/file/{sha256}'
+
+
+def chunk_key(digest) -> str:
+    return f'copies/chunk/{digest}'
+
+
+def is_anchor(digest) -> bool:
+    return not int(digest, 16) % ANCHOR_RATE
+
+
+def similarity(first, second) -> float:
+    '''
+    Return the share of chunks two (sorted) fingerprints have in common.
+    '''
+    if not first or not second:
+        return 0.0
+    return len(set(first).intersection(second)) \
+        / max(len(first), len(second))
+
+
+def indexed_files(workspace) -> list:
+    '''
+    Return FileInfo of all files of a workspace which are worth indexing.
+    '''
+    manifest = dcheck.core.manifest.get_manifest(workspace)
+    if manifest is None:
+        return []
+    return [x for x in manifest if x.size >= MIN_SIZE]
+
+
+def fetch_records(digests) -> dict:
+    '''
+    Return {sha256: record} of file hashes with a current record.
+    '''
+    digests = sorted(digests)
+    return {
+        sha256: record for sha256, record in zip(
+            digests, dcheck.core.data.get_many(file_key(x) for x in digests))
+        if record and record.get('version') == VERSION}
+
+
+def get_records(workspace, files, workers=None) -> dict:
+    '''
+    Return {sha256: record} of files, fingerprinting and storing text files
+    which were not fingerprinted before.
+    Binary files are only matched when identical.
+    '''
+    records = fetch_records({x.sha256 for x in files})
+    pending = {}  # path: sha256 of one file per content
+    waiting = set()
+    created = {}
+    for info in files:
+        if info.sha256 in records or info.sha256 in waiting:
+            continue
+        if info.binary:
+            created[info.sha256] = {
+                    'version': VERSION, 'chunks': [], 'seen': []}
+        else:
+            pending[info.path] = info.sha256
+            waiting.add(info.sha256)
+
+    for filename, found in dcheck.checks.runner.map_chunks(
+            fingerprint_chunk, workspace,
+            dcheck.checks.scan.read_order(workspace, pending), workers):
+        if found is not None:
+            created[pending[filename]] = {
+                    'version': VERSION, 'chunks': found, 'seen': []}
+
+    # Records stored in the meantime (with places) are kept
+    with index_lock():
+        records.update(stored := fetch_records(created))
+        dcheck.core.data.set_many(
+                (file_key(sha256), x) for sha256, x in created.items()
+                if sha256 not in stored)
+    records.update((x, y) for x, y in created.items() if x not in stored)
+    return records
+
+
+def find_copies(workspace, paths=None, workers=None) -> dict:
+    '''
+    Match files of a workspace (default: all) against the index, returning
+    {path: [Copy, ...]} for files seen in other workspaces, best match
+    first.
+    '''
+    workspace = pathlib.Path(workspace)
+    files = indexed_files(workspace)
+    if paths is not None:
+        paths = set(paths)
+        files = [x for x in files if x.path in paths]
+    records = get_records(workspace, files, workers)
+
+    # Candidates for near-identical files share at least one anchor
+    anchors = sorted({
+            digest for record in records.values()
+            if len(record['chunks']) >= MIN_CHUNKS
+            for digest in record['chunks'] if is_anchor(digest)})
+    sharing = dict(zip(anchors, dcheck.core.data.get_many(
+            chunk_key(x) for x in anchors)))
+    candidates = sorted({
+            sha256 for shared in sharing.values() for sha256 in shared or []}
+            - set(records))
+    others = dict(zip(candidates, dcheck.core.data.get_many(
+            file_key(x) for x in candidates)))
+    others.update(records)
+
+    threshold = dcheck.core.config.get('copy_similarity')
+    copies = {}
+    for info in files:
+        if not (record := records.get(info.sha256)):
+            continue
+        scores = {info.sha256: 1.0}
+        if len(record['chunks']) >= MIN_CHUNKS:
+            for digest in record['chunks']:
+                for sha256 in sharing.get(digest) or []:
+                    if sha256 not in scores and (other := others.get(sha256)):
+                        scores[sha256] = similarity(
+                                record['chunks'], other['chunks'])
+        found = [
+            Copy(package, path, score, sha256)
+            for sha256, score in scores.items() if score >= threshold
+            for package, path in others[sha256]['seen']
+            if package != workspace.name]
+        if found:
+            copies[info.path] = sorted(found, key=lambda x: -x.similarity)
+    return copies
+
+
+def index_workspace(workspace, workers=None) -> int:
+    '''
+    Record all files of a workspace in the index. Returns the number of
+    files which were not indexed before.
+    '''
+    workspace = pathlib.Path(workspace)
+    files = indexed_files(workspace)
+    get_records(workspace, files, workers)
+    with index_lock():
+        return add_places(workspace, files)
+
+
+def add_places(workspace, files) -> int:
+    '''
+    Record where files were seen, and their anchors; see index_workspace().
+    '''
+    records = fetch_records({x.sha256 for x in files})
+    added = 0
+    updated = {}
+    anchors = collections.defaultdict(set)
+    for info in files:
+        if not (record := records.get(info.sha256)):
+            continue
+        place = [workspace.name, info.path]
+        if place in record['seen']:
+            continue
+        if not record['seen']:
+            for digest in record['chunks']:
+                if is_anchor(digest):
+                    anchors[digest].add(info.sha256)
+        if len(record['seen']) < MAX_SEEN:
+            record['seen'].append(place)
+            updated[file_key(info.sha256)] = record
+            added += 1
+
+    digests = sorted(anchors)
+    for digest, shared in zip(digests, dcheck.core.data.get_many(
+            chunk_key(x) for x in digests)):
+        shared = shared or []
+        if len(shared) >= MAX_SHARED:
+            continue
+        shared.extend(sorted(anchors[digest] - set(shared)))
+        updated[chunk_key(digest)] = shared[:MAX_SHARED]
+    dcheck.core.data.set_many(updated)
+    return added
+
+
+def copies_path(workspace) -> pathlib.Path:
+    '''
+    Return the path of the saved copies of a workspace.
+    '''
+    return dcheck.core.vfs.meta_dir(workspace) / 'copies.json'
+
+
+def save_copies(workspace, copies):
+    '''
+    Save find_copies() of a workspace.
+    '''
+    path = copies_path(workspace)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix('.tmp')
+    with open(temporary, 'w') as fh:
+        json.dump(copies, fh)
+    os.replace(temporary, path)
+
+
+def get_copies(workspace) -> dict:
+    '''
+    Return the saved copies of a workspace as {path: [Copy, ...]}, or an
+    empty dict if none were saved; loaded again only once changed.
+    '''
+    path = copies_path(workspace)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        if (loaded := loaded_copies.get(path)) and loaded[0] == mtime:
+            return loaded[1]
+        with open(path, 'r') as fh:
+            copies = {
+                name: [Copy(*x) for x in found]
+                for name, found in json.load(fh).items()}
+    except (OSError, ValueError, TypeError):
+        return {}
+    loaded_copies[path] = (mtime, copies)
+    return copies
+
+
+def reviewed_copies(workspace, copies) -> dict:
+    '''
+    Return {path: [Reviewed, ...]} of copies ({path: [Copy, ...]}) whose
+    contents were approved in another package, best match first.
+    '''
+    workspace = pathlib.Path(workspace)
+    approvals = dcheck.checks.approvals.find_many(
+            x.sha256 for found in copies.values() for x in found)
+    reviewed = {}
+    for name, found in copies.items():
+        places = {}
+        for copy in found:
+            for approval in approvals.get(copy.sha256, []):
+                if approval['package'] == workspace.name:
+                    continue
+                place = (approval['package'], approval.get('path', ''))
+                if place not in places:
+                    places[place] = Reviewed(
+                            *place, copy.similarity, approval['reviewer'])
+        if places:
+            reviewed[name] = sorted(
+                    places.values(), key=lambda x: -x.similarity)
+    return reviewed
+
+
+def main():
+    '''
+    Print files of a workspace seen in other workspaces, then add the
+    workspace to the index.
+    '''
+    workspace = pathlib.Path(sys.argv[1])
+    for path, found in sorted(find_copies(workspace).items()):
+        for copy in found:
+            print(f'{copy.similarity:>4.0%}  {path}  '
+                  f'{copy.package}:{copy.path}')
+    index_workspace(workspace)
+
+
+if __name__ == '__main__':
+    dcheck.core.bootstrap.start()
+    main()
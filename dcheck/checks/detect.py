@@ -0,0 +1,276 @@
+'''
+DCheck License Detection
+
+Find license and copyright signatures in workspace files. All signatures
+are compiled into a single Aho-Corasick automaton, so each file is read
+once regardless of how many signatures are known. Only the head and tail
+of large files are scanned (license_scan_window), where notices normally
+are.
+
+Detections are stored in the data engine by file content (scan/<sha256>),
+so identical files are only scanned once.
+
+Usage::
+
+    python3 -m dcheck.checks.detect /path/to/workspace_dir/package_1.0-1
+'''
+# Python
+import collections
+import pathlib
+import re
+import sys
+
+# DCheck
+import dcheck.checks.runner
+import dcheck.checks.scan
+import dcheck.core.bootstrap
+import dcheck.core.config
+import dcheck.core.data
+import dcheck.core.manifest
+
+# Increase when signatures change; older detections are scanned again
+VERSION = 1
+
+# Phrases (normalized, see normalize()) identifying a license or notice
+signatures = [
+        ('GPL', b'gnu general public license'),
+        ('GPL-2+', b'either version 2 of the license, or'),
+        ('GPL-3+', b'either version 3 of the license, or'),
+        ('LGPL', b'gnu lesser general public license'),
+        ('LGPL', b'gnu library general public license'),
+        ('AGPL', b'gnu affero general public license'),
+        ('Apache-2.0', b'apache license, version 2.0'),
+        ('Apache-2.0', b'licensed under the apache license'),
+        ('MIT', b'permission is hereby granted, free of charge, to any '
+                b'person obtaining a copy'),
+        ('BSD', b'redistribution and use in source and binary forms'),
+        ('BSD-3-clause', b'neither the name of'),
+        ('ISC', b'permission to use, copy, modify, and/or distribute this '
+                b'software for any purpose'),
+        ('MPL-2.0', b'mozilla public license, v. 2.0'),
+        ('MPL-2.0', b'mozilla public license version 2.0'),
+        ('Zlib', b"this software is provided 'as-is', without any express "
+                 b"or implied"),
+        ('Artistic', b'artistic license'),
+        ('CC-BY', b'creative commons attribution'),
+        ('CC0-1.0', b'cc0 1.0'),
+        ('public-domain', b'public domain'),
+        ('WTFPL', b'do what the fuck you want to public license'),
+        # Terms which usually conflict with the DFSG
+        ('non-commercial', b'non-commercial'),
+        ('non-commercial', b'noncommercial'),
+        ('no-modification', b'may not be modified'),
+        ('proprietary', b'all rights reserved'),
+        ('proprietary', b'confidential and proprietary'),
+        # Markers which are followed by details (see details())
+        ('spdx', b'spdx-license-identifier:'),
+        ('copyright', b'copyright'),
+        ]
+
+# Whitespace, along with comment markers at the start of lines
+separators = re.compile(rb'\s+(?:(?:[#*;!%]+|//+|--|dnl\b|rem\b)\s*)*')
+
+# Details of markers, read from the original text
+spdx_lines = re.compile(
+        rb'spdx-license-identifier:\s*(.+?)\s*(?:\*/|-->)?\s*$',
+        re.IGNORECASE | re.MULTILINE)
+copyright_lines = re.compile(
+        rb'^\W*(copyright\b.*?)\s*(?:\*/|-->)?\s*$',
+        re.IGNORECASE | re.MULTILINE)
+
+# Largest number of copyright statements kept per file
+MAX_STATEMENTS = 20
+
+# Compiled automaton of signatures (see get_automaton())
+loaded_automaton = None
+
+
+def normalize(data) -> bytes:
+    '''
+    Return text folded for matching; lower case with whitespace and
+    comment markers collapsed to single spaces.
+    '''
+    return separators.sub(b' ', bytes(data).lower())
+
+
+class Automaton:
+    '''
+    Aho-Corasick automaton over bytes, built as a complete transition table
+    so matching costs two list lookups per byte.
+    '''
+    def __init__(self, patterns):
+        # Trie of all patterns
+        goto = [{}]
+        outputs = [set()]
+        for number, pattern in enumerate(patterns):
+            state = 0
+            for byte in pattern:
+                if byte not in goto[state]:
+                    goto.append({})
+                    outputs.append(set())
+                    goto[state][byte] = len(goto) - 1
+                state = goto[state][byte]
+            outputs[state].add(number)
+
+        # Breadth-first; fill missing transitions from the failure state
+        self.table = [[0] * 256 for x in goto]
+        fail = [0] * len(goto)
+        queue = collections.deque()
+        for byte, state in goto[0].items():
+            self.table[0][byte] = state
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            outputs[state] |= outputs[fail[state]]
+            row = self.table[state]
+            row[:] = self.table[fail[state]]
+            for byte, target in goto[state].items():
+                fail[target] = self.table[fail[state]][byte]
+                row[byte] = target
+                queue.append(target)
+        self.outputs = [tuple(x) for x in outputs]
+
+    def search(self, data) -> set:
+        '''
+        Return the numbers of all patterns found in data.
+        '''
+        table = self.table
+        outputs = self.outputs
+        found = set()
+        state = 0
+        for byte in data:
+            state = table[state][byte]
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
+
+
+def get_automaton() -> Automaton:
+    '''
+    Return the (shared) automaton of all signatures.
+    '''
+    global loaded_automaton
+    if loaded_automaton is None:
+        loaded_automaton = Automaton([normalize(x[1]) for x in signatures])
+    return loaded_automaton
+
+
+def windows(data, size) -> list:
+    '''
+    Return the head and tail of data, or all of data if it is small.
+    '''
+    if not size or len(data) <= size * 2:
+        return [data[:]]
+    return [data[:size], data[-size:]]
+
+
+def details(window, names) -> dict:
+    '''
+    Return SPDX identifiers and copyright statements of a window.
+    '''
+    result = {'spdx': [], 'copyright': []}
+    if 'spdx' in names:
+        result['spdx'] = [
+                x.decode('utf-8', errors='replace')
+                for x in spdx_lines.findall(window)]
+    if 'copyright' in names:
+        result['copyright'] = [
+                x.decode('utf-8', errors='replace')
+                for x in copyright_lines.findall(window)]
+    return result
+
+
+def detect(data, size=None) -> dict:
+    '''
+    Return detections in data as {'licenses': [...], 'spdx': [...],
+    'copyright': [...]}.
+    '''
+    if size is None:
+        size = dcheck.core.config.get('license_scan_window')
+    automaton = get_automaton()
+    result = {'licenses': set(), 'spdx': [], 'copyright': []}
+    for window in windows(data, size):
+        names = {signatures[x][0] for x in automaton.search(normalize(window))}
+        result['licenses'] |= names - {'spdx', 'copyright'}
+        for key, values in details(window, names).items():
+            result[key].extend(x for x in values if x not in result[key])
+    result['licenses'] = sorted(result['licenses'])
+    result['copyright'] = result['copyright'][:MAX_STATEMENTS]
+    return result
+
+
+def detect_file(workspace, filename) -> dict:
+    '''
+    Return detect() of a workspace file, or None if it cannot be read.
+    '''
+    try:
+        with dcheck.checks.scan.open_buffer(workspace, filename) as data:
+            return detect(data)
+    except OSError:
+        return None
+
+
+def detect_chunk(workspace, filenames) -> list:
+    return [detect_file(workspace, x) for x in filenames]
+
+
+def scan_key(sha256) -> str:
+    return f'scan/{sha256}'
+
+
+def lookup_many(digests) -> list:
+    '''
+    Return stored detections of many file hashes (in order), with None for
+    files which were never scanned with the current signatures.
+    '''
+    return [
+        x if x and x.get('version') == VERSION else None
+        for x in dcheck.core.data.get_many(scan_key(x) for x in digests)]
+
+
+def scan_workspace(workspace, workers=None):
+    '''
+    Scan all text files of a workspace which were not scanned before,
+    across a pool of processes, and store their detections. Yields
+    (filename, detections) for every text file.
+    '''
+    workspace = pathlib.Path(workspace)
+    manifest = dcheck.core.manifest.get_manifest(workspace)
+    if manifest is None:
+        return
+    files = [x for x in manifest if not x.binary]
+    digests = {x.path: x.sha256 for x in files}
+    pending = []
+    for info, found in zip(files, lookup_many(x.sha256 for x in files)):
+        if found is None:
+            pending.append(info.path)
+        else:
+            yield (info.path, found)
+    if not pending:
+        return
+
+    for filename, found in dcheck.checks.runner.map_chunks(
+            detect_chunk, workspace,
+            dcheck.checks.scan.read_order(workspace, pending), workers):
+        if found is None:
+            continue
+        found['version'] = VERSION
+        dcheck.core.data.set(scan_key(digests[filename]), found)
+        yield (filename, found)
+
+
+def main():
+    '''
+    Print licenses and copyright statements found in a workspace.
+    '''
+    workspace = pathlib.Path(sys.argv[1])
+    for filename, found in sorted(scan_workspace(workspace)):
+        licenses = ', '.join(found['licenses'] + found['spdx']) or '-'
+        print(f'{licenses:<32}  {filename}')
+        for statement in found['copyright']:
+            print(f'{"":<32}    {statement}')
+
+
+if __name__ == '__main__':
+    dcheck.core.bootstrap.start()
+    main()
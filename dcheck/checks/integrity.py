@@ -15,6 +15,7 @@ class ChangesChecksums(PackageCheck):
     '''
     title = 'check_integrity_cksum'
     priority = 10
+    requires = ['changes']
 
     def run_check(self):
         pass
@@ -22,9 +23,17 @@ class ChangesChecksums(PackageCheck):
 
 class ReadableCopyright(FileCheck):
     '''
-    Verify d/copyright can be read using DEP-5 format.
+    Verify d/copyright can be read using DEP-5 format and describes the
+    file under review.
     '''
     title = 'check_integrity_dep5'
+    requires = ['licenses']
+    cacheable = False  # Depends on d/copyright, not only file contents
 
     def run_check(self):
-        pass
+        if (licenses := self.artifact('licenses')) is None:
+            return False
+        # Uploaded files are not part of the source tree
+        if self.filename.startswith('source/'):
+            return True
+        return licenses.get(self.filename) is not None
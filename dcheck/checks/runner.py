@@ -0,0 +1,355 @@
+'''
+DCheck Check Runner
+
+Run package and file checks of a workspace across a pool of processes.
+Checks and the artifacts they share are ordered as a graph; anything whose
+requirements are ready runs concurrently (see dcheck.checks.artifacts).
+File checks are split into chunks of files so workers only load each check
+once per chunk and read each file once for all checks (see
+dcheck.checks.scan), and results are yielded as soon as a chunk finishes.
+
+Usage::
+
+    python3 -m dcheck.checks.runner /path/to/workspace_dir/package_1.0-1
+'''
+# Python
+import concurrent.futures
+import graphlib
+import logging
+import multiprocessing
+import os
+import pathlib
+import sys
+
+# DCheck
+import dcheck.checks
+import dcheck.checks.artifacts
+import dcheck.checks.cache
+import dcheck.checks.scan
+import dcheck.core.bootstrap
+import dcheck.core.config
+import dcheck.core.data
+import dcheck.core.manifest
+import dcheck.core.revisions
+import dcheck.core.vfs
+import dcheck.i18n
+
+# Largest number of files sent to a worker at once
+MAX_CHUNK_SIZE = 256
+
+
+def init_worker(configuration):
+    '''
+    Prepare a worker process with the configuration of the parent.
+    '''
+    dcheck.core.config.loaded_configuration = configuration
+    # Archive handles inherited from the parent share its file offsets
+    dcheck.core.vfs.loaded_workspaces.clear()
+    dcheck.i18n.load_translations(
+        language=dcheck.core.config.get('default_lang'),
+        i18n_dir=dcheck.core.config.get('i18n_dir'))
+    dcheck.core.data.connect_storage()
+    dcheck.checks.load_checklists()
+
+
+def process_pool(workers) -> concurrent.futures.ProcessPoolExecutor:
+    '''
+    Return a pool of worker processes prepared with the configuration of
+    this process. Workers are started by a fork server instead of being
+    forked from this process, which may be running other threads (such as
+    the ingest daemon).
+    '''
+    return concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('forkserver'),
+            initializer=init_worker,
+            initargs=(dcheck.core.config.loaded_configuration,))
+
+
+def run_producer(workspace, name, inputs):
+    '''
+    Return an artifact computed by its producer.
+    '''
+    function, requires = dcheck.checks.artifacts.producers[name]
+    return function(workspace, inputs)
+
+
+def run_chunk(workspace, units, timeout, inputs) -> tuple:
+    '''
+    Run checks of a chunk of [(filename, check_ids), ...]; a filename of
+    None runs package checks. Inputs holds required artifacts.
+
+    Returns ([(check_id, filename, result), ...], {artifact: value}).
+    '''
+    checks = {}
+    results = []
+    provided = {}
+    for filename, check_ids in units:
+        for check_id in check_ids:
+            if check_id not in checks:
+                checks[check_id] = dcheck.checks.get_check(check_id)(workspace)
+                checks[check_id].artifacts = inputs
+        if filename is None:
+            for check_id in check_ids:
+                check = checks[check_id]
+                results.append((check_id, None, dcheck.checks.scan.call(
+                        check, timeout, check.run_check)[1]))
+                provided.update(check.provided)
+            continue
+        outcomes = dcheck.checks.scan.scan_file(
+                workspace, filename, [checks[x] for x in check_ids], timeout)
+        results.extend(
+                (check_id, filename, result)
+                for check_id, result in zip(check_ids, outcomes))
+    return (results, provided)
+
+
+def chunked(items, workers) -> list:
+    '''
+    Split work into a few chunks per worker, so workers finish at about the
+    same time, of no more than MAX_CHUNK_SIZE items each.
+    '''
+    size = max(1, min(MAX_CHUNK_SIZE, len(items) // (workers * 4)))
+    return [items[x:x + size] for x in range(0, len(items), size)]
+
+
+def map_chunks(function, workspace, items, workers=None):
+    '''
+    Yield (item, result) for items of a workspace, as chunks of them finish,
+    where function(workspace, chunk) returns a result for each item of a
+    chunk. Chunks run across a pool of processes when there are several.
+    '''
+    workers = workers or dcheck.core.config.get('check_workers') \
+        or os.cpu_count()
+    chunks = chunked(list(items), workers)
+    if len(chunks) < 2:
+        for chunk in chunks:
+            yield from zip(chunk, function(workspace, chunk))
+        return
+    with process_pool(workers) as pool:
+        jobs = {pool.submit(function, workspace, x): x for x in chunks}
+        for job in concurrent.futures.as_completed(jobs):
+            yield from zip(jobs[job], job.result())
+
+
+def workspace_files(workspace) -> list:
+    '''
+    Return relative paths of all files in a workspace, from its manifest
+    when available.
+    '''
+    workspace = pathlib.Path(workspace)
+    if manifest := dcheck.core.manifest.get_manifest(workspace):
+        return list(manifest.paths)
+
+    files = []
+    meta = dcheck.core.vfs.meta_dir(workspace).name
+    for dirpath, dirnames, filenames in os.walk(workspace):
+        if dirpath == str(workspace) and meta in dirnames:
+            dirnames.remove(meta)
+        for name in filenames:
+            path = pathlib.Path(dirpath) / name
+            if path.is_file() and not path.is_symlink():
+                files.append(str(path.relative_to(workspace)))
+    return sorted(files)
+
+
+def check_ids(target) -> list:
+    '''
+    Return ids of loaded checks of a collection (package or file).
+    '''
+    return [check_id for title, check_id in dcheck.checks.collect(target)
+            if check_id]
+
+
+def file_digest(manifest, filename):
+    '''
+    Return the sha256 of a workspace file from its manifest, or None.
+    '''
+    info = manifest.get(filename) if manifest else None
+    return info.sha256 if info else None
+
+
+def plan(manifest, file_checks, files, workers):
+    '''
+    Yield cached results of file checks as (check_id, filename, result),
+    then return the remaining work as chunks for run_chunk().
+    '''
+    digests = [file_digest(manifest, x) for x in files]
+    # Files are visited in read order (see dcheck.checks.scan.read_order)
+    pending = {x: [] for x in files}  # filename: [check_id, ...]
+    for check_id in file_checks:
+        check = dcheck.checks.get_check(check_id)
+        known = [x for x in digests if x]
+        cached = dict(zip(
+                known, dcheck.checks.cache.lookup_many(check, known)))
+        for filename, digest in zip(files, digests):
+            if (result := cached.get(digest)) is not None:
+                yield (check_id, filename, result)
+            else:
+                pending[filename].append(check_id)
+
+    units = [(x, check_ids) for x, check_ids in pending.items() if check_ids]
+    return chunked(units, workers)
+
+
+def run(workspace, package_checks=None, file_checks=None, files=None,
+        workers=None, timeout=None):
+    '''
+    Run checks of a workspace in parallel, yielding (check_id, filename,
+    result) as results become available; filename is None for package
+    checks. Results of file checks are cached (see dcheck.checks.cache).
+
+    Checks default to all loaded checks and files to all workspace files.
+    '''
+    workspace = pathlib.Path(workspace)
+    if package_checks is None:
+        package_checks = check_ids('package')
+    if file_checks is None:
+        file_checks = check_ids('file')
+    if files is None:
+        files = workspace_files(workspace) if file_checks else []
+    files = dcheck.checks.scan.read_order(workspace, files)
+    workers = workers or dcheck.core.config.get('check_workers') \
+        or os.cpu_count()
+    timeout = timeout or dcheck.core.config.get('check_timeout')
+
+    # Cached results are yielded while planning; the rest is returned
+    manifest = dcheck.core.manifest.get_manifest(workspace)
+    chunks = yield from plan(manifest, file_checks, files, workers)
+    artifacts = dcheck.checks.artifacts.memo(workspace)
+    nodes = dcheck.checks.artifacts.graph(
+            package_checks, file_checks if chunks else [], artifacts)
+    if not nodes:
+        return
+
+    def inputs(requires):
+        return {x: artifacts[x] for x in requires if x in artifacts}
+
+    file_requires = {
+            x for check_id in file_checks
+            for x in dcheck.checks.get_check(check_id).requires}
+    file_inputs = None
+    sorter = graphlib.TopologicalSorter(nodes)
+    sorter.prepare()
+    chunks.reverse()
+    chunks_left = len(chunks)
+    queued = []
+    with process_pool(workers) as pool:
+        active = {}  # job: node
+        try:
+            while sorter.is_active():
+                for node in sorter.get_ready():
+                    kind, name = node
+                    if kind == 'artifact':
+                        requires = dcheck.checks.artifacts.producers[name][1]
+                        job = pool.submit(
+                                run_producer, workspace, name,
+                                inputs(requires))
+                        active[job] = node
+                    elif kind == 'check':
+                        requires = dcheck.checks.get_check(name).requires
+                        job = pool.submit(
+                                run_chunk, workspace, [(None, [name])],
+                                timeout, inputs(requires))
+                        active[job] = node
+                    else:
+                        file_inputs = inputs(file_requires)
+                        queued = chunks
+
+                # Keep a bounded number of file chunks queued per worker
+                while queued and len(active) < workers * 2:
+                    job = pool.submit(
+                            run_chunk, workspace, queued.pop(), timeout,
+                            file_inputs)
+                    active[job] = ('files', None)
+
+                done = concurrent.futures.wait(
+                        active, return_when=concurrent.futures.FIRST_COMPLETED)
+                for job in done.done:
+                    kind, name = node = active.pop(job)
+                    if kind == 'artifact':
+                        try:
+                            artifacts[name] = job.result()
+                        except Exception:
+                            logging.exception('Unable to produce %s', name)
+                        sorter.done(node)
+                        continue
+
+                    results, provided = job.result()
+                    artifacts.update(provided)
+                    for check_id, filename, result in results:
+                        if digest := file_digest(manifest, filename):
+                            dcheck.checks.cache.store(
+                                    dcheck.checks.get_check(check_id),
+                                    digest, result)
+                        yield (check_id, filename, result)
+                    if kind == 'check':
+                        sorter.done(node)
+                    elif (chunks_left := chunks_left - 1) == 0:
+                        sorter.done(node)
+        finally:
+            for job in active:
+                job.cancel()
+
+
+def recheck(workspace, previous=None, package_checks=None, file_checks=None,
+            workers=None, timeout=None):
+    '''
+    Run checks of a workspace as run(), but only run cached file checks
+    against files which were added or modified since a previous revision
+    (default: the newest older version, see dcheck.core.revisions), or
+    never checked. Results of unchanged files are taken from the cache;
+    checks which are not cached run against every file.
+    '''
+    workspace = pathlib.Path(workspace)
+    if file_checks is None:
+        file_checks = check_ids('file')
+    previous = previous or dcheck.core.revisions.previous_workspace(workspace)
+    changes = dcheck.core.revisions.diff(previous, workspace) \
+        if previous else None
+    cached = [
+        x for x in file_checks
+        if dcheck.checks.cache.enabled(dcheck.checks.get_check(x))]
+    uncached = [x for x in file_checks if x not in cached]
+    if changes is None or not cached:
+        yield from run(workspace, package_checks, file_checks,
+                       workers=workers, timeout=timeout)
+        return
+
+    manifest = dcheck.core.manifest.get_manifest(workspace)
+    digests = [file_digest(manifest, x) for x in changes.unchanged]
+    carried = []
+    missing = set()
+    for check_id in cached:
+        check = dcheck.checks.get_check(check_id)
+        results = dcheck.checks.cache.lookup_many(check, digests)
+        for filename, result in zip(changes.unchanged, results):
+            if result is None:
+                missing.add(filename)
+            else:
+                carried.append((check_id, filename, result))
+
+    # Unchanged files are only checked if they were never checked before
+    yield from (x for x in carried if x[1] not in missing)
+    files = changes.added + changes.modified \
+        + [x for x in changes.unchanged if x in missing]
+    yield from run(workspace, package_checks, cached, files, workers,
+                   timeout)
+    if uncached:
+        yield from run(workspace, [], uncached, None, workers, timeout)
+
+
+def main():
+    '''
+    Print results of all loaded checks for a workspace, re-checking only
+    files changed since its previous revision.
+    '''
+    workspace = pathlib.Path(sys.argv[1])
+    for check_id, filename, result in recheck(workspace):
+        print(f'{str(result):<5}  {check_id:<40}  {filename or "-"}')
+    print(f'Cache hit rate: {dcheck.checks.cache.hit_rate():.1%}')
+
+
+if __name__ == '__main__':
+    dcheck.core.bootstrap.start()
+    main()
@@ -0,0 +1,196 @@
+'''
+DCheck File Scan
+
+Read each workspace file once and share its contents with every file check.
+Files on disk are mapped (mmap) rather than read, so large files are only
+paged in as checks look at them.
+
+Checks read the current file with FileCheck.read() or FileCheck.lines().
+Checks with streaming = True instead receive the file in chunks through
+FileCheck.feed(); all streaming checks are fed from the same pass, and
+their time limit applies to start(), feed(), and finish() together.
+
+Contents are only valid while the file is scanned; checks must not keep
+views (memoryview) of them, as a mapping can not be closed while one is
+exported. Slices are copies and may be kept.
+'''
+# Python
+import contextlib
+import logging
+import mmap
+import os
+import pathlib
+import signal
+import time
+
+# DCheck
+import dcheck.core.config
+import dcheck.core.vfs
+
+
+class CheckTimeout(Exception):
+    '''
+    Raised within a check which runs longer than allowed.
+    '''
+
+
+def raise_timeout(signum, frame):
+    raise CheckTimeout()
+
+
+@contextlib.contextmanager
+def time_limit(seconds):
+    '''
+    Raise CheckTimeout if the body runs longer than seconds (if supported).
+    '''
+    if not seconds or not hasattr(signal, 'setitimer'):
+        yield
+        return
+    previous = signal.signal(signal.SIGALRM, raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def call(check, timeout, function, *args, spent=0.0) -> tuple:
+    '''
+    Call a method of a check within its time limit, less seconds already
+    spent by earlier calls of the same run.
+
+    Returns (True, value), or (False, None) if it failed or timed out.
+    '''
+    target = getattr(check, 'filename', None) or check.workspace
+    limit = check.timeout or timeout
+    try:
+        if limit and spent >= limit:
+            raise CheckTimeout()
+        with time_limit(limit and limit - spent):
+            return (True, function(*args))
+    except CheckTimeout:
+        logging.warning('Check %s timed out on %s', check.id, target)
+    except Exception:
+        logging.exception('Check %s failed on %s', check.id, target)
+    return (False, None)
+
+
+@contextlib.contextmanager
+def open_buffer(workspace, filename):
+    '''
+    Provide the contents of a workspace file as a bytes-like object; files
+    on disk are mapped and (virtual) archive members are read.
+    '''
+    path = pathlib.Path(workspace) / filename
+    if not path.is_file():
+        yield dcheck.core.vfs.get_workspace(workspace).read(filename)
+        return
+    with open(path, 'rb') as fh:
+        if not os.fstat(fh.fileno()).st_size:
+            yield b''
+            return
+        data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield data
+    finally:
+        try:
+            data.close()
+        except BufferError:
+            # Unmapped once the view is released
+            logging.warning('A check kept a view of %s after its scan',
+                            filename)
+
+
+def read_order(workspace, filenames) -> list:
+    '''
+    Return filenames sorted so members of (virtual) archives are read in
+    archive order, avoiding seeks back within compressed streams.
+    '''
+    workspace = pathlib.Path(workspace)
+    if not dcheck.core.vfs.has_index(workspace):
+        return list(filenames)
+    members = dcheck.core.vfs.get_workspace(workspace).members
+
+    def position(filename):
+        if filename not in members or (workspace / filename).is_file():
+            return ('', 0)
+        archive, member = members[filename]
+        return (archive, member[2])
+    return sorted(filenames, key=position)
+
+
+def lines(data):
+    '''
+    Iterate over lines (including line endings) of a bytes-like object.
+    '''
+    start = 0
+    while start < len(data):
+        end = data.find(b'\n', start)
+        end = len(data) if end < 0 else end + 1
+        yield data[start:end]
+        start = end
+
+
+def chunks(data, size=None):
+    '''
+    Iterate over a bytes-like object in chunks.
+    '''
+    size = size or dcheck.core.config.get('hash_buffer_size')
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def visit(data, checks, timeout) -> list:
+    '''
+    Run file checks against contents of their current file.
+    '''
+    spent = {}  # Seconds used so far by each streaming check
+
+    def stream(number, function, *args) -> tuple:
+        started = time.monotonic()
+        outcome = call(checks[number], timeout, function, *args,
+                       spent=spent.get(number, 0.0))
+        spent[number] = spent.get(number, 0.0) + time.monotonic() - started
+        return outcome
+
+    # Streaming checks are fed from a single pass over the file
+    streaming = {
+            number for number, check in enumerate(checks)
+            if check.streaming and stream(number, check.start)[0]}
+    for chunk in chunks(data):
+        for number in list(streaming):
+            if not stream(number, checks[number].feed, chunk)[0]:
+                streaming.discard(number)
+
+    results = []
+    for number, check in enumerate(checks):
+        if not check.streaming:
+            results.append(call(check, timeout, check.run_check)[1])
+        elif number in streaming:
+            results.append(stream(number, check.finish)[1])
+        else:
+            results.append(None)
+    return results
+
+
+def scan_file(workspace, filename, checks, timeout=None) -> list:
+    '''
+    Run file checks against a single file, reading it only once.
+
+    Returns results in the order of checks; None for checks which failed.
+    '''
+    for check in checks:
+        check.change_file(filename)
+    try:
+        with open_buffer(workspace, filename) as data:
+            for check in checks:
+                check.data = data
+            try:
+                return visit(data, checks, timeout)
+            finally:
+                for check in checks:
+                    check.data = None
+    except OSError:
+        logging.warning('Unable to read %s', filename)
+        return [None] * len(checks)
@@ -2,40 +2,1078 @@
 Functions for interacting with archives.
 '''
 # Python
+import base64
+import bisect
+import bz2
+import collections
+import concurrent.futures
+import contextlib
+import ctypes
+import ctypes.util
+import gzip
+import hashlib
+import io
+import lzma
+import os
 import tarfile
+import threading
 import zipfile
+import zlib
+
+# Optional
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 
 # Extensions which may be extracted
 supported_archives = {
         '.tar.gz': 'tar',
+        '.tar.bz2': 'tar',
+        '.tar.lzma': 'tar',
         '.tar.xz': 'tar',
         '.zip': 'zip',
         }
 
+# Decompressors of (seekable) tar streams, by extension
+compressed_streams = {
+        '.gz': gzip.open,
+        '.bz2': bz2.open,
+        '.lzma': lzma.open,
+        '.xz': lzma.open,
+        }
+
+# Errors which may be raised while reading a damaged archive
+errors = (tarfile.TarError, zipfile.BadZipFile, EOFError, lzma.LZMAError,
+          zlib.error)
+
+# .tar.zst requires the zstandard module
+if zstandard:
+    supported_archives['.tar.zst'] = 'tar'
+    compressed_streams['.zst'] = lambda path, mode: ZstdReader(path)
+    errors += (zstandard.ZstdError,)
+
+# Archive formats which can be extracted from a non-seekable stream
+streamable_archives = ['tar']
+
+# Compressed frames (zstd) larger than this are decompressed sequentially
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+# Threads decompressing xz blocks and zstd frames, shared by all streams
+# (see block_pool())
+loaded_pool = None
+loaded_pool_lock = threading.Lock()
+
+# Magic numbers (little endian) of zstd frames and skippable frames
+ZSTD_MAGIC = 0xfd2fb528
+ZSTD_SKIPPABLE = range(0x184d2a50, 0x184d2a60)
+
+# Refuse absolute paths, parent references, and special files when available
+extract_filter = {'filter': 'data'} if hasattr(tarfile, 'data_filter') else {}
+
+# Deflate history needed to resume decompression at a checkpoint
+WINDOW_SIZE = 32768
+
+# zlib.h constants used while searching for deflate block boundaries
+Z_OK = 0
+Z_STREAM_END = 1
+Z_BLOCK = 5
+
+# Magic bytes of an xz stream header and footer
+XZ_HEADER_MAGIC = b'\xfd7zXZ\x00'
+XZ_FOOTER_MAGIC = b'YZ'
+
+# Sizes of the check after each xz block, by check type
+XZ_CHECK_SIZES = [0, 4, 4, 4, 8, 8, 8, 16, 16, 16, 32, 32, 32, 64, 64, 64]
 
-def extract(path, dest):
+# Magic bytes which start another (concatenated) gzip or bzip2 stream
+GZIP_MAGIC = b'\x1f\x8b'
+BZIP2_MAGIC = b'BZh'
+
+
+class ZstdReader:
     '''
-    Extract an archive after guessing the correct format.
+    Seekable, decompressed view of a zstd file; zstandard readers can only
+    seek forward, so seeking backwards starts over from the beginning.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.fh = zstandard.open(path, 'rb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.fh.close()
+
+    def seek(self, offset, whence=io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET and offset < self.fh.tell():
+            self.fh.close()
+            self.fh = zstandard.open(self.path, 'rb')
+        return self.fh.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self.fh.tell()
+
+    def read(self, size=-1) -> bytes:
+        return self.fh.read(size)
+
+
+class ZStream(ctypes.Structure):
+    '''
+    The z_stream structure of zlib.h.
+    '''
+    _fields_ = [
+        ('next_in', ctypes.c_void_p),
+        ('avail_in', ctypes.c_uint),
+        ('total_in', ctypes.c_ulong),
+        ('next_out', ctypes.c_void_p),
+        ('avail_out', ctypes.c_uint),
+        ('total_out', ctypes.c_ulong),
+        ('msg', ctypes.c_char_p),
+        ('state', ctypes.c_void_p),
+        ('zalloc', ctypes.c_void_p),
+        ('zfree', ctypes.c_void_p),
+        ('opaque', ctypes.c_void_p),
+        ('data_type', ctypes.c_int),
+        ('adler', ctypes.c_ulong),
+        ('reserved', ctypes.c_ulong),
+        ]
+
+
+class TeeReader:
+    '''
+    Read-only file wrapper which passes every byte read to a set of hashers
+    and (optionally) an open copy destination.
+
+    Reads stop early, returning b'', once cancel (threading.Event) is set.
+    '''
+    def __init__(self, fh, hashers, copy=None, cancel=None):
+        self.fh = fh
+        self.hashers = hashers
+        self.copy = copy
+        self.cancel = cancel
+
+    def read(self, size=-1):
+        if self.cancel and self.cancel.is_set():
+            return b''
+        chunk = self.fh.read(size)
+        for hasher in self.hashers:
+            hasher.update(chunk)
+        if self.copy:
+            self.copy.write(chunk)
+        return chunk
+
+    def drain(self, size):
+        '''
+        Consume the remainder of the file, size bytes at a time.
+        '''
+        while self.read(size):
+            pass
+
+
+class HashingTarFile(tarfile.TarFile):
+    '''
+    Tar reader which hashes (sha256) regular files while extracting them
+    when digests is set, recording {absolute path: sha256} in it.
+    '''
+    digests = None
+
+    def makefile(self, tarinfo, targetpath):
+        if self.digests is None or tarinfo.sparse is not None:
+            super().makefile(tarinfo, targetpath)
+            return
+        hasher = hashlib.sha256()
+        bufsize = self.copybufsize or 1048576
+        remaining = tarinfo.size
+        self.fileobj.seek(tarinfo.offset_data)
+        with open(targetpath, 'wb') as target:
+            while remaining:
+                data = self.fileobj.read(min(bufsize, remaining))
+                if not data:
+                    raise tarfile.ReadError('unexpected end of data')
+                hasher.update(data)
+                target.write(data)
+                remaining -= len(data)
+        self.digests[os.path.abspath(targetpath)] = hasher.hexdigest()
+
+    def makelink(self, tarinfo, targetpath):
+        if self.digests is not None:
+            self.digests.pop(os.path.abspath(targetpath), None)
+        super().makelink(tarinfo, targetpath)
+
+
+class PeekReader:
+    '''
+    Sequential reader which allows looking ahead without consuming data.
+    '''
+    def __init__(self, fh, bufsize=tarfile.RECORDSIZE):
+        self.fh = fh
+        self.bufsize = bufsize
+        self.buffer = bytearray()
+        self.position = 0
+
+    def peek(self, size) -> bytes:
+        while len(self.buffer) < size and (chunk := self.fh.read(
+                max(self.bufsize, size - len(self.buffer)))):
+            self.buffer += chunk
+        return bytes(self.buffer[:size])
+
+    def read(self, size) -> bytes:
+        data = self.peek(size)
+        del self.buffer[:len(data)]
+        self.position += len(data)
+        return data
+
+    def unread(self, data):
+        self.buffer[:0] = data
+        self.position -= len(data)
+
+    def read_vli(self) -> int:
+        '''
+        Consume an xz variable-length integer.
+        '''
+        value, length = read_vli(self.peek(9), 0)
+        self.read(length)
+        return value
+
+
+class ChunkReader:
+    '''
+    Read-only file object over an iterator of byte strings.
+    '''
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.buffer = bytearray()
+
+    def read(self, size=-1) -> bytes:
+        while size < 0 or len(self.buffer) < size:
+            if (chunk := next(self.chunks, None)) is None:
+                break
+            self.buffer += chunk
+        if size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def close(self):
+        self.chunks.close()
+
+
+def archive_type(path):
+    '''
+    Return the archive type (supported_archives) of a path, or None.
     '''
-    # Unpack archive using first-matched suffix
     for sfx, using in supported_archives.items():
         if str(path).endswith(sfx):
-            globals()[f'extract_{using}'](path, dest)
-            return
+            return using
+    return None
 
 
-def extract_tar(path, dest):
+def extract(path, dest, name=None):
     '''
-    Extract a tar archive into a destination directory.
+    Extract an archive after guessing the correct format (from name or path).
     '''
-    with tarfile.open(path) as fh:
-        fh.extractall(dest)
+    # Unpack archive using first-matched suffix
+    if using := archive_type(name or path):
+        globals()[f'extract_{using}'](path, dest)
+
+
+def extract_stream(fileobj, path, dest, bufsize=tarfile.RECORDSIZE,
+                   workers=None, digests=None):
+    '''
+    Extract an archive while reading it sequentially from fileobj.
+
+    The sha256 of extracted files is recorded in digests (see
+    HashingTarFile) when given.
+    Returns False if the format of path can not be read as a stream.
+    '''
+    if (using := archive_type(path)) not in streamable_archives:
+        return False
+    reader = decompress_stream(fileobj, path, bufsize, workers)
+    try:
+        globals()[f'extract_{using}'](
+                reader, dest, bufsize=bufsize, digests=digests)
+    finally:
+        reader.close()
+    return True
+
+
+@contextlib.contextmanager
+def open_tar(path, bufsize=None):
+    '''
+    Open a tar archive at path, or read sequentially from a (decompressed)
+    file object in place of path when bufsize is set.
+    '''
+    if bufsize:
+        with HashingTarFile.open(
+                fileobj=path, mode='r|', bufsize=bufsize) as fh:
+            yield fh
+    else:
+        with open_decompressed(path) as raw, \
+                HashingTarFile.open(fileobj=raw) as fh:
+            yield fh
+
+
+def extract_tar(path, dest, bufsize=None, digests=None):
+    '''
+    Extract a tar archive into a destination directory, recording the
+    sha256 of extracted files in digests when given.
+
+    A file object may be provided in place of path when bufsize is set.
+    '''
+    with open_tar(path, bufsize) as fh:
+        fh.digests = digests
+        fh.extractall(dest, **extract_filter)
 
 
 def extract_zip(path, dest):
     '''
     Extract a zip archive into a destination directory.
     '''
-    with zipfile.open(path) as fh:
+    with zipfile.ZipFile(path) as fh:
         fh.extractall(dest)
+
+
+def index(path, name=None) -> list:
+    '''
+    Return a member index of an archive (see index_tar) after guessing the
+    correct format (from name or path).
+    '''
+    if using := archive_type(name or path):
+        return globals()[f'index_{using}'](path)
+    return []
+
+
+def index_stream(fileobj, path, bufsize=tarfile.RECORDSIZE, workers=None,
+                 checkpoints=None, spacing=1048576):
+    '''
+    Index an archive while reading it sequentially from fileobj, recording
+    decompression checkpoints in checkpoints when given (see
+    decompress_stream()).
+
+    Returns None if the format of path can not be read as a stream.
+    '''
+    if (using := archive_type(path)) not in streamable_archives:
+        return None
+    reader = decompress_stream(
+            fileobj, path, bufsize, workers, checkpoints, spacing)
+    try:
+        members = globals()[f'index_{using}'](reader, bufsize=bufsize)
+        # Checkpoints are complete at the end of the data
+        if checkpoints is not None:
+            while reader.read(bufsize):
+                pass
+        return members
+    finally:
+        reader.close()
+
+
+def index_tar(path, bufsize=None) -> list:
+    '''
+    Return [[name, type, offset, size, mode, linkname], ...] for members of
+    a tar archive, where type is one of f(ile), d(irectory), l (symlink), or
+    h(ardlink) and offset is the position of member data in the
+    decompressed tar stream.
+
+    A file object may be provided in place of path when bufsize is set.
+    '''
+    members = []
+    with open_tar(path, bufsize) as fh:
+        for m in fh:
+            if m.isreg():
+                kind = 'f'
+            elif m.isdir():
+                kind = 'd'
+            elif m.issym():
+                kind = 'l'
+            elif m.islnk():
+                kind = 'h'
+            else:
+                continue
+            members.append(
+                    [m.name, kind, m.offset_data, m.size, m.mode, m.linkname])
+    return members
+
+
+def decompress_stream(fileobj, name, bufsize=tarfile.RECORDSIZE,
+                      workers=None, checkpoints=None,
+                      spacing=1048576) -> ChunkReader:
+    '''
+    Return a sequential reader of the decompressed contents of fileobj, in
+    the compression format given by the suffix of name.
+
+    Multi-block xz (xz -T) and multi-frame zstd (pzstd) data is decompressed
+    in parallel, up to workers blocks ahead of what is being read, on the
+    threads of block_pool().
+
+    When checkpoints (a dictionary) is given, gz and xz checkpoints (see
+    checkpoints()) at least spacing bytes apart are recorded in it once the
+    reader reached the end of the data.
+    '''
+    name = str(name)
+    workers = workers or os.cpu_count()
+    if name.endswith('.gz') and checkpoints is not None:
+        chunks = iter_gz(
+                PeekReader(fileobj, bufsize), bufsize, spacing, checkpoints)
+    elif name.endswith('.gz'):
+        chunks = iter_decompressed(
+                fileobj, lambda: zlib.decompressobj(31), bufsize, GZIP_MAGIC)
+    elif name.endswith('.bz2'):
+        chunks = iter_decompressed(
+                fileobj, bz2.BZ2Decompressor, bufsize, BZIP2_MAGIC)
+    elif name.endswith('.lzma'):
+        chunks = iter_decompressed(
+                fileobj, lambda: lzma.LZMADecompressor(lzma.FORMAT_ALONE),
+                bufsize)
+    elif name.endswith('.xz'):
+        chunks = iter_xz(
+                PeekReader(fileobj, bufsize), bufsize, workers, spacing,
+                checkpoints)
+    elif name.endswith('.zst') and zstandard:
+        chunks = iter_zstd(PeekReader(fileobj, bufsize), bufsize, workers)
+    else:
+        chunks = iter_raw(fileobj, bufsize)
+    return ChunkReader(chunks)
+
+
+def iter_raw(fileobj, bufsize):
+    '''
+    Yield data of an uncompressed fileobj.
+    '''
+    while data := fileobj.read(bufsize):
+        yield data
+
+
+def iter_decompressed(fileobj, new, bufsize, magic=None):
+    '''
+    Yield decompressed data of fileobj, where new() returns a decompressor.
+
+    Concatenated streams are read as long as they start with magic.
+    '''
+    decompressor = new()
+    while not decompressor.eof:
+        if not (data := fileobj.read(bufsize)):
+            raise EOFError('Compressed file ended before the end-of-stream '
+                           'marker was reached')
+        while data:
+            yield decompressor.decompress(data)
+            if not decompressor.eof:
+                break
+            data = decompressor.unused_data or fileobj.read(bufsize)
+            if not magic or not data.startswith(magic):
+                return
+            decompressor = new()
+
+
+def block_pool() -> concurrent.futures.ThreadPoolExecutor:
+    '''
+    Return the thread pool which decompresses xz blocks and zstd frames.
+
+    A single pool, with a thread per CPU, is shared by all streams, so
+    decompressing many files at once (see dcheck.core.inspect.ingest_files)
+    does not multiply the number of threads.
+    '''
+    global loaded_pool
+    with loaded_pool_lock:
+        if loaded_pool is None:
+            loaded_pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=os.cpu_count(),
+                    thread_name_prefix='decompress')
+        return loaded_pool
+
+
+def reset_pool():
+    '''
+    Forget the threads of a parent process after fork().
+    '''
+    global loaded_pool, loaded_pool_lock
+    loaded_pool = None
+    loaded_pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=reset_pool)
+
+
+def decompress_block(data) -> bytes:
+    '''
+    Decompress a complete xz stream header and block.
+    '''
+    return lzma.LZMADecompressor(lzma.FORMAT_XZ).decompress(data)
+
+
+def iter_xz_block(source, check, bufsize):
+    '''
+    Yield decompressed data of the next xz block in source, read
+    sequentially with a raw decoder for the filters in its header.
+
+    CRC32 and SHA-256 checks are verified; CRC64 is not available in the
+    standard library, so those blocks rely on the file checksums instead.
+    '''
+    begin = source.position
+    block_header = source.read((source.peek(1)[0] + 1) * 4)
+    if zlib.crc32(block_header[:-4]) != \
+            int.from_bytes(block_header[-4:], 'little'):
+        raise lzma.LZMAError('Corrupt input data')
+    flags = block_header[1]
+    pos = 2
+    size = None
+    if flags & 0x40:
+        pos = read_vli(block_header, pos)[1]
+    if flags & 0x80:
+        size, pos = read_vli(block_header, pos)
+    filters = []
+    for _ in range((flags & 0x03) + 1):
+        filter_id, pos = read_vli(block_header, pos)
+        length, pos = read_vli(block_header, pos)
+        filters.append(lzma._decode_filter_properties(
+                filter_id, block_header[pos:pos + length]))
+        pos += length
+
+    decompressor = lzma.LZMADecompressor(lzma.FORMAT_RAW, filters=filters)
+    crc = 0
+    digest = hashlib.sha256() if check == 0x0a else None
+    total_out = 0
+    while not decompressor.eof:
+        if not (data := source.read(bufsize)):
+            raise EOFError('Compressed file ended before the '
+                           'end-of-stream marker was reached')
+        chunk = decompressor.decompress(data)
+        if check == 0x01:
+            crc = zlib.crc32(chunk, crc)
+        elif digest:
+            digest.update(chunk)
+        total_out += len(chunk)
+        yield chunk
+    source.unread(decompressor.unused_data)
+
+    # Block padding and check
+    source.read(-(source.position - begin) & 3)
+    value = source.read(XZ_CHECK_SIZES[check])
+    if size is not None and size != total_out or check == 0x01 and \
+            crc != int.from_bytes(value, 'little') or \
+            digest and digest.digest() != value:
+        raise lzma.LZMAError('Corrupt input data')
+
+
+def iter_xz(source, bufsize, workers, spacing=None, found=None):
+    '''
+    Yield decompressed data of (possibly concatenated) xz streams.
+
+    Blocks which record their compressed size in their header (as written by
+    xz -T) are read whole and decompressed by block_pool(). Streams starting
+    with a block which does not (xz -T1) are decompressed sequentially, as
+    are later blocks which do not (see iter_xz_block()).
+
+    Checkpoints (see checkpoints()) are recorded in found, when given. Each
+    point is [offset, decompressed offset, stream header offset, stream
+    index offset]; every xz block can be decompressed on its own, so blocks
+    are used as points wherever they are at least spacing bytes apart.
+    '''
+    pool = block_pool()
+    pending = collections.deque()
+    points = []
+    total_out = last = 0
+
+    def add_point(offset, start, first):
+        nonlocal last
+        if first or total_out - last >= spacing:
+            points.append([offset, total_out, start, None])
+            last = total_out
+
+    try:
+        while (header := source.read(12)):
+            if len(header) < 12 or header[:6] != XZ_HEADER_MAGIC:
+                raise lzma.LZMAError('Input format not supported by decoder')
+            start = source.position - 12
+            check = header[7] & 0x0f
+            check_size = XZ_CHECK_SIZES[check]
+
+            parallel = None
+            while (size := source.peek(1)) and size[0]:
+                block_header = source.peek((size[0] + 1) * 4)
+                if block_header[1] & 0x40:
+                    compressed = read_vli(block_header, 2)[0]
+                elif not parallel:
+                    parallel = False
+                    break
+                else:
+                    # Decompress the rest of the stream sequentially, one
+                    # block at a time (its index is skipped below)
+                    while pending:
+                        job, offset, first = pending.popleft()
+                        add_point(offset, start, first)
+                        data = job.result()
+                        total_out += len(data)
+                        yield data
+                    add_point(source.position, start, False)
+                    for data in iter_xz_block(source, check, bufsize):
+                        total_out += len(data)
+                        yield data
+                    continue
+                length = (len(block_header) + compressed + 3) & ~3
+                offset = source.position
+                block = source.read(length + check_size)
+                pending.append((
+                        pool.submit(decompress_block, header + block),
+                        offset, not parallel))
+                parallel = True
+                while len(pending) > workers:
+                    job, offset, first = pending.popleft()
+                    add_point(offset, start, first)
+                    data = job.result()
+                    total_out += len(data)
+                    yield data
+
+            if parallel is False:
+                add_point(source.position, start, True)
+                decompressor = lzma.LZMADecompressor(lzma.FORMAT_XZ)
+                decompressor.decompress(header)
+                tail = b''
+                while not decompressor.eof:
+                    if not (data := source.read(bufsize)):
+                        raise EOFError('Compressed file ended before the '
+                                       'end-of-stream marker was reached')
+                    chunk = decompressor.decompress(data)
+                    total_out += len(chunk)
+                    yield chunk
+                    tail = (tail + data)[-12 - len(data):]
+                source.unread(decompressor.unused_data)
+                # Find the index from the stream footer
+                footer = tail[:len(tail) - len(decompressor.unused_data)]
+                index = source.position - 12 - (int.from_bytes(
+                        footer[-8:-4], 'little') + 1) * 4
+            else:
+                while pending:
+                    job, offset, first = pending.popleft()
+                    add_point(offset, start, first)
+                    data = job.result()
+                    total_out += len(data)
+                    yield data
+                # Skip the index (records, padding, CRC32) and stream footer
+                index = source.position
+                if source.read(1) != b'\0':
+                    raise EOFError('Compressed file ended before the '
+                                   'end-of-stream marker was reached')
+                for _ in range(source.read_vli() * 2):
+                    source.read_vli()
+                source.read((-(source.position - index) & 3) + 4 + 12)
+            for point in points:
+                if point[2] == start:
+                    point[3] = index
+
+            # Stream padding
+            while source.peek(4) == b'\0' * 4:
+                source.read(4)
+    finally:
+        for job, offset, first in pending:
+            job.cancel()
+    record_checkpoints(found, 'xz', total_out, points)
+
+
+def decompress_frame(data) -> bytes:
+    '''
+    Decompress a complete zstd frame.
+    '''
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+def iter_zstd(source, bufsize, workers):
+    '''
+    Yield decompressed data of zstd frames.
+
+    Frames up to MAX_FRAME_SIZE are read whole and decompressed by
+    block_pool(); larger ones are decompressed sequentially, block by block.
+    '''
+    pool = block_pool()
+    pending = collections.deque()
+    try:
+        while (magic := source.peek(4)):
+            magic = int.from_bytes(magic, 'little')
+            if magic in ZSTD_SKIPPABLE:
+                source.read(8 + int.from_bytes(source.peek(8)[4:], 'little'))
+                continue
+            if magic != ZSTD_MAGIC:
+                raise zstandard.ZstdError('Unknown frame descriptor')
+
+            # Frame header
+            descriptor = source.peek(5)[4]
+            length = 5 + (not descriptor & 0x20) \
+                + [0, 1, 2, 4][descriptor & 0x03] \
+                + [int(bool(descriptor & 0x20)), 2, 4, 8][descriptor >> 6]
+            frame = bytearray(source.read(length))
+            decompressor = None
+
+            # Blocks: 3 byte header of last flag, type, and size
+            last = False
+            while not last:
+                block_header = source.read(3)
+                if len(block_header) < 3:
+                    raise EOFError('Compressed file ended before the '
+                                   'end-of-frame marker was reached')
+                value = int.from_bytes(block_header, 'little')
+                last = value & 1
+                size = 1 if (value >> 1) & 3 == 1 else value >> 3
+                data = block_header + source.read(size)
+                if last and descriptor & 0x04:
+                    data += source.read(4)
+                if decompressor is None and len(frame) < MAX_FRAME_SIZE:
+                    frame += data
+                    continue
+                if decompressor is None:
+                    while pending:
+                        yield pending.popleft().result()
+                    decompressor = \
+                        zstandard.ZstdDecompressor().decompressobj()
+                    data = bytes(frame) + data
+                yield decompressor.decompress(data)
+
+            if decompressor is None:
+                pending.append(pool.submit(decompress_frame, bytes(frame)))
+                while len(pending) > workers:
+                    yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for job in pending:
+            job.cancel()
+
+
+def index_zip(path) -> list:
+    '''
+    Return a member index (see index_tar) of a zip archive; offset is the
+    position of each member's local header.
+    '''
+    with zipfile.ZipFile(path) as fh:
+        return [
+            [m.filename, 'd' if m.is_dir() else 'f', m.header_offset,
+             m.file_size, (m.external_attr >> 16) & 0o7777, '']
+            for m in fh.infolist()]
+
+
+def open_decompressed(path, checkpoints=None):
+    '''
+    Return a seekable, decompressed binary file object for a tar archive.
+
+    Seeking resumes from the nearest of any provided checkpoints (see
+    checkpoints()) instead of decompressing from the start of the file.
+    '''
+    if checkpoints:
+        return CheckpointReader(path, checkpoints)
+    for sfx, opener in compressed_streams.items():
+        if str(path).endswith(sfx):
+            return opener(path, 'rb')
+    return open(path, 'rb')
+
+
+def read_member(path, member, fh=None) -> bytes:
+    '''
+    Return data of a regular file member (from index) of an archive.
+
+    An already open_decompressed() file may be reused with fh.
+    '''
+    name, kind, offset, size, mode, linkname = member
+    if archive_type(path) == 'zip':
+        with zipfile.ZipFile(path) as zf:
+            return zf.read(name)
+    opened = contextlib.nullcontext(fh) if fh else open_decompressed(path)
+    with opened as fh:
+        fh.seek(offset)
+        return fh.read(size)
+
+
+def checkpoints(path, spacing=1048576, name=None):
+    '''
+    Return {'format': 'gz' or 'xz', 'size': size, 'points': [...]} where
+    points are positions, at least spacing (decompressed) bytes apart, from
+    which a compressed file can be decompressed without reading what comes
+    before them. Returns None if the format (from name or path) does not
+    support checkpoints or the file has too few of them to be of use.
+
+    This reads the whole file; files which are read anyway should record
+    checkpoints while they are read instead (see decompress_stream()).
+    '''
+    name = str(name or path)
+    if not name.endswith(('.gz', '.xz')):
+        return None
+    found = {}
+    try:
+        with open(path, 'rb') as fh:
+            reader = decompress_stream(
+                    fh, name, checkpoints=found, spacing=spacing)
+            try:
+                while reader.read(1048576):
+                    pass
+            finally:
+                reader.close()
+    except (OSError, ValueError, IndexError, *errors):
+        return None
+    return found or None
+
+
+def record_checkpoints(found, using, size, points):
+    '''
+    Store checkpoints of a complete stream in found (if given), unless there
+    are too few of them to be of use.
+    '''
+    if found is not None and len(points) >= 2:
+        found.update({'format': using, 'size': size, 'points': points})
+
+
+def iter_gz(source, bufsize, spacing, found):
+    '''
+    Yield decompressed data of a gzip file (PeekReader), recording
+    checkpoints (see checkpoints()) of its first member in found.
+
+    Each point is [offset, decompressed offset, window], where window is the
+    (compressed, base64 encoded) history a deflate block may refer back to.
+    Only blocks starting on a byte boundary are used, so decompression can
+    resume with zlib alone; block boundaries are found with libz directly
+    since the zlib module does not report them. No checkpoints are recorded
+    for files of several gzip members.
+    '''
+    if not (libz_name := ctypes.util.find_library('z')):
+        yield from iter_decompressed(
+                source, lambda: zlib.decompressobj(31), bufsize, GZIP_MAGIC)
+        return
+    libz = ctypes.CDLL(libz_name)
+    libz.zlibVersion.restype = ctypes.c_char_p
+
+    strm = ZStream()
+    # 47 = 15 (window bits) + 32 (detect a zlib or gzip header)
+    if libz.inflateInit2_(ctypes.byref(strm), 47, libz.zlibVersion(),
+                          ctypes.sizeof(strm)) != Z_OK:
+        raise zlib.error('Unable to initialize libz')
+    window = ctypes.create_string_buffer(WINDOW_SIZE)
+    points = []
+    total_in = total_out = last = 0
+    ret = Z_OK
+    try:
+        while ret != Z_STREAM_END:
+            if not (data := source.read(bufsize)):
+                raise EOFError('Compressed file ended before the '
+                               'end-of-stream marker was reached')
+            inbuf = ctypes.create_string_buffer(data, len(data))
+            strm.next_in = ctypes.addressof(inbuf)
+            strm.avail_in = len(data)
+            while strm.avail_in and ret != Z_STREAM_END:
+                # Output wraps around window, always holding its history
+                if not strm.avail_out:
+                    strm.next_out = ctypes.addressof(window)
+                    strm.avail_out = WINDOW_SIZE
+                split = WINDOW_SIZE - strm.avail_out
+                total_in += strm.avail_in
+                total_out += strm.avail_out
+                ret = libz.inflate(ctypes.byref(strm), Z_BLOCK)
+                total_in -= strm.avail_in
+                total_out -= strm.avail_out
+                if ret not in (Z_OK, Z_STREAM_END):
+                    raise zlib.error(f'Error {ret} while decompressing data')
+                if (end := WINDOW_SIZE - strm.avail_out) > split:
+                    yield ctypes.string_at(
+                            ctypes.addressof(window) + split, end - split)
+
+                # 128: at a block boundary, 64: last block, 7: used bits
+                if strm.data_type & 0xc7 != 128:
+                    continue
+                if total_out and total_out - last < spacing:
+                    continue
+                split = WINDOW_SIZE - strm.avail_out
+                history = window.raw[split:] + window.raw[:split]
+                history = history[-min(total_out, WINDOW_SIZE):] \
+                    if total_out else b''
+                points.append([
+                    total_in, total_out,
+                    base64.b64encode(zlib.compress(history)).decode()])
+                last = total_out
+        source.unread(ctypes.string_at(strm.next_in, strm.avail_in))
+    finally:
+        libz.inflateEnd(ctypes.byref(strm))
+
+    # Further gzip members are decompressed without checkpoints
+    if source.peek(2) == GZIP_MAGIC:
+        yield from iter_decompressed(
+                source, lambda: zlib.decompressobj(31), bufsize, GZIP_MAGIC)
+    else:
+        record_checkpoints(found, 'gz', total_out, points)
+
+
+def read_vli(data, pos):
+    '''
+    Return (value, next position) of an xz variable-length integer.
+    '''
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def checkpoints_xz(path, spacing):
+    '''
+    Return checkpoints of an xz file, read from the index of its streams.
+
+    Each point is [offset, decompressed offset, stream header offset,
+    stream index offset]; every xz block can be decompressed on its own, so
+    (multi-block) files only need their index to be read.
+    '''
+    streams = []
+    with open(path, 'rb') as fh:
+        end = fh.seek(0, io.SEEK_END)
+        while end > 0:
+            # Skip stream padding
+            fh.seek(end - 4)
+            if fh.read(4) == b'\0' * 4:
+                end -= 4
+                continue
+            fh.seek(end - 12)
+            footer = fh.read(12)
+            if footer[10:] != XZ_FOOTER_MAGIC:
+                return None
+            backward = (int.from_bytes(footer[4:8], 'little') + 1) * 4
+            index_start = end - 12 - backward
+            fh.seek(index_start)
+            data = fh.read(backward)
+            if data[0] != 0:
+                return None
+            count, pos = read_vli(data, 1)
+            blocks = []
+            for _ in range(count):
+                unpadded, pos = read_vli(data, pos)
+                size, pos = read_vli(data, pos)
+                blocks.append(((unpadded + 3) & ~3, size))
+            start = index_start - sum(x[0] for x in blocks) - 12
+            fh.seek(start)
+            if fh.read(6) != XZ_HEADER_MAGIC:
+                return None
+            streams.insert(0, (start, index_start, blocks))
+            end = start
+
+    points = []
+    total_out = last = 0
+    for start, index_start, blocks in streams:
+        offset = start + 12
+        for number, (size, uncompressed) in enumerate(blocks):
+            if not number or total_out - last >= spacing:
+                points.append([offset, total_out, start, index_start])
+                last = total_out
+            offset += size
+            total_out += uncompressed
+    return {'format': 'xz', 'size': total_out, 'points': points}
+
+
+class CheckpointReader:
+    '''
+    Seekable, decompressed view of a gz/xz file which resumes decompression
+    from the nearest checkpoint (see checkpoints()).
+    '''
+    def __init__(self, path, index, bufsize=65536):
+        self.fh = open(path, 'rb')
+        self.index = index
+        self.offsets = [point[1] for point in index['points']]
+        self.bufsize = bufsize
+        self.restart(0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.fh.close()
+
+    def restart(self, number):
+        '''
+        Start decompressing from a given checkpoint.
+        '''
+        point = self.index['points'][number]
+        self.point = number
+        self.position = point[1]
+        self.pending = bytearray()
+        if self.index['format'] == 'gz':
+            window = zlib.decompress(base64.b64decode(point[2]))
+            if window:
+                self.decompressor = zlib.decompressobj(-15, zdict=window)
+            else:
+                self.decompressor = zlib.decompressobj(-15)
+            self.limit = None
+        else:
+            # Blocks are decoded as part of their stream, up to its index
+            self.fh.seek(point[2])
+            self.decompressor = lzma.LZMADecompressor()
+            self.decompressor.decompress(self.fh.read(12))
+            self.limit = point[3]
+        self.fh.seek(point[0])
+
+    def fill(self) -> bool:
+        '''
+        Decompress more data into pending; returns False at the end.
+        '''
+        points = self.index['points']
+        while True:
+            if self.index['format'] == 'gz':
+                if self.decompressor.eof:
+                    return False
+                data = self.decompressor.unconsumed_tail \
+                    or self.fh.read(self.bufsize)
+            elif self.decompressor.needs_input:
+                data = self.fh.read(
+                        min(self.bufsize, self.limit - self.fh.tell()))
+            else:
+                data = b''
+            if not data and (self.index['format'] == 'gz'
+                             or self.decompressor.needs_input):
+                # Continue with the next xz stream, if any
+                end = self.position + len(self.pending)
+                following = [
+                    number for number in range(self.point + 1, len(points))
+                    if points[number][0] > (self.limit or 0)]
+                if not following:
+                    return False
+                pending = self.pending
+                self.restart(following[0])
+                self.position = end - len(pending)
+                self.pending = pending
+                continue
+            if chunk := self.decompressor.decompress(data, self.bufsize):
+                self.pending += chunk
+                return True
+
+    def seek(self, offset, whence=io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation('Only SEEK_SET and SEEK_CUR')
+        number = max(bisect.bisect_right(self.offsets, offset) - 1, 0)
+        # Going back, or a checkpoint is closer than continuing from here
+        if offset < self.position or \
+                self.offsets[number] > self.position + len(self.pending):
+            self.restart(number)
+        while True:
+            skip = min(offset - self.position, len(self.pending))
+            del self.pending[:skip]
+            self.position += skip
+            if self.position >= offset or not self.fill():
+                return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def read(self, size=-1) -> bytes:
+        while (size < 0 or len(self.pending) < size) and self.fill():
+            pass
+        if size < 0:
+            size = len(self.pending)
+        data = bytes(self.pending[:size])
+        del self.pending[:size]
+        self.position += len(data)
+        return data
@@ -0,0 +1,98 @@
+'''
+DCheck Verification Cache
+
+Remember verification results for files which have not changed on disk.
+'''
+# Python
+import os
+import threading
+
+# DCheck
+import dcheck.core.config
+import dcheck.core.data
+
+
+class HitCounter:
+    '''
+    Hits and misses of a cache seen by this process.
+    '''
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def count(self, hits, misses):
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+
+    def hit_rate(self) -> float:
+        '''
+        Return the fraction of lookups answered from the cache.
+        '''
+        with self.lock:
+            total = self.hits + self.misses
+            return self.hits / total if total else 0.0
+
+
+# Verification cache hits and misses
+stats = HitCounter()
+hit_rate = stats.hit_rate
+
+
+def file_identity(path) -> list:
+    '''
+    Return (device, inode, size, mtime_ns) of a file at a given path.
+    '''
+    st = os.stat(path)
+    return [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+def cache_key(path) -> str:
+    '''
+    Return the data key used for a given path.
+    '''
+    return f'verify/{os.path.abspath(path)}'
+
+
+def lookup(path, kind, expected):
+    '''
+    Return a cached result of kind (e.g. 'checksum') for an expected value,
+    or None if the file changed or was never verified.
+    '''
+    if not dcheck.core.config.get('verify_cache'):
+        return None
+    result = None
+    entry = dcheck.core.data.get(cache_key(path))
+    try:
+        if entry and entry['identity'] == file_identity(path):
+            result = entry.get(kind, {}).get(expected)
+    except OSError:
+        pass
+
+    stats.count(result is not None, result is None)
+    return result
+
+
+def store(path, kind, expected, result):
+    '''
+    Record a successful verification result of kind for an expected value.
+    '''
+    if not dcheck.core.config.get('verify_cache'):
+        return
+    key = cache_key(path)
+    identity = file_identity(path)
+
+    # Results for an older version of the file are discarded
+    entry = dcheck.core.data.get(key)
+    if not entry or entry['identity'] != identity:
+        entry = {'identity': identity}
+    entry.setdefault(kind, {})[expected] = result
+    dcheck.core.data.set(key, entry)
+
+
+def invalidate(path):
+    '''
+    Forget all verification results for a given path.
+    '''
+    dcheck.core.data.delete(cache_key(path))
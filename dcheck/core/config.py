@@ -9,9 +9,28 @@ import yaml
 # Default values
 DEFAULT_CONFIGURATION = {
     'loglevel': 'INFO',
-    'checklists': ['integrity'],
+    'checklists': ['integrity', 'binaries'],
+    'result_cache': True,
+    'approval_reuse': True,
+    'reviewer': None,
+    'check_workers': None,
+    'check_timeout': 60,
+    'license_scan_window': 65536,
+    'copy_similarity': 0.8,
     'pending_dir': '/var/cache/dcheck/pending',
     'workspace_dir': '/var/cache/dcheck/extracted',
+    'ingest_workers': None,
+    'hash_buffer_size': 1048576,
+    'ingest_link': True,
+    'verify_cache': True,
+    'gpg_home': None,
+    'ingest_daemon_workers': 2,
+    'ingest_poll_interval': 30,
+    'workspace_store': True,
+    'store_gc_interval': 3600,
+    'virtual_workspace': False,
+    'checkpoint_spacing': 1048576,
+    'workspace_manifest': True,
     'i18n_dir': None,
     'default_lang': 'en',
     'data_engine': 'redis',
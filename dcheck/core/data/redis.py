@@ -23,8 +23,45 @@ class DataEngine:
             return json.loads(value)
         return None
 
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return []
+        return [
+            json.loads(value) if value else None
+            for value in self.connection.mget(keys)]
+
     def set(self, key, value):
         self.connection.set(key, json.dumps(value))
 
+    def set_many(self, items):
+        values = {key: json.dumps(value) for key, value in dict(items).items()}
+        if values:
+            self.connection.mset(values)
+
+    def delete(self, key):
+        self.connection.delete(key)
+
     def keys(self, pattern):
-        return self.connection.keys(pattern)
+        return [x.decode() for x in self.connection.keys(pattern)]
+
+    def hget(self, key, field):
+        value = self.connection.hget(key, field)
+        if value:
+            return json.loads(value)
+        return None
+
+    def hgetall(self, key):
+        return {
+            field.decode(): json.loads(value)
+            for field, value in self.connection.hgetall(key).items()}
+
+    def hset(self, key, mapping):
+        values = {field: json.dumps(value) for field, value
+                  in dict(mapping).items()}
+        if values:
+            self.connection.hset(key, mapping=values)
+
+    def hdel(self, key, *fields):
+        if fields:
+            self.connection.hdel(key, *fields)
@@ -2,19 +2,37 @@
 DCheck Data - Sqlite Backend
 '''
 # Python
+import json
 import sqlite3
+import threading
 
 # DCheck
 import dcheck.core.config
 
 
+def decode(value):
+    '''
+    Return a stored value; rows written before values were JSON-encoded
+    hold the raw value.
+    '''
+    if not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
 class DataEngine:
     '''
     Connect dcheck data to a sqlite backend.
     '''
     def __init__(self):
+        # Shared by worker threads; access is serialized with self.lock
         self.connection = sqlite3.connect(
-                dcheck.core.config.get('sqlite_path'))
+                dcheck.core.config.get('sqlite_path'),
+                check_same_thread=False)
+        self.lock = threading.RLock()
         self._create_schema()
 
     def _create_schema(self):
@@ -25,6 +43,14 @@ class DataEngine:
                 value TEXT
             )
         ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS hashes (
+                key TEXT,
+                field TEXT,
+                value TEXT,
+                PRIMARY KEY (key, field)
+            )
+        ''')
         self.connection.commit()
         cursor.close()
 
@@ -32,31 +58,132 @@ class DataEngine:
         '''
         Set a value in SQLite
         '''
-        cursor = self.connection.cursor()
-        cursor.execute(
-                'INSERT OR REPLACE INTO data (key, value) VALUES (?, ?)',
-                (key, value))
-        self.connection.commit()
-        cursor.close()
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute(
+                    'INSERT OR REPLACE INTO data (key, value) VALUES (?, ?)',
+                    (key, json.dumps(value)))
+            self.connection.commit()
+            cursor.close()
+
+    def set_many(self, items):
+        '''
+        Set many values in SQLite, as a single transaction
+        '''
+        rows = [(key, json.dumps(value)) for key, value in dict(items).items()]
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.executemany(
+                    'INSERT OR REPLACE INTO data (key, value) VALUES (?, ?)',
+                    rows)
+            self.connection.commit()
+            cursor.close()
 
     def get(self, key):
         '''
         Get a value from SQLite
         '''
-        cursor = self.connection.cursor()
-        cursor.execute('SELECT value FROM data WHERE key = ?', (key,))
-        result = cursor.fetchone()
-        cursor.close()
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute('SELECT value FROM data WHERE key = ?', (key,))
+            result = cursor.fetchone()
+            cursor.close()
         if result:
-            return result[0]
+            return decode(result[0])
         return None
 
+    def get_many(self, keys):
+        '''
+        Get many values from SQLite, in the same order as keys
+        '''
+        keys = list(keys)
+        found = {}
+        with self.lock:
+            cursor = self.connection.cursor()
+            # Stay below SQLITE_MAX_VARIABLE_NUMBER
+            for x in range(0, len(keys), 500):
+                batch = keys[x:x+500]
+                cursor.execute(
+                        'SELECT key, value FROM data WHERE key IN (%s)'
+                        % ','.join('?' * len(batch)), batch)
+                found.update(cursor.fetchall())
+            cursor.close()
+        return [
+            decode(found[key]) if key in found else None
+            for key in keys]
+
+    def delete(self, key):
+        '''
+        Remove a value from SQLite
+        '''
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute('DELETE FROM data WHERE key = ?', (key,))
+            self.connection.commit()
+            cursor.close()
+
     def keys(self, pattern):
         '''
-        Return keys matching a given pattern
+        Return keys matching a given (glob-style) pattern
         '''
-        cursor = self.connection.cursor()
-        cursor.execute('SELECT key FROM data WHERE key LIKE ?', (pattern,))
-        keys = [row[0] for row in cursor.fetchall()]
-        cursor.close()
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute(
+                    'SELECT key FROM data WHERE key GLOB ?', (pattern,))
+            keys = [row[0] for row in cursor.fetchall()]
+            cursor.close()
         return keys
+
+    def hget(self, key, field):
+        '''
+        Get a field of a hash from SQLite
+        '''
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute(
+                    'SELECT value FROM hashes WHERE key = ? AND field = ?',
+                    (key, field))
+            result = cursor.fetchone()
+            cursor.close()
+        if result:
+            return decode(result[0])
+        return None
+
+    def hgetall(self, key):
+        '''
+        Get all fields of a hash from SQLite
+        '''
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute(
+                    'SELECT field, value FROM hashes WHERE key = ?', (key,))
+            rows = cursor.fetchall()
+            cursor.close()
+        return {field: decode(value) for field, value in rows}
+
+    def hset(self, key, mapping):
+        '''
+        Set fields of a hash in SQLite, as a single transaction
+        '''
+        rows = [
+            (key, field, json.dumps(value))
+            for field, value in dict(mapping).items()]
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.executemany(
+                    'INSERT OR REPLACE INTO hashes (key, field, value) '
+                    'VALUES (?, ?, ?)', rows)
+            self.connection.commit()
+            cursor.close()
+
+    def hdel(self, key, *fields):
+        '''
+        Remove fields of a hash from SQLite
+        '''
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.executemany(
+                    'DELETE FROM hashes WHERE key = ? AND field = ?',
+                    [(key, field) for field in fields])
+            self.connection.commit()
+            cursor.close()
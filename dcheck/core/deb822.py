@@ -0,0 +1,205 @@
+'''
+DCheck deb822 Parser
+
+Streaming reader for Debian control data (.changes, .dsc, d/control, and
+d/copyright). Paragraphs are split as they are read and fields are only
+assembled when requested.
+'''
+# Python
+import array
+import collections.abc
+import io
+import sys
+import timeit
+
+
+class ChecksumList:
+    '''
+    Compact, read-only list of (checksum, size, name) entries.
+
+    Extra columns between size and name (section and priority in the Files
+    field of .changes files) are kept in extra.
+    '''
+    __slots__ = ('digests', 'sizes', 'names', 'extra', 'width')
+
+    def __init__(self, lines):
+        self.digests = bytearray()
+        self.sizes = array.array('Q')
+        self.names = []
+        self.extra = []
+        self.width = 0
+        for line in lines:
+            if not (fields := line.split()):
+                continue
+            if len(fields) < 3:
+                raise ValueError(f'Incomplete checksum line: {line.strip()}')
+            digest = bytes.fromhex(fields[0])
+            self.width = self.width or len(digest)
+            if len(digest) != self.width:
+                raise ValueError(f'Mixed checksum sizes: {fields[0]}')
+            self.digests += digest
+            self.sizes.append(int(fields[1]))
+            self.names.append(fields[-1])
+            self.extra.append(tuple(fields[2:-1]))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, index):
+        start = index * self.width
+        return (
+                self.digests[start:start + self.width].hex(),
+                self.sizes[index],
+                self.names[index])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class Paragraph(collections.abc.Mapping):
+    '''
+    A single deb822 paragraph; field names are case-insensitive.
+    '''
+    def __init__(self, lines=()):
+        self.raw = list(lines)
+        self._fields = None
+
+    def _index(self):
+        '''
+        Return {field: (name, first_line, last_line)}, built on first use.
+        '''
+        if self._fields is None:
+            self._fields = {}
+            name = None
+            for number, line in enumerate(self.raw):
+                if line[:1] in (' ', '\t'):
+                    if name:
+                        self._fields[name.lower()][2] = number
+                    continue
+                name, sep, value = line.partition(':')
+                if not sep:
+                    name = None
+                    continue
+                self._fields[name.lower()] = [name, number, number]
+        return self._fields
+
+    def __getitem__(self, key):
+        name, first, last = self._index()[key.lower()]
+        value = self.raw[first].partition(':')[2].strip()
+        lines = self.lines(key)
+        if not lines:
+            return value
+        return '\n'.join([value] + lines)
+
+    def __iter__(self):
+        return (name for name, first, last in self._index().values())
+
+    def __len__(self):
+        return len(self._index())
+
+    def lines(self, key) -> list:
+        '''
+        Return continuation lines of a field ('.' lines become empty).
+        '''
+        name, first, last = self._index()[key.lower()]
+        lines = [x.strip() for x in self.raw[first + 1:last + 1]]
+        return ['' if x == '.' else x for x in lines]
+
+    def checksums(self, key) -> ChecksumList:
+        '''
+        Return a checksum field (e.g. Checksums-Sha256) as a ChecksumList.
+        '''
+        if key.lower() not in self._index():
+            return ChecksumList([])
+        return ChecksumList(self.lines(key))
+
+
+def iter_lines(source):
+    '''
+    Yield lines (without newlines) of deb822 data with any PGP clearsign
+    wrapper removed.
+    '''
+    if isinstance(source, bytes):
+        source = source.decode('utf-8', errors='replace')
+    if isinstance(source, str):
+        source = io.StringIO(source)
+
+    signed = None
+    for line in source:
+        line = line.rstrip('\r\n')
+        # First line decides if this is a clearsigned message
+        if signed is None:
+            signed = line == '-----BEGIN PGP SIGNED MESSAGE-----'
+            if signed:
+                # Skip armor headers (Hash: ...) up to the first blank line
+                for line in source:
+                    if not line.strip():
+                        break
+                continue
+        if signed:
+            if line == '-----BEGIN PGP SIGNATURE-----':
+                return
+            if line.startswith('- '):
+                line = line[2:]
+        yield line
+
+
+def iter_paragraphs(source):
+    '''
+    Yield each Paragraph of deb822 data as soon as it has been read.
+
+    Source may be a str, bytes, or a (text) file object.
+    '''
+    lines = []
+    for line in iter_lines(source):
+        if line.startswith('#'):
+            continue
+        if line.strip():
+            lines.append(line)
+        elif lines:
+            yield Paragraph(lines)
+            lines = []
+    if lines:
+        yield Paragraph(lines)
+
+
+def parse(source) -> list:
+    '''
+    Return a list of all paragraphs in deb822 data.
+    '''
+    return list(iter_paragraphs(source))
+
+
+def parse_one(source) -> Paragraph:
+    '''
+    Return the first paragraph in deb822 data (e.g. .changes or .dsc).
+    '''
+    return next(iter_paragraphs(source), Paragraph())
+
+
+def benchmark(path, number=1000):
+    '''
+    Compare reading checksums of a file using yaml.safe_load and deb822.
+    '''
+    import yaml
+
+    with open(path, 'r', encoding='utf-8') as fh:
+        text = fh.read()
+    data = '\n'.join(iter_lines(text))
+
+    def with_yaml():
+        return yaml.safe_load(data)['Checksums-Sha256'].split()
+
+    def with_deb822():
+        return list(parse_one(data).checksums('Checksums-Sha256'))
+
+    for name, function in [('yaml', with_yaml), ('deb822', with_deb822)]:
+        elapsed = timeit.timeit(function, number=number)
+        print(f'{name:>8}: {elapsed / number * 1e6:10.1f} us/parse')
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        print(path)
+        benchmark(path)
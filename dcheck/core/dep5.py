@@ -0,0 +1,377 @@
+'''
+DCheck DEP-5 (Machine-readable debian/copyright)
+
+Parse d/copyright and assign every workspace file the Files stanza which
+governs it; the last stanza with a matching pattern wins. Patterns are
+compiled once into an index of exact paths, tries of literal prefixes
+("dir/*") and suffixes ("*.ext"), and a single regular expression for
+anything else, so each path is matched in time linear to its length rather
+than against every pattern.
+
+Patterns are relative to the root of the unpacked source tree (see
+source_root()), which is not the workspace itself: upstream files are
+extracted below the top-level directory of their tarball.
+
+The resulting map of files to stanzas is saved in the workspace metadata
+directory.
+
+Usage::
+
+    python3 -m dcheck.core.dep5 /path/to/workspace_dir/package_1.0-1
+'''
+# Python
+import array
+import base64
+import collections
+import json
+import os
+import pathlib
+import re
+import sys
+
+# DCheck
+import dcheck.core.config
+import dcheck.core.deb822
+import dcheck.core.manifest
+import dcheck.core.vfs
+
+# A single Files stanza; license is the short name (first line)
+Stanza = collections.namedtuple('Stanza', ['files', 'copyright', 'license'])
+
+# Wildcards of Files patterns (see tokens())
+STAR = object()
+QUESTION = object()
+
+# Key of a trie node marking the end of a pattern
+END = None
+
+# Loaded license maps (see get_licenses())
+loaded_licenses = {}
+
+# Manifest versions of workspaces without a machine-readable d/copyright
+unlicensed = {}
+
+
+def tokens(pattern) -> list:
+    '''
+    Split a Files pattern into literal strings and wildcards (STAR and
+    QUESTION); a backslash escapes the following character.
+    '''
+    result = []
+    literal = []
+    characters = iter(pattern)
+    for char in characters:
+        if char == '\\':
+            literal.append(next(characters, '\\'))
+        elif char in '*?':
+            if literal:
+                result.append(''.join(literal))
+                literal = []
+            result.append(STAR if char == '*' else QUESTION)
+        else:
+            literal.append(char)
+    if literal:
+        result.append(''.join(literal))
+    return result
+
+
+def trie_add(trie, key, number):
+    node = trie
+    for char in key:
+        node = node.setdefault(char, {})
+    node[END] = number
+
+
+def trie_best(trie, chars) -> int:
+    '''
+    Return the highest number of all keys in a trie which are a prefix of
+    chars, or -1.
+    '''
+    node = trie
+    best = node.get(END, -1)
+    for char in chars:
+        if (node := node.get(char)) is None:
+            break
+        best = max(best, node.get(END, -1))
+    return best
+
+
+class Matcher:
+    '''
+    Find the last of many lists of Files patterns matching a path.
+    '''
+    def __init__(self, patterns):
+        self.exact = {}
+        self.prefixes = {}
+        self.suffixes = {}
+        alternatives = []
+        for number, stanza in enumerate(patterns):
+            for pattern in stanza:
+                if pattern.startswith('./'):
+                    pattern = pattern[2:]
+                parts = tokens(pattern)
+                wildcards = [x for x in parts if not isinstance(x, str)]
+                if not wildcards:
+                    self.exact[''.join(parts)] = number
+                elif wildcards == [STAR] and parts[-1] is STAR:
+                    trie_add(self.prefixes, ''.join(parts[:-1]), number)
+                elif wildcards == [STAR] and parts[0] is STAR:
+                    trie_add(self.suffixes, parts[1][::-1], number)
+                else:
+                    alternatives.append((number, ''.join(
+                        '.*' if x is STAR else '.' if x is QUESTION
+                        else re.escape(x) for x in parts)))
+
+        # The first alternative to match is the last stanza
+        alternatives.sort(key=lambda x: -x[0])
+        self.numbers = [number for number, expression in alternatives]
+        self.expression = re.compile(
+                '|'.join(f'({expression})' for number, expression
+                         in alternatives), re.DOTALL) if alternatives else None
+
+    def match(self, path):
+        '''
+        Return the number of the last stanza matching a path, or None.
+        '''
+        best = max(
+                self.exact.get(path, -1),
+                trie_best(self.prefixes, path),
+                trie_best(self.suffixes, reversed(path)))
+        if self.expression and self.numbers[0] > best:
+            if found := self.expression.fullmatch(path):
+                best = max(best, self.numbers[found.lastindex - 1])
+        return None if best < 0 else best
+
+
+class Copyright:
+    '''
+    A machine-readable d/copyright file.
+    '''
+    def __init__(self, data):
+        paragraphs = dcheck.core.deb822.parse(data)
+        if not paragraphs or 'Format' not in paragraphs[0]:
+            raise ValueError('Not a machine-readable copyright file')
+        self.header = paragraphs[0]
+        self.stanzas = []
+        self.licenses = {}  # name: text of stand-alone License paragraphs
+        for paragraph in paragraphs[1:]:
+            if 'Files' in paragraph:
+                self.stanzas.append(Stanza(
+                        paragraph['Files'].split(),
+                        paragraph.get('Copyright', ''),
+                        paragraph.get('License', '').partition('\n')[0]))
+            elif 'License' in paragraph:
+                name, sep, text = paragraph['License'].partition('\n')
+                self.licenses[name.strip()] = text
+        self.matcher = Matcher([x.files for x in self.stanzas])
+
+    def match(self, path):
+        '''
+        Return the Stanza governing a (relative) path, or None.
+        '''
+        number = self.matcher.match(path)
+        return None if number is None else self.stanzas[number]
+
+
+def source_root(manifest):
+    '''
+    Return (root, path of d/copyright) of the source tree in a workspace
+    manifest, where root is the directory Files patterns are relative to
+    ('' or ending in a slash); None if there is no d/copyright.
+
+    The debian/ directory of a non-native package is extracted from its own
+    archive at the top of the workspace, next to the top-level directory of
+    the orig tarball; native packages have debian/ within that directory.
+    '''
+    directories = set()
+    loose = False
+    for path in manifest.paths:
+        top, sep, rest = path.partition('/')
+        if not sep:
+            loose = True
+        elif top not in ('source', 'debian'):
+            directories.add(top)
+    if 'debian/copyright' in manifest:
+        if len(directories) == 1 and not loose:
+            return (f'{directories.pop()}/', 'debian/copyright')
+        return ('', 'debian/copyright')
+    native = [x for x in sorted(directories)
+              if f'{x}/debian/copyright' in manifest]
+    if len(native) == 1:
+        return (f'{native[0]}/', f'{native[0]}/debian/copyright')
+    return None
+
+
+def relative_path(path, root):
+    '''
+    Return a workspace path relative to the root of the source tree (see
+    source_root()), or None for files outside of it.
+    '''
+    if path.startswith('source/'):
+        return None  # Uploaded files are not described by d/copyright
+    if path.startswith(root):
+        return path[len(root):]
+    if path.startswith('debian/'):
+        return path
+    return None
+
+
+class LicenseMap:
+    '''
+    Files stanza of every file in a workspace manifest.
+
+    Pickled as a reference to the saved map, so it is cheap to pass to
+    worker processes.
+    '''
+    def __init__(self, workspace, root, copyright_path, copyright_digest,
+                 manifest_version, stanzas, assigned):
+        self.workspace = pathlib.Path(workspace)
+        self.root = root  # See source_root()
+        self.copyright_path = copyright_path
+        self.copyright_digest = copyright_digest
+        self.manifest_version = manifest_version
+        self.stanzas = stanzas
+        self.assigned = assigned  # Stanza number by manifest row (or -1)
+
+    def __reduce__(self):
+        return (get_licenses, (self.workspace,))
+
+    def get(self, path):
+        '''
+        Return the Stanza governing a (relative) path, or None.
+        '''
+        manifest = dcheck.core.manifest.get_manifest(self.workspace)
+        number = manifest.position(path) if manifest else None
+        if number is None or self.assigned[number] < 0:
+            return None
+        return self.stanzas[self.assigned[number]]
+
+    def to_dict(self) -> dict:
+        return {
+            'byteorder': sys.byteorder,
+            'root': self.root,
+            'copyright_path': self.copyright_path,
+            'copyright': self.copyright_digest,
+            'manifest': self.manifest_version,
+            'stanzas': [list(x) for x in self.stanzas],
+            'assigned': base64.b64encode(self.assigned).decode(),
+            }
+
+    @classmethod
+    def from_dict(cls, workspace, value):
+        assigned = array.array('i', base64.b64decode(value['assigned']))
+        if value['byteorder'] != sys.byteorder:
+            assigned.byteswap()
+        return cls(workspace, value['root'], value['copyright_path'],
+                   value['copyright'], value['manifest'],
+                   [Stanza(*x) for x in value['stanzas']], assigned)
+
+
+def licenses_path(workspace) -> pathlib.Path:
+    '''
+    Return the path of the saved license map of a workspace.
+    '''
+    return dcheck.core.vfs.meta_dir(workspace) / 'licenses.json'
+
+
+def build(workspace):
+    '''
+    Return the LicenseMap of a workspace, or None if it has no manifest or
+    no machine-readable d/copyright.
+    '''
+    workspace = pathlib.Path(workspace)
+    manifest = dcheck.core.manifest.get_manifest(workspace)
+    if not manifest or not (found := source_root(manifest)):
+        return None
+    root, copyright_path = found
+    info = manifest.get(copyright_path)
+    try:
+        copyright = Copyright(
+                dcheck.core.vfs.get_workspace(workspace).read(info.path))
+    except (OSError, ValueError):
+        return None
+
+    assigned = array.array('i', [-1]) * len(manifest)
+    for number, path in enumerate(manifest.paths):
+        if (relative := relative_path(path, root)) is not None:
+            found = copyright.matcher.match(relative)
+            assigned[number] = -1 if found is None else found
+    return LicenseMap(
+            workspace, root, copyright_path, info.sha256,
+            os.stat(dcheck.core.manifest.manifest_path(workspace)).st_mtime_ns,
+            copyright.stanzas, assigned)
+
+
+def save(workspace, licenses):
+    '''
+    Save the license map of a workspace.
+    '''
+    path = licenses_path(workspace)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix('.tmp')
+    with open(temporary, 'w') as fh:
+        json.dump(licenses.to_dict(), fh)
+    os.replace(temporary, path)
+
+
+def load(workspace):
+    '''
+    Return the saved license map of a workspace, or None.
+    '''
+    try:
+        with open(licenses_path(workspace), 'r') as fh:
+            return LicenseMap.from_dict(workspace, json.load(fh))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def get_licenses(workspace):
+    '''
+    Return the (shared) LicenseMap of a workspace, building and saving it
+    when missing or out of date; None if d/copyright is not
+    machine-readable.
+    '''
+    workspace = pathlib.Path(workspace)
+    manifest = dcheck.core.manifest.get_manifest(workspace)
+    if manifest is None:
+        loaded_licenses.pop(workspace, None)
+        return None
+    version = os.stat(
+            dcheck.core.manifest.manifest_path(workspace)).st_mtime_ns
+    if unlicensed.get(workspace) == version:
+        return None
+
+    def current(licenses):
+        info = manifest.get(licenses.copyright_path) if licenses else None
+        return info is not None and (info.sha256, version) == (
+                licenses.copyright_digest, licenses.manifest_version)
+
+    licenses = loaded_licenses.get(workspace)
+    if not current(licenses):
+        licenses = load(workspace)
+    if not current(licenses):
+        if (licenses := build(workspace)) is None:
+            loaded_licenses.pop(workspace, None)
+            unlicensed[workspace] = version
+            return None
+        save(workspace, licenses)
+    loaded_licenses[workspace] = licenses
+    return licenses
+
+
+def main():
+    '''
+    Print the governing license of every file in a workspace.
+    '''
+    workspace = pathlib.Path(sys.argv[1])
+    if (licenses := get_licenses(workspace)) is None:
+        sys.exit('No manifest or machine-readable d/copyright found')
+    manifest = dcheck.core.manifest.get_manifest(workspace)
+    for path in manifest.paths:
+        stanza = licenses.get(path)
+        print(f'{stanza.license if stanza else "-":<24}  {path}')
+
+
+if __name__ == '__main__':
+    dcheck.core.config.load_configuration()
+    main()
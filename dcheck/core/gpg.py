@@ -0,0 +1,199 @@
+'''
+DCheck Signature Verification
+
+Verify PGP signatures using one shared GPG home instead of preparing a new
+gnupg.GPG() (and keyring) for every file.
+'''
+# Python
+import collections
+import concurrent.futures
+import gnupg
+import hashlib
+import io
+import logging
+import os
+import pathlib
+import threading
+import time
+
+# DCheck
+import dcheck.core.config
+import dcheck.core.data
+
+# Shared verification service (see service())
+loaded_service = None
+
+# Files of a GPG home which change along with its keys; keyboxd (GnuPG 2.4)
+# keeps keys in an SQLite database whose recent changes may only be in its
+# write-ahead log
+keyring_files = ['pubring.kbx', 'pubring.gpg', 'trustdb.gpg',
+                 'public-keys.d/pubring.db', 'public-keys.d/pubring.db-wal']
+
+# Number of verification results remembered in memory by each service
+memo_size = 4096
+
+
+def keyring_version(gnupghome=None) -> str:
+    '''
+    Return a digest of the keyring files of a GPG home, which changes when
+    keys are added, removed, revoked, or updated.
+    '''
+    home = pathlib.Path(
+            gnupghome or os.environ.get('GNUPGHOME') or '~/.gnupg')
+    hasher = hashlib.sha256()
+    for name in keyring_files:
+        try:
+            st = os.stat(home.expanduser() / name)
+        except OSError:
+            continue
+        hasher.update(f'{name}:{st.st_size}:{st.st_mtime_ns};'.encode())
+    return hasher.hexdigest()[:16]
+
+
+class Signature:
+    '''
+    Outcome of a signature verification; evaluates True if valid.
+    '''
+    def __init__(self, valid, fingerprint=None, data=b'', username=None,
+                 status=None, expires=None):
+        self.valid = valid
+        self.fingerprint = fingerprint
+        self.data = data
+        self.username = username
+        self.status = status
+        self.expires = expires  # When the signing key expires (epoch)
+
+    def __bool__(self):
+        return bool(self.valid)
+
+    def current(self) -> bool:
+        '''
+        Check if a remembered result still holds; the signing key may have
+        expired since.
+        '''
+        return not self.expires or time.time() < self.expires
+
+    def to_dict(self) -> dict:
+        '''
+        Return a serializable form of this result.
+        '''
+        return {
+            'valid': bool(self.valid),
+            'fingerprint': self.fingerprint,
+            'data': self.data.decode('utf-8', 'surrogateescape'),
+            'username': self.username,
+            'status': self.status,
+            'expires': self.expires,
+            }
+
+    @classmethod
+    def from_dict(cls, value):
+        '''
+        Rebuild a result saved with to_dict().
+        '''
+        value = dict(value)
+        value['data'] = value['data'].encode('utf-8', 'surrogateescape')
+        return cls(**value)
+
+
+class SignatureService:
+    '''
+    Verify many signed files with a reused GPG home.
+
+    Results are remembered by the sha256 of the signed file and the
+    version of the keyring (see keyring_version()), in memory (the last
+    memo_size) and (for valid signatures) in the data engine, until the
+    signing key expires.
+    '''
+    def __init__(self, gnupghome=None, workers=None):
+        self.gnupghome = gnupghome
+        self.workers = workers or os.cpu_count()
+        self.gpg = gnupg.GPG(gnupghome=gnupghome)
+        self.memo = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def memo_key(self, version, digest) -> str:
+        '''
+        Return the data key used for a given keyring version and content
+        hash.
+        '''
+        return f'signature/{self.gnupghome or "default"}/{version}/{digest}'
+
+    def key_expiry(self, fingerprint):
+        '''
+        Return when the (sub)key with a given fingerprint expires, or None.
+        '''
+        for key in self.gpg.list_keys(keys=[fingerprint]):
+            expiry = [key.get('expires')]
+            for info in (key.get('subkey_info') or {}).values():
+                if fingerprint.endswith(info.get('keyid') or '-'):
+                    expiry.append(info.get('expires'))
+            expiry = [int(x) for x in expiry if x]
+            return min(expiry) if expiry else None
+        return None
+
+    def verify(self, path) -> Signature:
+        '''
+        Verify the PGP signature within a file at a given path.
+        '''
+        with open(path, 'rb') as fh:
+            content = fh.read()
+        digest = hashlib.sha256(content).hexdigest()
+        version = keyring_version(self.gnupghome)
+
+        # Identical content was already verified with the same keyring
+        with self.lock:
+            if (result := self.memo.get((version, digest))) is not None:
+                self.memo.move_to_end((version, digest))
+        if result is not None and result.current():
+            return result
+        saved = dcheck.core.data.get(self.memo_key(version, digest))
+        result = Signature.from_dict(saved) if saved else None
+        if result is None or not result.current():
+            v = self.gpg.verify_file(
+                    io.BytesIO(content), extra_args=['-o', '-'])
+            result = Signature(
+                    v.valid, v.fingerprint, v.data, v.username, v.status)
+            if result:
+                result.expires = self.key_expiry(v.fingerprint)
+                dcheck.core.data.set(
+                        self.memo_key(version, digest), result.to_dict())
+
+        with self.lock:
+            self.memo[(version, digest)] = result
+            self.memo.move_to_end((version, digest))
+            while len(self.memo) > memo_size:
+                self.memo.popitem(last=False)
+        return result
+
+    def verify_many(self, paths) -> dict:
+        '''
+        Verify many files concurrently, returning {path: Signature}.
+        '''
+        paths = list(paths)
+        if not paths:
+            return {}
+        results = {}
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(self.workers, len(paths))) as pool:
+            jobs = {pool.submit(self.verify, path): path for path in paths}
+            for job in concurrent.futures.as_completed(jobs):
+                try:
+                    results[jobs[job]] = job.result()
+                except OSError as e:
+                    logging.warning('Unable to read %s: %s', jobs[job], e)
+                    results[jobs[job]] = Signature(False, status=str(e))
+        return results
+
+
+def service() -> SignatureService:
+    '''
+    Return the shared SignatureService for the configured GPG home.
+    '''
+    global loaded_service
+    gnupghome = dcheck.core.config.get('gpg_home')
+    if not loaded_service or loaded_service.gnupghome != gnupghome:
+        loaded_service = SignatureService(
+                gnupghome=gnupghome,
+                workers=dcheck.core.config.get('ingest_workers'))
+    return loaded_service
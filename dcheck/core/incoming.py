@@ -0,0 +1,149 @@
+'''
+DCheck Incoming Queue
+
+Incrementally maintained index of .changes files waiting in pending_dir.
+'''
+# Python
+import logging
+import os
+
+# DCheck
+import dcheck.core.config
+import dcheck.core.data
+import dcheck.core.inspect
+
+# Indexes by pending directory (see get_index())
+loaded_indexes = {}
+
+# Sort keys supported by IncomingIndex.page()
+sort_keys = {
+        'name': lambda item: item[0],
+        'age': lambda item: (-item[1]['mtime'], item[0]),
+        'size': lambda item: (item[1]['size'], item[0]),
+        }
+
+
+def is_changes(name) -> bool:
+    '''
+    Check if a file name looks like <package>_<version>_source.changes.
+    '''
+    f = name.split('_')
+    return len(f) == 3 and f[2] == 'source.changes'
+
+
+class IncomingIndex:
+    '''
+    Index of changes files in a directory, updated from cached stat results.
+
+    Only entries which were added or changed since the last refresh() are
+    evaluated again with changes_info().
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}  # name: (identity, info)
+        self.workspaces = set()
+        self.workspaces_mtime = None
+        self.sorted = {}
+
+    def refresh(self) -> bool:
+        '''
+        Rescan the directory; returns True if anything changed.
+        '''
+        if not os.path.isdir(self.path):
+            logging.warning('Review directory (pending_dir) was not found.')
+            changed = bool(self.entries)
+            self.entries = {}
+            self.sorted = {}
+            return changed
+        extracted = self.refresh_workspaces()
+
+        # Single directory pass; DirEntry.stat() is only called on candidates
+        seen = {}
+        changed = extracted
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if not is_changes(entry.name):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                identity = (st.st_ino, st.st_size, st.st_mtime_ns)
+                known = self.entries.get(entry.name)
+                if known and known[0] == identity:
+                    seen[entry.name] = known
+                    continue
+                info = dcheck.core.inspect.changes_info(
+                        entry.name, rootdir=self.path,
+                        workspaces=self.workspaces)
+                info['mtime'] = st.st_mtime
+                info['size'] = st.st_size
+                seen[entry.name] = (identity, info)
+                changed = True
+
+        # Workspaces may have been created/removed for unchanged entries
+        if extracted:
+            for name, (identity, info) in seen.items():
+                info['extracted'] = name[:name.rindex('_')] in self.workspaces
+
+        # Background ingest status of all entries in a single lookup
+        names = list(seen)
+        statuses = dcheck.core.data.get_many(f'ingest/{x}' for x in names)
+        for name, status in zip(names, statuses):
+            status = status['status'] if status else 'unknown'
+            seen[name][1]['status'] = f'changes_status_{status}'
+
+        changed = changed or len(seen) != len(self.entries)
+        self.entries = seen
+        if changed:
+            self.sorted = {}
+        return changed
+
+    def refresh_workspaces(self) -> bool:
+        '''
+        Update the set of extracted workspaces; returns True if it changed.
+        '''
+        workspace_dir = dcheck.core.config.get('workspace_dir')
+        try:
+            mtime = os.stat(workspace_dir).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self.workspaces_mtime:
+            return False
+
+        self.workspaces_mtime = mtime
+        workspaces = set()
+        if mtime is not None:
+            with os.scandir(workspace_dir) as it:
+                workspaces = {x.name for x in it if x.is_dir()}
+        changed = workspaces != self.workspaces
+        self.workspaces = workspaces
+        return changed
+
+    def page(self, sort='name', reverse=False, offset=0, limit=None) -> list:
+        '''
+        Return a sorted slice of [(changes, info), ...] from the index.
+        '''
+        if (sort, reverse) not in self.sorted:
+            self.sorted[(sort, reverse)] = sorted(
+                    ((name, info) for name, (identity, info)
+                     in self.entries.items()),
+                    key=sort_keys[sort], reverse=reverse)
+        ordered = self.sorted[(sort, reverse)]
+        end = None if limit is None else offset + limit
+        return ordered[offset:end]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def get_index(path=None) -> IncomingIndex:
+    '''
+    Return the (shared) IncomingIndex of a directory.
+    '''
+    if not path:
+        path = dcheck.core.config.get('pending_dir')
+    path = os.path.abspath(path)
+    if path not in loaded_indexes:
+        loaded_indexes[path] = IncomingIndex(path)
+    return loaded_indexes[path]
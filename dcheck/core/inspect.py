@@ -3,18 +3,34 @@ DCheck Package Inspection
 The primary "entry point" for investigating package data.
 '''
 # Python
-import gnupg
+import concurrent.futures
+import contextlib
+import ctypes
+import errno
+import fcntl
+import functools
 import hashlib
 import logging
 import os
 import pathlib
 import shutil
-import yaml
+import threading
 
 # DCheck
+import dcheck.checks.approvals
+import dcheck.checks.copies
+import dcheck.checks.detect
+import dcheck.core.cache
 import dcheck.core.config
 import dcheck.core.data
 import dcheck.core.archive
+import dcheck.core.deb822
+import dcheck.core.gpg
+import dcheck.core.incoming
+import dcheck.core.manifest
+import dcheck.core.revisions
+import dcheck.core.store
+import dcheck.core.vfs
 
 
 # Supported hashing algorithms, based on checksum length
@@ -25,41 +41,56 @@ supported_algorithms = {
         128: hashlib.sha512,
         }
 
+# Fields of a .changes file reported by changes_info(full=True)
+changes_summary = [
+        'Source', 'Version', 'Distribution', 'Urgency', 'Maintainer',
+        'Changed-By', 'Date', 'Closes', 'Changes']
 
-def list_incoming(path=None) -> dict:
-    '''
-    Return information about changes files in a given directory.
-    '''
-    if not path:
-        path = dcheck.core.config.get('pending_dir')
+# Checksum fields of .changes/.dsc files and their hashing algorithm
+checksum_fields = {
+        'Files': 'md5',
+        'Checksums-Sha1': 'sha1',
+        'Checksums-Sha256': 'sha256',
+        'Checksums-Sha512': 'sha512',
+        }
 
-    if not os.path.isdir(path):
-        logging.warning('Review directory (pending_dir) was not found.')
-        return {}
+# ioctl request used to reflink (copy-on-write clone) a file
+FICLONE = 0x40049409
 
-    # Collect all correctly-named files ending in _source.changes.
-    incoming = {}
-    for file in os.listdir(path):
-        f = file.split('_')
-        if len(f) != 3:
-            continue
-        if f[2] != 'source.changes':
-            continue
-        incoming[file] = changes_info(file)
+# renameat2(2) arguments used to swap a workspace into place
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+libc = ctypes.CDLL(None, use_errno=True)
 
-    return incoming
 
+def list_incoming(path=None, sort='name', reverse=False, offset=0,
+                  limit=None) -> dict:
+    '''
+    Return information about changes files in a given directory.
 
-def changes_info(changes, full=False) -> dict:
+    Results are served from an incrementally refreshed IncomingIndex and
+    sorted by 'name', 'age', or 'size'.
+    '''
+    index = dcheck.core.incoming.get_index(path)
+    index.refresh()
+    return dict(index.page(sort, reverse, offset, limit))
+
+
+def changes_info(changes, full=False, rootdir=None, workspaces=None) -> dict:
     '''
     Return a basic set of information from a changes file.
+
+    A set of known workspace names may be provided to avoid a stat() call.
     '''
     workspace_dir = pathlib.Path(dcheck.core.config.get('workspace_dir'))
     workspace_name = changes[:changes.rindex('_')]
     info = {}
 
     # Check if source package was already extracted.
-    info['extracted'] = os.path.exists(workspace_dir / workspace_name)
+    if workspaces is not None:
+        info['extracted'] = workspace_name in workspaces
+    else:
+        info['extracted'] = os.path.exists(workspace_dir / workspace_name)
 
     # Determine appropriate status message
     info['status'] = 'changes_status_unknown'
@@ -68,82 +99,601 @@ def changes_info(changes, full=False) -> dict:
     if not full:
         return info
 
+    # Summary of (unverified) .changes fields
+    if not rootdir:
+        rootdir = dcheck.core.config.get('pending_dir')
+    try:
+        with open(pathlib.Path(rootdir) / changes, 'r', encoding='utf-8',
+                  errors='replace') as fh:
+            data = dcheck.core.deb822.parse_one(fh)
+        info['summary'] = {
+            field: data[field] for field in changes_summary if field in data}
+    except OSError:
+        logging.warning('Unable to read %s', changes)
+
     # Collect cached information
-    # info['summary'] = dcheck.core.data.get(f'pkg/{changes}/info')  # uuid
     # info['scancode'] = dcheck.core.data.get(f'pkg/{changes}/scan')  # pkg
 
     return info
 
 
+def ingest_status(changes) -> dict:
+    '''
+    Return the recorded background ingest status of a changes file.
+    '''
+    return dcheck.core.data.get(f'ingest/{changes}')
+
+
+def set_ingest_status(changes, status, mtime=None):
+    '''
+    Record the background ingest status (queued, ingesting, ready, failed)
+    of a changes file, along with the mtime of the file it applies to.
+    '''
+    dcheck.core.data.set(
+            f'ingest/{changes}', {'status': status, 'mtime': mtime})
+
+
 def open_changes(changes, rootdir=None) -> bool:
     '''
-    Unpack contents specified in a given changes file.
+    Unpack contents specified in a given changes file. License detection
+    and the copy index are left to analyze_workspace().
     '''
     if not rootdir:
         rootdir = dcheck.core.config.get('pending_dir')
     incoming = pathlib.Path(rootdir)
     workspace_dir = pathlib.Path(dcheck.core.config.get('workspace_dir'))
-    workspace = workspace_dir / changes[:changes.rindex('_')]
-    logging.info('Unpacking %s into %s', incoming / changes, workspace)
+    target = workspace_dir / changes[:changes.rindex('_')]
+    # The daemon and the GUI may ingest the same upload at once
+    with ingest_lock(target):
+        return ingest_changes(changes, incoming, target)
+
+
+@contextlib.contextmanager
+def ingest_lock(target):
+    '''
+    Hold the lock serializing ingests of a workspace, between threads and
+    processes.
+    '''
+    path = target.parent / f'.{target.name}.lock'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
 
-    supported_archives = dcheck.core.archive.supported_archives
+
+def ingest_changes(changes, incoming, target) -> bool:
+    '''
+    Verify and unpack a changes file from incoming into a target workspace,
+    replacing the target once complete; see open_changes().
+    '''
+    workspace_dir = target.parent
+    logging.info('Unpacking %s into %s', incoming / changes, target)
+
+    # Build in a hidden directory so the workspace only appears when complete
+    workspace = workspace_dir / f'.{target.name}.ingest'
+    shutil.rmtree(workspace, ignore_errors=True)
 
     # Create destination directory structure and copy changes file.
     # NOTE: 0o775 is ideal for shared review, but should not be managed here.
     copy_to = workspace / 'source'
     copy_to.mkdir(parents=True, exist_ok=True)
-    shutil.copy(incoming / changes, copy_to)
+    if not clone_file(incoming / changes, copy_to / changes):
+        shutil.copy(incoming / changes, copy_to)
 
     # Verify signature and read signed checksum data
     if not (v := verify_signature(copy_to / changes)):
         logging.critical('Signature verification failed: %s', changes)
         wipe_workspace(workspace)
         return False
-    changes_data = yaml.safe_load(v.data)
-
-    # Verify and copy any files mentioned in .changes
-    xtra = changes_data['Checksums-Sha256'].split()
-    # TODO: PY3.12: for cksum, size, path in batched(xtra, 3):
-    for cksum, size, path in [xtra[x:x+3] for x in range(0, len(xtra), 3)]:
-        fspath = incoming / path
-        if not verify_checksum(fspath, cksum):
-            logging.warning('Checksum verification failed: %s', fspath)
+    changes_data = dcheck.core.deb822.parse_one(v.data)
+
+    # Verify, copy, and extract all files mentioned in .changes in one read
+    try:
+        expected = parse_checksums(changes_data)
+    except ValueError:
+        logging.critical('Unable to read checksums from %s', changes)
+        wipe_workspace(workspace)
+        return False
+    # The .dsc is ingested first so its checksums join the same single read
+    dsc = [name for name in expected if name.endswith('.dsc')]
+    for stage in [dsc, [name for name in expected if name not in dsc]]:
+        results = ingest_files(
+                [(incoming / name, expected[name]) for name in stage],
+                workspace)
+        if not all(results.values()):
+            for fspath, verified in results.items():
+                if verified is False:
+                    logging.warning('Checksum verification failed: %s', fspath)
             wipe_workspace(workspace)
             return False
-        logging.debug('Copying file: %s', path)
-        if any(path.endswith(x) for x in supported_archives):
-            logging.debug('Extracting file: %s', fspath)
-            dcheck.core.archive.extract(fspath, workspace)
-        shutil.copy(fspath, copy_to)
+        for name in set(stage) & set(dsc):
+            extra = read_dsc_checksums(ingest_staging(name, workspace)[0])
+            if extra is None or not merge_checksums(expected, extra):
+                logging.warning('Checksums in %s do not match .changes', name)
+                wipe_workspace(workspace)
+                return False
+
+    # Move verified files into place
+    for name in expected:
+        logging.debug('Promoting file: %s', name)
+        promote_ingest(name, workspace)
+    shutil.rmtree(workspace / '.ingest', ignore_errors=True)
+
+    # Share identical uploads with other workspaces; their sha256 is known
+    # from the .changes (extracted files were absorbed by ingest_file)
+    if dcheck.core.config.get('workspace_store'):
+        dcheck.core.store.absorb_tree(workspace / 'source', digests={
+                os.path.abspath(copy_to / name): checksums['sha256']
+                for name, checksums in expected.items()
+                if 'sha256' in checksums})
+
+    replace_tree(workspace, target)
+
+    # Describe every file once for the GUI and checks
+    if dcheck.core.config.get('workspace_manifest'):
+        manifest = dcheck.core.manifest.build(target, store_digests(expected))
+        dcheck.core.manifest.save(target, manifest)
+        # Reviews of files unchanged since the previous revision still apply
+        dcheck.core.revisions.carry_forward(target)
+        # Files approved in other packages need no second review
+        approved = dcheck.checks.approvals.apply(target)
+        logging.info('%s: %d reviews reused from other packages',
+                     target.name, approved)
+    return True
+
+
+def analyze_workspace(target) -> bool:
+    '''
+    Run the slower analysis of an ingested workspace, which a review does
+    not have to wait for; see analyze_in_background().
+    '''
+    target = pathlib.Path(target)
+    if dcheck.core.manifest.get_manifest(target) is None:
+        return False
+    # Detect licenses of text files for the GUI (see FileInfo)
+    detected = sum(1 for x in dcheck.checks.detect.scan_workspace(target))
+    logging.info('%s: %d text files scanned for licenses', target.name,
+                 detected)
+    # Point out files already reviewed in other packages (see FileInfo),
+    # then remember this package for the next
+    copies = dcheck.checks.copies.find_copies(target)
+    dcheck.checks.copies.save_copies(target, copies)
+    logging.info('%s: %d files already reviewed in other packages',
+                 target.name, len(
+                     dcheck.checks.copies.reviewed_copies(target, copies)))
+    dcheck.checks.copies.index_workspace(target)
+    return True
+
+
+def analyze_in_background(target) -> threading.Thread:
+    '''
+    Run analyze_workspace() in a separate thread.
+    '''
+    def analyze():
+        try:
+            analyze_workspace(target)
+        except Exception:
+            logging.exception('Unable to analyze %s', target)
+
+    thread = threading.Thread(target=analyze, daemon=True)
+    thread.start()
+    return thread
+
+
+def store_digests(expected) -> dict:
+    '''
+    Return {relative path: sha256} of workspace files which were (or may
+    have been) linked from the workspace store.
+    '''
+    known = {}
+    if not dcheck.core.config.get('workspace_store'):
+        return known
+    for name, checksums in expected.items():
+        if 'sha256' not in checksums:
+            continue
+        known[f'source/{name}'] = checksums['sha256']
+        if tree := dcheck.core.store.load_tree(checksums['sha256']):
+            known.update(
+                    (path, entry[1]) for path, entry in tree.items()
+                    if entry[0] == 'f')
+    return known
+
+
+def parse_checksums(data) -> dict:
+    '''
+    Collect all checksum fields of .changes/.dsc data (deb822.Paragraph) into
+    a dictionary of {filename: {'size': size, algorithm: checksum, ...}}.
+    '''
+    expected = {}
+    for field, algorithm in checksum_fields.items():
+        for cksum, size, name in data.checksums(field):
+            entry = expected.setdefault(name, {'size': size})
+            entry[algorithm] = cksum
+    return expected
+
+
+def merge_checksums(expected, extra) -> bool:
+    '''
+    Add checksums from extra into expected for files already listed there.
+
+    Returns False if both list a different checksum or size for one file.
+    '''
+    for name, checksums in extra.items():
+        if name not in expected:
+            logging.debug('Skipping %s; not included in upload', name)
+            continue
+        for key, value in checksums.items():
+            if expected[name].setdefault(key, value) != value:
+                return False
+    return True
+
+
+def read_dsc_checksums(path) -> dict:
+    '''
+    Return parse_checksums() of a (possibly signed) .dsc file, or None.
+
+    The signature is not checked; integrity is already assured by .changes.
+    '''
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as fh:
+            return parse_checksums(dcheck.core.deb822.parse_one(fh))
+    except ValueError:
+        logging.warning('Unable to read checksums from %s', path)
+        return None
+
+
+def verify_checksums(files, workers=None) -> dict:
+    '''
+    Verify many (path, checksum) pairs concurrently.
+
+    Returns {path: result}, where result is True/False for verified files and
+    None for files that were skipped after another file failed verification.
+    '''
+    return _verify_concurrently(verify_checksum, files, workers)
+
+
+def ingest_files(files, workspace, workers=None) -> dict:
+    '''
+    Run ingest_file() for many (path, expected) pairs concurrently.
+
+    Returns {path: result} in the same form as verify_checksums().
+    '''
+    return _verify_concurrently(
+            functools.partial(ingest_file, workspace=workspace),
+            files, workers)
+
+
+def _verify_concurrently(function, files, workers=None) -> dict:
+    '''
+    Call function(path, expected, cancel) for each file in a bounded pool,
+    cancelling all remaining work as soon as one call returns False.
+    '''
+    files = list(files)
+    if not workers:
+        workers = dcheck.core.config.get('ingest_workers') or os.cpu_count()
+    results = {path: None for path, expected in files}
+    if not files:
+        return results
+
+    # Hashing releases the GIL, so threads are enough to use multiple cores
+    cancel = threading.Event()
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(workers, len(files))) as pool:
+        jobs = {
+            pool.submit(function, path, expected, cancel): path
+            for path, expected in files}
+        for job in concurrent.futures.as_completed(jobs):
+            if job.cancelled():
+                continue
+            try:
+                results[jobs[job]] = job.result()
+            except OSError as e:
+                logging.warning('Unable to read %s: %s', jobs[job], e)
+                results[jobs[job]] = False
+            # Stop remaining workers as soon as anything fails
+            if results[jobs[job]] is False:
+                cancel.set()
+                for pending in jobs:
+                    pending.cancel()
+
+    return results
+
+
+def ingest_file(path, expected, cancel=None, workspace=None) -> bool:
+    '''
+    Verify, copy, and extract a file into a workspace with a single read.
+
+    The file is checked against all checksums (and size) in expected, as
+    returned by parse_checksums(), with every hasher fed from the same read.
+    Output is staged (see ingest_staging) until promote_ingest() is called
+    and is removed again if the file does not match the expected checksums.
+    Returns None if ingest was interrupted by a set cancel (threading.Event).
+    '''
+    checksums = {k: v for k, v in expected.items() if k != 'size'}
+    if not checksums:
+        logging.warning('No checksums available for %s', path)
+        return False
+    if 'size' in expected and os.path.getsize(path) != expected['size']:
+        logging.warning('Unexpected size for %s', path)
+        return False
+    archive = dcheck.core.archive
+    bufsize = dcheck.core.config.get('hash_buffer_size')
+    partial, staging = ingest_staging(path, workspace)
+    partial.parent.mkdir(parents=True, exist_ok=True)
+    damaged = False
+
+    # Files known to be unchanged since their last verification skip hashing
+    verified = all(
+        dcheck.core.cache.lookup(path, 'checksum', checksum)
+        for checksum in checksums.values())
+    hashers = {} if verified else {
+        algorithm: hashlib.new(algorithm) for algorithm in checksums}
+
+    # Virtual workspaces only index archives (see dcheck.core.vfs)
+    virtual = dcheck.core.config.get('virtual_workspace')
+    members = None
+    digests = {}  # Of extracted files, see dcheck.core.store.absorb_tree
+    checkpoints = {}  # Of virtual archives, see dcheck.core.archive
+
+    # Archives which were extracted before are rebuilt from the store
+    store = not virtual and dcheck.core.config.get('workspace_store') \
+        and 'sha256' in checksums
+    tree = None
+    if store and archive.archive_type(path):
+        tree = dcheck.core.store.load_tree(checksums['sha256'])
+
+    try:
+        with contextlib.ExitStack() as stack:
+            # Files on the same filesystem are linked instead of copied
+            if clone_file(path, partial):
+                fh = stack.enter_context(open(partial, 'rb'))
+                copy = None
+            else:
+                fh = stack.enter_context(open(path, 'rb'))
+                copy = stack.enter_context(open(partial, 'wb'))
+
+            # Feed the same bytes to all hashers, the copy, and the extractor
+            reader = archive.TeeReader(fh, hashers.values(), copy, cancel)
+            streamable = \
+                archive.archive_type(path) in archive.streamable_archives
+            if virtual and streamable:
+                logging.debug('Indexing file: %s', path)
+                members = archive.index_stream(
+                        reader, path, bufsize,
+                        dcheck.core.config.get('ingest_workers'), checkpoints,
+                        dcheck.core.config.get('checkpoint_spacing'))
+            elif tree is None and streamable:
+                logging.debug('Extracting file: %s', path)
+                archive.extract_stream(
+                        reader, path, staging, bufsize,
+                        dcheck.core.config.get('ingest_workers'), digests)
+            reader.drain(bufsize)
+    except archive.errors as e:
+        if not (cancel and cancel.is_set()):
+            logging.warning('Unable to extract %s: %s', path, e)
+            damaged = True
+
+    # Roll back anything written from an interrupted or unverified file
+    if cancel and cancel.is_set():
+        discard_ingest(path, workspace)
+        return None
+    if damaged or any(
+            hasher.hexdigest() != checksums[algorithm]
+            for algorithm, hasher in hashers.items()):
+        discard_ingest(path, workspace)
+        return False
+    if not verified:
+        for checksum in checksums.values():
+            dcheck.core.cache.store(path, 'checksum', checksum, True)
+
+    if virtual:
+        if archive.archive_type(path):
+            if members is None:
+                members = archive.index(partial, name=path)
+            dcheck.core.vfs.save_index(
+                    staging, pathlib.Path(path).name, members)
+            # Seekable decompression for members read later on
+            if checkpoints:
+                dcheck.core.vfs.save_checkpoints(
+                        staging, pathlib.Path(path).name, checkpoints)
+        return True
+
+    if tree is not None:
+        logging.debug('Reusing extracted file: %s', path)
+        if dcheck.core.store.build_tree(tree, staging):
+            return True
+        # Blobs were removed since the tree was loaded
+        shutil.rmtree(staging, ignore_errors=True)
+
+    # Formats which require seeking are extracted from the verified copy
+    if tree is not None or archive.archive_type(path) not in [
+            None, *archive.streamable_archives]:
+        logging.debug('Extracting file: %s', path)
+        archive.extract(partial, staging, name=path)
+
+    # Remember the extracted tree for later uploads of the same archive
+    if store and staging.is_dir():
+        tree = dcheck.core.store.absorb_tree(staging, digests=digests)
+        dcheck.core.store.save_tree(checksums['sha256'], tree)
     return True
 
 
-def verify_checksum(path, checksum) -> bool:
+def ingest_staging(path, workspace) -> tuple:
+    '''
+    Return the (copy, extract) staging paths used by ingest_file().
+    '''
+    name = pathlib.Path(path).name
+    staging = pathlib.Path(workspace) / '.ingest'
+    return staging / f'{name}.part', staging / name
+
+
+def discard_ingest(path, workspace):
+    '''
+    Remove staged output of ingest_file().
+    '''
+    partial, staging = ingest_staging(path, workspace)
+    partial.unlink(missing_ok=True)
+    shutil.rmtree(staging, ignore_errors=True)
+
+
+def promote_ingest(path, workspace):
+    '''
+    Move staged output of ingest_file() into the workspace.
+    '''
+    partial, staging = ingest_staging(path, workspace)
+    os.replace(partial, pathlib.Path(workspace) / 'source' / partial.stem)
+    if staging.is_dir():
+        merge_tree(staging, workspace)
+
+
+def replace_tree(src, dest):
+    '''
+    Move the directory src to dest, replacing any existing dest at once
+    (where the kernel can exchange both), then remove the old tree.
+    '''
+    if not os.path.exists(dest):
+        os.rename(src, dest)
+        return
+    if renameat2(src, dest, RENAME_EXCHANGE):
+        old = src
+    else:
+        old = f'{src}.old'
+        os.rename(dest, old)
+        os.rename(src, dest)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def renameat2(src, dest, flags) -> bool:
+    '''
+    Call renameat2(2) with flags; returns False where it is not supported.
+    '''
+    function = getattr(libc, 'renameat2', None)
+    if function is None:
+        return False
+    if function(AT_FDCWD, os.fsencode(src), AT_FDCWD, os.fsencode(dest),
+                flags) == 0:
+        return True
+    error = ctypes.get_errno()
+    if error in (errno.ENOSYS, errno.EINVAL):
+        return False
+    raise OSError(error, os.strerror(error), src, None, dest)
+
+
+def merge_tree(src, dest):
+    '''
+    Move the contents of src into dest, merging any existing directories.
+    '''
+    for entry in os.scandir(src):
+        target = os.path.join(dest, entry.name)
+        if entry.is_dir(follow_symlinks=False) and os.path.isdir(target):
+            merge_tree(entry.path, target)
+        else:
+            os.replace(entry.path, target)
+    os.rmdir(src)
+
+
+def clone_file(src, dest) -> bool:
+    '''
+    Create dest as a hardlink or reflink of src without copying any data.
+
+    Returns False when neither is possible (e.g. across filesystems).
+    '''
+    if not dcheck.core.config.get('ingest_link'):
+        return False
+    try:
+        os.link(src, dest)
+        return True
+    except OSError:
+        pass
+    try:
+        with open(src, 'rb') as fh, open(dest, 'wb') as clone:
+            fcntl.ioctl(clone.fileno(), FICLONE, fh.fileno())
+        return True
+    except OSError:
+        pathlib.Path(dest).unlink(missing_ok=True)
+    return False
+
+
+def verify_checksum(path, checksum, cancel=None) -> bool:
     '''
     Verify a given path produces an expected checksum.
+
+    Returns None if hashing was interrupted by a set cancel (threading.Event).
     '''
     # Guess hashing algorithm based on checksum length
     if not (algorithm := supported_algorithms.get(len(checksum), None)):
-        logging.warning('Invalid checksum size for %s', algorithm)
+        logging.warning('Invalid checksum size for %s', path)
         return False
+    if dcheck.core.cache.lookup(path, 'checksum', checksum):
+        return True
 
     # Build checksum of file using selected algorithm
     hasher = algorithm()
-    with open(path, 'rb') as fh:
-        for chunk in iter(lambda: fh.read(4096), b''):
-            hasher.update(chunk)
+    buffer = bytearray(dcheck.core.config.get('hash_buffer_size'))
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as fh:
+        while size := fh.readinto(buffer):
+            if cancel and cancel.is_set():
+                return None
+            hasher.update(view[:size])
 
     # Check for the expected value
-    return hasher.hexdigest() == checksum
+    if hasher.hexdigest() != checksum:
+        return False
+    dcheck.core.cache.store(path, 'checksum', checksum, True)
+    return True
 
 
-def verify_signature(path) -> gnupg.Verify:
+def verify_signature(path) -> dcheck.core.gpg.Signature:
     '''
     Verify the PGP signature within a file at a given path.
     '''
-    gpg = gnupg.GPG()
+    gnupghome = dcheck.core.config.get('gpg_home')
+    keyring = f'{gnupghome or "default"}/' \
+        + dcheck.core.gpg.keyring_version(gnupghome)
+    if cached := dcheck.core.cache.lookup(path, 'signature', keyring):
+        if (result := dcheck.core.gpg.Signature.from_dict(cached)).current():
+            return result
+
+    result = dcheck.core.gpg.service().verify(path)
+    if result:
+        dcheck.core.cache.store(path, 'signature', keyring, result.to_dict())
+    return result
+
+
+def verify_incoming(path=None) -> dict:
+    '''
+    Verify signatures of all changes files in a given directory at once.
+
+    Returns {changes: Signature}.
+    '''
+    if not path:
+        path = dcheck.core.config.get('pending_dir')
+    incoming = pathlib.Path(path)
+    results = dcheck.core.gpg.service().verify_many(
+            incoming / changes for changes in list_incoming(path))
+    return {changes.name: result for changes, result in results.items()}
+
+
+def read_file(path) -> bytes:
+    '''
+    Return contents of a file within workspace_dir, materialising it from its
+    archive first when the workspace is virtual.
+    '''
+    path = pathlib.Path(path)
+    if not path.is_file():
+        workspace_dir = pathlib.Path(dcheck.core.config.get('workspace_dir'))
+        try:
+            relative = path.relative_to(workspace_dir)
+        except ValueError:
+            raise FileNotFoundError(f'Not in workspace_dir: {path}')
+        vfs = dcheck.core.vfs.get_workspace(workspace_dir / relative.parts[0])
+        path = vfs.materialise(str(relative.relative_to(relative.parts[0])))
     with open(path, 'rb') as fh:
-        return gpg.verify_file(fh, extra_args=['-o', '-'])
+        return fh.read()
 
 
 def wipe_workspace(package) -> bool:
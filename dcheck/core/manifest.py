@@ -0,0 +1,416 @@
+'''
+DCheck Workspace Manifest
+
+Size, mode, sha256, and content type of every file in a workspace, built
+once (in parallel) after ingest and saved in the workspace metadata
+directory, so nothing needs to walk and hash the workspace again.
+
+Usage::
+
+    python3 -m dcheck.core.manifest /path/to/workspace_dir/package_1.0-1
+'''
+# Python
+import array
+import base64
+import codecs
+import collections
+import concurrent.futures
+import hashlib
+import json
+import mimetypes
+import os
+import pathlib
+import posixpath
+import sys
+
+# DCheck
+import dcheck.core.config
+import dcheck.core.store
+import dcheck.core.vfs
+
+# A single row of a Manifest
+FileInfo = collections.namedtuple(
+        'FileInfo', ['path', 'size', 'mode', 'sha256', 'binary', 'mime',
+                     'encoding'])
+
+# Leading bytes of common binary formats
+magic_numbers = [
+        (b'\x7fELF', 'application/x-executable'),
+        (b'MZ', 'application/vnd.microsoft.portable-executable'),
+        (b'\xca\xfe\xba\xbe', 'application/java-vm'),
+        (b'\x00asm', 'application/wasm'),
+        (b'!<arch>\n', 'application/x-archive'),
+        (b'\x89PNG\r\n\x1a\n', 'image/png'),
+        (b'\xff\xd8\xff', 'image/jpeg'),
+        (b'GIF8', 'image/gif'),
+        (b'%PDF-', 'application/pdf'),
+        (b'PK\x03\x04', 'application/zip'),
+        (b'\x1f\x8b', 'application/gzip'),
+        (b'BZh', 'application/x-bzip2'),
+        (b'\xfd7zXZ\x00', 'application/x-xz'),
+        (b'\x28\xb5\x2f\xfd', 'application/zstd'),
+        ]
+
+# Bytes expected in text; anything else in the first block suggests binary
+text_characters = bytes([7, 8, 9, 10, 11, 12, 13, 27]) \
+    + bytes(range(0x20, 0x7f)) + bytes(range(0x80, 0x100))
+
+# Paths which differ between two manifests (see diff())
+ManifestDiff = collections.namedtuple(
+        'ManifestDiff', ['added', 'modified', 'removed', 'unchanged'])
+
+# Bytes at the start of a file used to decide if it is binary
+SAMPLE_SIZE = 8192
+
+# Loaded manifests (see get_manifest())
+loaded_manifests = {}
+
+
+class Manifest:
+    '''
+    Columnar list of files; each attribute holds one column and rows are
+    only built (as FileInfo) when requested.
+    '''
+    def __init__(self):
+        self.paths = []
+        self.sizes = array.array('q')
+        self.modes = array.array('I')
+        self.digests = bytearray()  # 32 bytes (sha256) per file
+        self.binary = array.array('B')
+        self.mime_ids = array.array('H')
+        self.encoding_ids = array.array('H')
+        self.mimes = []  # Names referenced by mime_ids
+        self.encodings = []  # Names referenced by encoding_ids
+        self.positions = None
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __iter__(self):
+        return (self.row(x) for x in range(len(self.paths)))
+
+    def __contains__(self, path):
+        return self.position(path) is not None
+
+    def append(self, path, size, mode, digest, binary, mime, encoding):
+        '''
+        Add a file; digest is the raw (32 byte) sha256.
+        '''
+        self.paths.append(path)
+        self.sizes.append(size)
+        self.modes.append(mode)
+        self.digests += digest
+        self.binary.append(binary)
+        self.mime_ids.append(self.intern(self.mimes, mime))
+        self.encoding_ids.append(self.intern(self.encodings, encoding))
+        self.positions = None
+
+    @staticmethod
+    def intern(names, name) -> int:
+        if name not in names:
+            names.append(name)
+        return names.index(name)
+
+    def sha256(self, number) -> str:
+        return self.digests[number * 32:number * 32 + 32].hex()
+
+    def row(self, number) -> FileInfo:
+        return FileInfo(
+                self.paths[number], self.sizes[number], self.modes[number],
+                self.sha256(number), bool(self.binary[number]),
+                self.mimes[self.mime_ids[number]],
+                self.encodings[self.encoding_ids[number]])
+
+    def position(self, path):
+        '''
+        Return the row number of a (relative) path, or None.
+        '''
+        if self.positions is None:
+            self.positions = {x: n for n, x in enumerate(self.paths)}
+        return self.positions.get(path)
+
+    def get(self, path):
+        '''
+        Return the FileInfo of a (relative) path, or None.
+        '''
+        number = self.position(path)
+        return None if number is None else self.row(number)
+
+    def to_dict(self) -> dict:
+        '''
+        Return a serializable form; numeric columns are base64 encoded.
+        '''
+        return {
+            'byteorder': sys.byteorder,
+            'paths': self.paths,
+            'sizes': base64.b64encode(self.sizes).decode(),
+            'modes': base64.b64encode(self.modes).decode(),
+            'sha256': base64.b64encode(self.digests).decode(),
+            'binary': base64.b64encode(self.binary).decode(),
+            'mime_ids': base64.b64encode(self.mime_ids).decode(),
+            'encoding_ids': base64.b64encode(self.encoding_ids).decode(),
+            'id_type': self.mime_ids.typecode,
+            'mimes': self.mimes,
+            'encodings': self.encodings,
+            }
+
+    @classmethod
+    def from_dict(cls, value):
+        '''
+        Rebuild a manifest saved with to_dict().
+        '''
+        manifest = cls()
+        manifest.paths = value['paths']
+        manifest.digests = bytearray(base64.b64decode(value['sha256']))
+        manifest.mimes = value['mimes']
+        manifest.encodings = value['encodings']
+        for column in ['sizes', 'modes', 'binary', 'mime_ids',
+                       'encoding_ids']:
+            typecode = getattr(manifest, column).typecode
+            # Manifests saved before ids were widened hold single byte ids
+            saved = value.get('id_type', 'B') \
+                if column.endswith('_ids') else typecode
+            data = array.array(saved, base64.b64decode(value[column]))
+            if value['byteorder'] != sys.byteorder:
+                data.byteswap()
+            if saved != typecode:
+                data = array.array(typecode, data.tolist())
+            setattr(manifest, column, data)
+        return manifest
+
+
+def manifest_path(workspace) -> pathlib.Path:
+    '''
+    Return the path of the saved manifest of a workspace.
+    '''
+    return dcheck.core.vfs.meta_dir(workspace) / 'manifest.json'
+
+
+def save(workspace, manifest):
+    '''
+    Save the manifest of a workspace.
+    '''
+    path = manifest_path(workspace)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix('.tmp')
+    with open(temporary, 'w') as fh:
+        json.dump(manifest.to_dict(), fh)
+    os.replace(temporary, path)
+
+
+def load(workspace):
+    '''
+    Return the saved manifest of a workspace, or None.
+    '''
+    try:
+        with open(manifest_path(workspace), 'r') as fh:
+            return Manifest.from_dict(json.load(fh))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def get_manifest(workspace):
+    '''
+    Return the (shared) saved manifest of a workspace, or None; reloaded
+    when the saved manifest changes.
+    '''
+    workspace = pathlib.Path(workspace)
+    try:
+        version = os.stat(manifest_path(workspace)).st_mtime_ns
+    except OSError:
+        loaded_manifests.pop(workspace, None)
+        return None
+    if workspace not in loaded_manifests or \
+            loaded_manifests[workspace][1] != version:
+        loaded_manifests[workspace] = (load(workspace), version)
+    return loaded_manifests[workspace][0]
+
+
+def diff(old, new) -> ManifestDiff:
+    '''
+    Compare two manifests by path and content (sha256 and mode).
+    '''
+    changes = ManifestDiff([], [], [], [])
+    for number, path in enumerate(new.paths):
+        if (other := old.position(path)) is None:
+            changes.added.append(path)
+        elif old.digests[other * 32:other * 32 + 32] \
+                != new.digests[number * 32:number * 32 + 32] \
+                or old.modes[other] != new.modes[number]:
+            changes.modified.append(path)
+        else:
+            changes.unchanged.append(path)
+    changes.removed.extend(x for x in old.paths if x not in new)
+    return changes
+
+
+def is_binary(sample) -> bool:
+    '''
+    Guess if data is binary from a sample of its first bytes.
+    '''
+    if b'\0' in sample:
+        return True
+    return len(sample.translate(None, text_characters)) > len(sample) * 0.3
+
+
+def is_complete(decoder) -> bool:
+    '''
+    Check if an incremental decoder is not left within a character.
+    '''
+    try:
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def describe(name, chunks, digest=None) -> tuple:
+    '''
+    Return (sha256, binary, mime, encoding) of data read as chunks.
+
+    Hashing is skipped if digest (raw sha256) is already known.
+    '''
+    hasher = None if digest else hashlib.sha256()
+    binary = None
+    mime = None
+    ascii_only = True
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    utf8 = True
+    for chunk in chunks:
+        if binary is None:
+            binary = is_binary(chunk[:SAMPLE_SIZE])
+            if binary:
+                mime = next((
+                    mime for magic, mime in magic_numbers
+                    if chunk.startswith(magic)), 'application/octet-stream')
+        if hasher:
+            hasher.update(chunk)
+        elif binary:
+            break
+        if binary or not utf8:
+            continue
+        if ascii_only and chunk.isascii():
+            continue
+        ascii_only = False
+        try:
+            decoder.decode(chunk)
+        except UnicodeDecodeError:
+            utf8 = False
+
+    if binary:
+        encoding = 'binary'
+    else:
+        mime = mimetypes.guess_type(name)[0] or 'text/plain'
+        if ascii_only:
+            encoding = 'us-ascii'
+        elif utf8 and is_complete(decoder):
+            encoding = 'utf-8'
+        else:
+            encoding = 'unknown-8bit'
+    return (hasher.digest() if hasher else digest, bool(binary), mime,
+            encoding)
+
+
+def describe_file(path, digest=None, bufsize=1048576) -> tuple:
+    '''
+    Return describe() of a file at a given path.
+    '''
+    with open(path, 'rb') as fh:
+        return describe(
+                path.name, iter(lambda: fh.read(bufsize), b''), digest)
+
+
+def known_digest(path, st, known):
+    '''
+    Return the (raw) sha256 of a file from known digests (of workspace
+    store blobs), if the file still is a link to that blob.
+    '''
+    if not (digest := known.get(path)):
+        return None
+    try:
+        blob = os.stat(dcheck.core.store.blob_path(digest, st.st_mode))
+    except OSError:
+        return None
+    if (blob.st_dev, blob.st_ino) != (st.st_dev, st.st_ino):
+        return None
+    return bytes.fromhex(digest)
+
+
+def build(workspace, known=None, workers=None) -> Manifest:
+    '''
+    Build the manifest of a workspace, including members of (virtual)
+    archives which were not extracted.
+
+    Known maps relative paths to sha256 digests of store blobs (see
+    dcheck.core.store.load_tree); files linked to those are not hashed again.
+    '''
+    workspace = pathlib.Path(workspace)
+    known = known or {}
+    bufsize = dcheck.core.config.get('hash_buffer_size')
+    workers = workers or dcheck.core.config.get('ingest_workers') \
+        or os.cpu_count()
+    meta = dcheck.core.vfs.meta_dir(workspace).name
+
+    # Regular files on disk
+    files = []
+    for dirpath, dirnames, filenames in os.walk(workspace):
+        if dirpath == str(workspace) and meta in dirnames:
+            dirnames.remove(meta)
+        for name in filenames:
+            path = pathlib.Path(dirpath) / name
+            st = path.lstat()
+            if path.is_file() and not path.is_symlink():
+                files.append((str(path.relative_to(workspace)), path, st))
+
+    rows = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        jobs = {
+            pool.submit(
+                describe_file, path, known_digest(relpath, st, known),
+                bufsize): (relpath, st.st_size, st.st_mode & 0o7777)
+            for relpath, path, st in files}
+
+        # Members of virtual archives, read in archive order meanwhile
+        if dcheck.core.vfs.has_index(workspace):
+            vfs = dcheck.core.vfs.VirtualWorkspace(workspace)
+            members = sorted(
+                    (archive, member[2], path)
+                    for path, (archive, member) in vfs.members.items()
+                    if member[1] in 'fh'
+                    and not (workspace / path).exists())
+            try:
+                for archive, offset, path in members:
+                    data = vfs.read(path)
+                    mode = vfs.members[path][1][4] & 0o7777
+                    rows[path] = (
+                        len(data), mode,
+                        *describe(posixpath.basename(path), [data]))
+            finally:
+                vfs.close()
+
+        for job in concurrent.futures.as_completed(jobs):
+            relpath, size, mode = jobs[job]
+            rows[relpath] = (size, mode, *job.result())
+
+    manifest = Manifest()
+    for relpath in sorted(rows):
+        manifest.append(relpath, *rows[relpath])
+    return manifest
+
+
+def main():
+    '''
+    Print the manifest of a workspace, building it if needed.
+    '''
+    workspace = pathlib.Path(sys.argv[1])
+    if (manifest := load(workspace)) is None:
+        manifest = build(workspace)
+        save(workspace, manifest)
+    for info in manifest:
+        print(f'{info.sha256}  {info.size:>10}  {info.mode:04o}  '
+              f'{info.mime:<32}  {info.encoding:<12}  {info.path}')
+
+
+if __name__ == '__main__':
+    dcheck.core.config.load_configuration()
+    main()
@@ -0,0 +1,158 @@
+'''
+DCheck Review State
+
+Outcomes of file check reviews, kept as a single hash per upload in the
+data engine (reviews/<package hash>). Each field holds the outcomes of one
+check by one reviewer (<check>/<reviewer>) as an array of 2-bit states
+packed by the manifest position of each file, so the review state of a
+package is loaded with a single fetch and a review only rewrites one field.
+'''
+# Python
+import base64
+import collections
+import hashlib
+import logging
+import pathlib
+
+# DCheck
+import dcheck.core.data
+import dcheck.core.manifest
+import dcheck.core.revisions
+
+# States of a file in a ReviewState
+UNREVIEWED = 0
+APPROVED = 1
+REJECTED = 2
+
+# Field recording the manifest which positions refer to (see paths_digest())
+MANIFEST_FIELD = '_manifest'
+
+
+class ReviewState:
+    '''
+    Review states of all files of a manifest, packed four to a byte.
+    '''
+    def __init__(self, size, data=b''):
+        self.size = size
+        self.data = bytearray(data[:(size + 3) // 4])
+        self.data.extend(bytes((size + 3) // 4 - len(self.data)))
+
+    def get(self, number) -> int:
+        return self.data[number >> 2] >> ((number & 3) * 2) & 3
+
+    def set(self, number, state):
+        shift = (number & 3) * 2
+        self.data[number >> 2] = \
+            self.data[number >> 2] & ~(3 << shift) | state << shift
+
+    def items(self):
+        '''
+        Iterate over (position, state) of files which were reviewed.
+        '''
+        for index, byte in enumerate(self.data):
+            while byte:
+                shift = (byte & -byte).bit_length() - 1 & ~1
+                yield (index * 4 + shift // 2, byte >> shift & 3)
+                byte &= ~(3 << shift)
+
+    def encode(self) -> str:
+        return base64.b64encode(self.data).decode()
+
+    @classmethod
+    def decode(cls, size, value):
+        return cls(size, base64.b64decode(value))
+
+
+def state_key(package_hash) -> str:
+    return f'reviews/{package_hash}'
+
+
+def field_name(check_id, reviewer) -> str:
+    return f'{check_id}/{reviewer}'
+
+
+def paths_digest(manifest) -> str:
+    '''
+    Return a digest of the order of files in a manifest.
+    '''
+    return hashlib.sha256('\0'.join(manifest.paths).encode()).hexdigest()
+
+
+def load(workspace) -> dict:
+    '''
+    Return the review state of a workspace as {(check_id, reviewer):
+    ReviewState}, with a single fetch.
+    '''
+    workspace = pathlib.Path(workspace)
+    manifest = dcheck.core.manifest.get_manifest(workspace)
+    package_hash = dcheck.core.revisions.package_hash(workspace)
+    if manifest is None or not package_hash:
+        return {}
+    fields = dcheck.core.data.hgetall(state_key(package_hash))
+    if fields.pop(MANIFEST_FIELD, None) not in (None, paths_digest(manifest)):
+        logging.warning('Ignoring reviews of %s made against an older '
+                        'manifest', workspace.name)
+        return {}
+    state = {}
+    for field, value in fields.items():
+        check_id, sep, reviewer = field.partition('/')
+        state[(check_id, reviewer)] = ReviewState.decode(len(manifest), value)
+    return state
+
+
+def outcomes(workspace):
+    '''
+    Iterate over (check_id, path, reviewer, outcome) of all file reviews of
+    a workspace.
+    '''
+    manifest = dcheck.core.manifest.get_manifest(workspace)
+    for (check_id, reviewer), state in load(workspace).items():
+        for number, value in state.items():
+            yield (check_id, manifest.paths[number], reviewer,
+                   value == APPROVED)
+
+
+def record_many(workspace, reviews) -> int:
+    '''
+    Record many (check_id, path, reviewer, outcome) file reviews of a
+    workspace, only rewriting the fields which changed. Returns the number
+    recorded.
+    '''
+    workspace = pathlib.Path(workspace)
+    manifest = dcheck.core.manifest.get_manifest(workspace)
+    package_hash = dcheck.core.revisions.package_hash(workspace)
+    if manifest is None or not package_hash:
+        raise ValueError(f'{workspace.name} has no manifest or .changes')
+    key = state_key(package_hash)
+    digest = paths_digest(manifest)
+
+    by_field = collections.defaultdict(list)
+    for check_id, path, reviewer, outcome in reviews:
+        if (number := manifest.position(path)) is None:
+            raise KeyError(f'{path} is not part of {workspace.name}')
+        by_field[field_name(check_id, reviewer)].append(
+                (number, APPROVED if outcome else REJECTED))
+    if not by_field:
+        return 0
+
+    stored = {x: dcheck.core.data.hget(key, x) for x in by_field}
+    if dcheck.core.data.hget(key, MANIFEST_FIELD) != digest:
+        # Positions of an older manifest no longer apply
+        dcheck.core.data.hdel(key, *dcheck.core.data.hgetall(key))
+        stored = {}
+    changed = {MANIFEST_FIELD: digest}
+    for field, updates in by_field.items():
+        state = ReviewState.decode(len(manifest), stored[field]) \
+            if stored.get(field) else ReviewState(len(manifest))
+        for number, value in updates:
+            state.set(number, value)
+        changed[field] = state.encode()
+    dcheck.core.data.hset(key, changed)
+    return sum(len(x) for x in by_field.values())
+
+
+def record(workspace, check_id, path, reviewer, outcome):
+    '''
+    Record the outcome of a single file review.
+    '''
+    record_many(workspace, [(check_id, path, reviewer, outcome)])
@@ -0,0 +1,159 @@
+'''
+DCheck Package Revisions
+
+Relate a workspace (workspace_dir/<name>_<version>) to the previous
+revision of the same package, so reviews of files which did not change
+carry forward to the new upload.
+'''
+# Python
+import functools
+import logging
+import pathlib
+import string
+
+# DCheck
+import dcheck.core.manifest
+import dcheck.core.reviews
+import dcheck.core.store
+
+
+def order(char) -> int:
+    '''
+    Return the sort weight of a non-digit version character (as dpkg).
+    '''
+    if char == '~':
+        return -1
+    if not char or char in string.digits:
+        return 0
+    if char in string.ascii_letters:
+        return ord(char)
+    return ord(char) + 256
+
+
+def compare_fragment(a, b) -> int:
+    '''
+    Compare upstream versions or Debian revisions (as dpkg).
+    '''
+    i = j = 0
+    while i < len(a) or j < len(b):
+        # Non-digit prefixes are compared character by character
+        while (i < len(a) and a[i] not in string.digits) \
+                or (j < len(b) and b[j] not in string.digits):
+            first = order(a[i] if i < len(a) else '')
+            second = order(b[j] if j < len(b) else '')
+            if first != second:
+                return first - second
+            i += 1
+            j += 1
+
+        # Followed by numbers, compared by value
+        start = i
+        while i < len(a) and a[i] in string.digits:
+            i += 1
+        first = int(a[start:i] or 0)
+        start = j
+        while j < len(b) and b[j] in string.digits:
+            j += 1
+        second = int(b[start:j] or 0)
+        if first != second:
+            return first - second
+    return 0
+
+
+def compare_versions(a, b) -> int:
+    '''
+    Compare two Debian versions; negative if a is older than b, 0 if they
+    are equal, and positive if a is newer.
+    '''
+    def split(version):
+        epoch, sep, rest = version.partition(':')
+        if not sep:
+            epoch, rest = '0', version
+        upstream, sep, revision = rest.rpartition('-')
+        if not sep:
+            upstream, revision = rest, ''
+        return (int(epoch or 0), upstream, revision)
+
+    first, second = split(a), split(b)
+    if first[0] != second[0]:
+        return first[0] - second[0]
+    return compare_fragment(first[1], second[1]) \
+        or compare_fragment(first[2], second[2])
+
+
+def package_hash(workspace):
+    '''
+    Return the sha256 of the .changes file of a workspace, or None.
+    '''
+    workspace = pathlib.Path(workspace)
+    for path in sorted((workspace / 'source').glob('*.changes')):
+        manifest = dcheck.core.manifest.get_manifest(workspace)
+        info = manifest.get(str(path.relative_to(workspace))) \
+            if manifest else None
+        return info.sha256 if info else dcheck.core.store.hash_file(path)
+    return None
+
+
+def previous_workspace(workspace):
+    '''
+    Return the newest workspace of the same package with an older version
+    and a manifest, or None.
+    '''
+    workspace = pathlib.Path(workspace)
+    package, sep, version = workspace.name.partition('_')
+    candidates = []
+    for path in workspace.parent.glob(f'{package}_*'):
+        other = path.name.partition('_')[2]
+        if path.is_dir() and compare_versions(other, version) < 0 \
+                and dcheck.core.manifest.manifest_path(path).exists():
+            candidates.append((other, path))
+    if not candidates:
+        return None
+    return max(candidates, key=functools.cmp_to_key(
+            lambda a, b: compare_versions(a[0], b[0])))[1]
+
+
+def diff(previous, workspace):
+    '''
+    Return dcheck.core.manifest.diff() of two workspaces, or None if either
+    has no manifest.
+    '''
+    old = dcheck.core.manifest.get_manifest(previous)
+    new = dcheck.core.manifest.get_manifest(workspace)
+    if old is None or new is None:
+        return None
+    return dcheck.core.manifest.diff(old, new)
+
+
+def carry_reviews(previous, workspace, unchanged) -> int:
+    '''
+    Copy reviews of unchanged files from a previous workspace (see
+    dcheck.core.reviews). Returns the number copied.
+    '''
+    old, new = package_hash(previous), package_hash(workspace)
+    if not old or not new or old == new:
+        return 0
+    unchanged = set(unchanged)
+    return dcheck.core.reviews.record_many(workspace, [
+            x for x in dcheck.core.reviews.outcomes(previous)
+            if x[1] in unchanged])
+
+
+def carry_forward(workspace):
+    '''
+    Carry reviews forward from the previous revision of a workspace.
+
+    Returns the diff against the previous revision, or None if there is no
+    previous revision.
+    '''
+    if not (previous := previous_workspace(workspace)):
+        return None
+    if not (changes := diff(previous, workspace)):
+        return None
+    copied = carry_reviews(previous, workspace, changes.unchanged)
+    logging.info(
+            '%s since %s: %d added, %d modified, %d removed, %d unchanged '
+            '(%d reviews carried forward)', pathlib.Path(workspace).name,
+            previous.name, len(changes.added), len(changes.modified),
+            len(changes.removed), len(changes.unchanged), copied)
+    return changes
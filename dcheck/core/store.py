@@ -0,0 +1,249 @@
+'''
+DCheck Workspace Store
+
+Content-addressed storage for workspace files. Each unique file is kept
+once under workspace_dir/.store and workspaces are built as hardlink farms
+into it, so identical files are shared across revisions and packages.
+
+Blobs are read-only, so a change made through one workspace can not leak
+into every other workspace sharing the file. Linking holds a shared lock on
+the store, which gc() takes exclusively while it removes unused blobs.
+'''
+# Python
+import concurrent.futures
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import pathlib
+
+# DCheck
+import dcheck.core.config
+
+
+def store_dir() -> pathlib.Path:
+    '''
+    Return the root of the content-addressed store.
+    '''
+    return pathlib.Path(dcheck.core.config.get('workspace_dir')) / '.store'
+
+
+def blob_mode(mode) -> int:
+    '''
+    Return the (read-only) permissions of the blob for a file mode.
+    '''
+    return mode & 0o7777 & ~0o222
+
+
+def blob_path(digest, mode) -> pathlib.Path:
+    '''
+    Return the path of a blob; permissions are part of its identity since
+    hardlinks share them. Mode may be given before or after blob_mode().
+    '''
+    return store_dir() / 'blobs' / digest[:2] / \
+        f'{digest}-{blob_mode(mode):o}'
+
+
+@contextlib.contextmanager
+def locked(exclusive=False):
+    '''
+    Hold the store lock; shared while linking blobs, exclusive in gc().
+    '''
+    path = store_dir() / 'lock'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def hash_file(path) -> str:
+    '''
+    Return the sha256 of a file at a given path.
+    '''
+    hasher = hashlib.sha256()
+    buffer = bytearray(dcheck.core.config.get('hash_buffer_size'))
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as fh:
+        while size := fh.readinto(buffer):
+            hasher.update(view[:size])
+    return hasher.hexdigest()
+
+
+def link_blob(blob, path):
+    '''
+    Atomically replace path with a hardlink to blob.
+    '''
+    temporary = f'{path}.dcheck-link'
+    os.link(blob, temporary)
+    os.replace(temporary, path)
+
+
+def absorb_file(path, digest=None) -> str:
+    '''
+    Move a file into the store (or reuse an identical blob) and leave a
+    hardlink in its place. Files linked from outside the store (e.g. an
+    upload, see ingest_link) are left in place unless an identical blob
+    exists, so they are neither copied nor made read-only. Returns the
+    sha256 of the file.
+
+    Must be called with the store lock held (see locked()).
+    '''
+    digest = digest or hash_file(path)
+    st = os.stat(path)
+    blob = blob_path(digest, st.st_mode)
+    try:
+        blob_st = os.stat(blob)
+    except FileNotFoundError:
+        blob_st = None
+
+    if blob_st and blob_st.st_ino == st.st_ino:
+        return digest
+    if blob_st:
+        link_blob(blob, path)
+        return digest
+
+    if st.st_nlink > 1:
+        return digest
+
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    os.chmod(path, blob_mode(st.st_mode))
+    try:
+        os.link(path, blob)
+    except FileExistsError:
+        # Stored by another worker in the meantime
+        link_blob(blob, path)
+    return digest
+
+
+def absorb_tree(root, workers=None, digests=None) -> dict:
+    '''
+    Absorb every regular file below root into the store.
+
+    Digests maps absolute paths to the sha256 of files which were hashed
+    while they were written (see dcheck.core.archive.extract_tar); other
+    files are read again.
+
+    Returns a tree of {relative path: entry} where entry is one of
+    ['f', sha256, mode], ['l', symlink target], or ['d', mode].
+    '''
+    digests = digests or {}
+    root = pathlib.Path(root)
+    tree = {}
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            path = pathlib.Path(dirpath) / name
+            st = path.lstat()
+            if path.is_symlink():
+                tree[str(path.relative_to(root))] = ['l', os.readlink(path)]
+            elif path.is_dir():
+                tree[str(path.relative_to(root))] = ['d', st.st_mode & 0o7777]
+            elif path.is_file():
+                paths.append((path, st.st_mode & 0o7777))
+    if not workers:
+        workers = dcheck.core.config.get('ingest_workers') or os.cpu_count()
+
+    with locked(), \
+            concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        absorbed = pool.map(absorb_file, [path for path, mode in paths], [
+                digests.get(os.path.abspath(path)) for path, mode in paths])
+        for (path, mode), digest in zip(paths, absorbed):
+            tree[str(path.relative_to(root))] = ['f', digest, mode]
+    return tree
+
+
+def tree_path(digest) -> pathlib.Path:
+    '''
+    Return the path of a saved tree for an archive with a given sha256.
+    '''
+    return store_dir() / 'trees' / f'{digest}.json'
+
+
+def save_tree(digest, tree):
+    '''
+    Remember the extracted tree (see absorb_tree) of an archive.
+    '''
+    path = tree_path(digest)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix('.tmp')
+    with open(temporary, 'w') as fh:
+        json.dump(tree, fh)
+    os.replace(temporary, path)
+
+
+def load_tree(digest):
+    '''
+    Return the saved tree of an archive, or None if it was never extracted
+    or any of its blobs have since been removed.
+    '''
+    try:
+        with open(tree_path(digest), 'r') as fh:
+            tree = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    for entry in tree.values():
+        if entry[0] == 'f' and not blob_path(entry[1], entry[2]).exists():
+            return None
+    return tree
+
+
+def build_tree(tree, dest) -> bool:
+    '''
+    Recreate a saved tree below dest as hardlinks into the store.
+
+    Directories get their recorded permissions once they are filled. Returns
+    False if blobs of the tree were removed in the meantime (see gc()).
+    '''
+    dest = pathlib.Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    directories = []
+    with locked():
+        # Sorted order creates parent directories before their contents
+        for relpath, entry in sorted(tree.items()):
+            path = dest / relpath
+            if entry[0] == 'd':
+                path.mkdir(mode=0o700, exist_ok=True)
+                directories.append((path, entry[1]))
+            elif entry[0] == 'l':
+                os.symlink(entry[1], path)
+            else:
+                try:
+                    os.link(blob_path(entry[1], entry[2]), path)
+                except FileNotFoundError:
+                    return False
+    # Deepest first, so read-only directories are not entered again
+    for path, mode in reversed(directories):
+        os.chmod(path, mode)
+    return True
+
+
+def gc() -> int:
+    '''
+    Remove blobs which are no longer linked from any workspace, and saved
+    trees which can no longer be built from the remaining blobs.
+
+    The link count of a blob is its reference count; a blob with a single
+    link is only referenced by the store. Returns the number of bytes freed.
+    '''
+    freed = 0
+    blobs = store_dir() / 'blobs'
+    if not blobs.is_dir():
+        return freed
+    with locked(exclusive=True):
+        for prefix in os.scandir(blobs):
+            for blob in os.scandir(prefix.path):
+                st = blob.stat(follow_symlinks=False)
+                if st.st_nlink == 1:
+                    os.unlink(blob.path)
+                    freed += st.st_size
+        for path in (store_dir() / 'trees').glob('*.json'):
+            if load_tree(path.stem) is None:
+                freed += path.stat().st_size
+                path.unlink()
+    logging.info('Store cleanup freed %d bytes', freed)
+    return freed
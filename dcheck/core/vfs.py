@@ -0,0 +1,233 @@
+'''
+DCheck Virtual Workspace
+
+Browse and read archive members without extracting them. Each archive of a
+workspace has a member index saved in the workspace metadata directory and
+members are only written to disk (materialised) once they are needed.
+'''
+# Python
+import collections
+import json
+import os
+import pathlib
+import posixpath
+
+# DCheck
+import dcheck.core.archive
+
+# Opened workspaces (see get_workspace())
+loaded_workspaces = {}
+
+
+def meta_dir(workspace) -> pathlib.Path:
+    '''
+    Return the metadata directory of a workspace.
+    '''
+    return pathlib.Path(workspace) / '.dcheck'
+
+
+def index_path(workspace, archive) -> pathlib.Path:
+    '''
+    Return the path of the saved member index of an archive.
+    '''
+    return meta_dir(workspace) / f'{archive}.index.json'
+
+
+def save_index(workspace, archive, members):
+    '''
+    Save the member index (see dcheck.core.archive.index) of an archive.
+    '''
+    path = index_path(workspace, archive)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as fh:
+        json.dump(members, fh)
+
+
+def checkpoints_path(workspace, archive) -> pathlib.Path:
+    '''
+    Return the path of saved decompression checkpoints of an archive.
+    '''
+    return meta_dir(workspace) / f'{archive}.checkpoints.json'
+
+
+def save_checkpoints(workspace, archive, checkpoints):
+    '''
+    Save decompression checkpoints (see dcheck.core.archive.checkpoints) of
+    an archive.
+    '''
+    path = checkpoints_path(workspace, archive)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as fh:
+        json.dump(checkpoints, fh)
+
+
+def load_checkpoints(workspace, archive):
+    '''
+    Return saved decompression checkpoints of an archive, or None.
+    '''
+    try:
+        with open(checkpoints_path(workspace, archive), 'r') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def has_index(workspace) -> bool:
+    '''
+    Check if a workspace has any archives which were not extracted.
+    '''
+    path = meta_dir(workspace)
+    return path.is_dir() and any(path.glob('*.index.json'))
+
+
+def normalize(name) -> str:
+    '''
+    Return a member name as a clean relative path.
+    '''
+    return posixpath.normpath('/' + name).lstrip('/')
+
+
+class VirtualWorkspace:
+    '''
+    Read-only view of a workspace merging files on disk with members of its
+    (not extracted) archives.
+    '''
+    def __init__(self, workspace):
+        self.root = pathlib.Path(workspace)
+        self.members = {}  # path: (archive, member)
+        self.dirs = {''}
+        self.children = collections.defaultdict(set)
+        self.handles = {}
+
+        # Debian data is applied on top of upstream (.orig) data
+        indexes = sorted(
+                meta_dir(self.root).glob('*.index.json'),
+                key=lambda x: ('.orig' not in x.name, x.name))
+        for path in indexes:
+            archive = path.name[:-len('.index.json')]
+            with open(path, 'r') as fh:
+                for member in json.load(fh):
+                    if not (name := normalize(member[0])):
+                        continue
+                    if member[1] == 'd':
+                        self.dirs.add(name)
+                    else:
+                        self.members[name] = (archive, member)
+                    # Parent directories may not be listed explicitly
+                    while name:
+                        parent = posixpath.dirname(name)
+                        self.children[parent].add(posixpath.basename(name))
+                        self.dirs.add(parent)
+                        name = parent
+
+    def close(self):
+        for fh in self.handles.values():
+            fh.close()
+        self.handles = {}
+
+    def isdir(self, path) -> bool:
+        path = normalize(path)
+        return path in self.dirs or (self.root / path).is_dir()
+
+    def exists(self, path) -> bool:
+        path = normalize(path)
+        return path in self.members or self.isdir(path) \
+            or (self.root / path).exists()
+
+    def listdir(self, path='') -> list:
+        '''
+        Return sorted names within a directory, virtual or on disk.
+        '''
+        path = normalize(path)
+        names = set(self.children.get(path, ()))
+        if (self.root / path).is_dir():
+            names.update(
+                    x for x in os.listdir(self.root / path)
+                    if x != meta_dir(self.root).name)
+        return sorted(names)
+
+    def read(self, path, depth=0) -> bytes:
+        '''
+        Return contents of a file without writing it to disk.
+        '''
+        path = normalize(path)
+        real = self.root / path
+        if real.is_file() and not real.is_symlink():
+            with open(real, 'rb') as fh:
+                return fh.read()
+        if path not in self.members:
+            raise FileNotFoundError(f'No such file in workspace: {path}')
+
+        archive, member = self.members[path]
+        name, kind, offset, size, mode, linkname = member
+        if kind in ['l', 'h']:
+            if depth > 40:
+                raise OSError(f'Too many levels of links: {path}')
+            return self.read(self.link_target(path), depth + 1)
+        source = self.root / 'source' / archive
+        if dcheck.core.archive.archive_type(source) == 'zip':
+            return dcheck.core.archive.read_member(source, member)
+        if archive not in self.handles:
+            self.handles[archive] = dcheck.core.archive.open_decompressed(
+                    source, load_checkpoints(self.root, archive))
+        return dcheck.core.archive.read_member(
+                source, member, self.handles[archive])
+
+    def link_target(self, path) -> str:
+        '''
+        Return the workspace path a symlink or hardlink member points to.
+        '''
+        archive, member = self.members[normalize(path)]
+        if member[1] == 'h':
+            return normalize(member[5])
+        return normalize(posixpath.join(posixpath.dirname(path), member[5]))
+
+    def materialise(self, path) -> pathlib.Path:
+        '''
+        Write a member to disk (if not already there) and return its path.
+        '''
+        path = normalize(path)
+        real = self.root / path
+        if real.exists() or real.is_symlink():
+            return real
+        if path in self.dirs:
+            real.mkdir(parents=True, exist_ok=True)
+            return real
+        if path not in self.members:
+            raise FileNotFoundError(f'No such file in workspace: {path}')
+
+        archive, member = self.members[path]
+        real.parent.mkdir(parents=True, exist_ok=True)
+        if member[1] == 'l':
+            # Links are recreated relative to, and confined to, the workspace
+            target = self.link_target(path)
+            os.symlink(
+                    posixpath.relpath(target, posixpath.dirname(path)), real)
+            if target in self.members:
+                self.materialise(target)
+            return real
+        temporary = real.with_name(f'.{real.name}.dcheck-part')
+        with open(temporary, 'wb') as fh:
+            fh.write(self.read(path))
+        os.chmod(temporary, member[4] & 0o7777)
+        os.replace(temporary, real)
+        return real
+
+
+def get_workspace(workspace) -> VirtualWorkspace:
+    '''
+    Return a (shared) VirtualWorkspace, reloaded if its indexes changed.
+    '''
+    workspace = pathlib.Path(workspace)
+    try:
+        version = os.stat(meta_dir(workspace)).st_mtime_ns
+    except OSError:
+        version = None
+    if workspace in loaded_workspaces:
+        vfs, loaded = loaded_workspaces[workspace]
+        if loaded == version:
+            return vfs
+        vfs.close()
+    vfs = VirtualWorkspace(workspace)
+    loaded_workspaces[workspace] = (vfs, version)
+    return vfs
@@ -0,0 +1,104 @@
+'''
+DCheck Directory Watching
+
+Wait for files to appear in a directory using inotify when available, or
+else by polling.
+'''
+# Python
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import time
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+
+# Reported in place of a name when events were lost and callers must rescan
+RESCAN = ''
+
+# Header of a struct inotify_event: wd, mask, cookie, len
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class PollingWatcher:
+    '''
+    Fallback watcher which reports a (possible) change every interval.
+    '''
+    def __init__(self, path, interval=30):
+        self.path = path
+        self.interval = interval
+
+    def wait(self, timeout=None) -> list:
+        '''
+        Block for up to timeout seconds; returns a list of changed names.
+
+        Polling can not tell what changed, so an empty list is returned and
+        callers are expected to rescan the directory.
+        '''
+        time.sleep(min(self.interval, timeout or self.interval))
+        return []
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    '''
+    Report files written or moved into a directory, using inotify(7).
+    '''
+    def __init__(self, path):
+        self.path = path
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        wd = libc.inotify_add_watch(
+                self.fd, os.fsencode(path), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+
+    def wait(self, timeout=None) -> list:
+        '''
+        Block for up to timeout seconds; returns a list of changed names.
+
+        Events without a name, such as a queue overflow (IN_Q_OVERFLOW),
+        are reported as RESCAN.
+        '''
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+
+        names = []
+        buffer = os.read(self.fd, 65536)
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(
+                    buffer, offset)
+            offset += INOTIFY_EVENT.size
+            name = buffer[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW or not name:
+                names.append(RESCAN)
+            else:
+                names.append(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+def watcher(path, interval=30):
+    '''
+    Return an InotifyWatcher for path, or a PollingWatcher if unavailable.
+    '''
+    try:
+        return InotifyWatcher(path)
+    except (OSError, AttributeError) as e:
+        logging.info('Using polling watcher for %s: %s', path, e)
+        return PollingWatcher(path, interval)
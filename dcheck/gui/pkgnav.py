@@ -4,12 +4,15 @@ Package List
 Navigate list of packages to be reviewed.
 '''
 # Python
+import pathlib
+import time
 import tkinter
 import tkinter.filedialog
 import tkinter.messagebox
 import tkinter.ttk
 
 # DCheck
+import dcheck.core.config
 import dcheck.core.data
 import dcheck.core.inspect
 
@@ -28,6 +31,7 @@ class PackageSelection(tkinter.ttk.Frame):
         self.filename = tkinter.StringVar(self)
         self.directory = tkinter.StringVar(self)
         self.directory.set(dcheck.core.config.get('pending_dir'))
+        self.sort = ('name', False)
 
         # Directory information
         self.cancel = tkinter.ttk.Button(
@@ -77,7 +81,7 @@ class PackageSelection(tkinter.ttk.Frame):
 
         # Get a list of .changes files
         self.changeset = dcheck.core.inspect.list_incoming(
-                self.directory.get())
+                self.directory.get(), *self.sort)
 
         # Return early with a basic label/message if none found
         if not self.changeset:
@@ -95,6 +99,13 @@ class PackageSelection(tkinter.ttk.Frame):
         # Update status message
         self.parent.status.config(text=t('status_pkgselect'))
 
+    def sort_list(self, sort):
+        '''
+        Sort package list by a given key, reversing if already sorted by it.
+        '''
+        self.sort = (sort, sort == self.sort[0] and not self.sort[1])
+        self.update_list()
+
     def change_directory(self):
         '''
         Provide a directory selection dialog box.
@@ -111,6 +122,14 @@ class PackageSelection(tkinter.ttk.Frame):
         changesfile = self.filename.get()
         info = self.changeset.get(changesfile)
 
+        # Wait for the ingest daemon to finish with this package
+        if info['status'] in ['changes_status_queued',
+                              'changes_status_ingesting']:
+            tkinter.messagebox.showinfo(
+                    t('error_ingesting_title'),
+                    t('error_ingesting_message'))
+            return False
+
         # Extract package if not already done
         if not info['extracted']:
             if not dcheck.core.inspect.open_changes(
@@ -120,6 +139,9 @@ class PackageSelection(tkinter.ttk.Frame):
                         t('error_unpack_title'),
                         t('error_unpack_message'))
                 return False
+            dcheck.core.inspect.analyze_in_background(
+                    pathlib.Path(dcheck.core.config.get('workspace_dir'))
+                    / changesfile[:changesfile.rindex('_')])
 
         # Switch to review window
         self.winfo_toplevel().target_package.set(self.filename.get())
@@ -167,6 +189,9 @@ class PackageList(tkinter.ttk.Frame):
         # Assign translated heading to each column
         for column in columns[1:]:
             self.package_list.heading(column, text=t(column))
+        for column, sort in [('pkg_name', 'name'), ('pkg_age', 'age')]:
+            self.package_list.heading(
+                    column, command=lambda sort=sort: self.sort_list(sort))
 
         # Column display settings
         self.package_list.column('pkg_name', width=150)
@@ -177,7 +202,7 @@ class PackageList(tkinter.ttk.Frame):
         # Add each package to the list
         for changefile, info in self.changeset.items():
             file = changefile.split('_')
-            age = 'todo'
+            age = format_age(info.get('mtime'))
             status = t(info.get('status', 'changes_status_unknown'))
             row = (changefile, file[0], file[1], age, status)
             self.package_list.insert('', 'end', text=changefile, values=row)
@@ -195,6 +220,12 @@ class PackageList(tkinter.ttk.Frame):
         # Display elements
         self.scroll.grid(row=0, column=1, sticky='ns')
 
+    def sort_list(self, sort):
+        '''
+        Trigger parent.sort_list via toplevel.
+        '''
+        self.winfo_toplevel().mainframe.body.sort_list(sort)
+
     def open_package(self, event):
         '''
         Trigger parent.open_package via toplevel.
@@ -216,3 +247,16 @@ class PackageList(tkinter.ttk.Frame):
         else:
             # Disable button if we got here without selecting an item
             self.winfo_toplevel().mainframe.body.open.config(state='disabled')
+
+
+def format_age(mtime) -> str:
+    '''
+    Return a short age (e.g. 5m, 3h, 2d) of a given modification time.
+    '''
+    if mtime is None:
+        return ''
+    age = max(0, time.time() - mtime)
+    for unit, seconds in [('d', 86400), ('h', 3600), ('m', 60)]:
+        if age >= seconds:
+            return f'{int(age // seconds)}{unit}'
+    return f'{int(age)}s'
@@ -10,8 +10,14 @@ import pathlib  # TODO: This should move to the inspect module
 
 # DCheck
 import dcheck.core.config
+import dcheck.core.dep5
 # import dcheck.core.data
+import dcheck.core.inspect
+import dcheck.core.manifest
+import dcheck.core.vfs
 import dcheck.checks
+import dcheck.checks.copies
+import dcheck.checks.detect
 import dcheck.images
 
 from dcheck.i18n import t
@@ -38,6 +44,7 @@ class PackageReview(tkinter.ttk.Frame):
         # Package review "globals"
         self.winfo_toplevel().review_basepath = tkinter.StringVar(self)
         self.winfo_toplevel().review_basepath.set(workspace_dir / package)
+        self.winfo_toplevel().review_file = tkinter.StringVar(self)
 
         # Workspace container
         self.workspace = tkinter.PanedWindow(
@@ -363,14 +370,71 @@ class FileList(WorkspacePanel):
         # Add directory tree
         self.body.dirtree = tkinter.ttk.Treeview(
                 self.body, columns=None, show='tree')
-        self.add_directory(pathlib.Path(review_basepath))
+        basepath = pathlib.Path(review_basepath)
+        if manifest := dcheck.core.manifest.get_manifest(basepath):
+            self.add_manifest(basepath, manifest)
+        elif dcheck.core.vfs.has_index(basepath):
+            self.vfs = dcheck.core.vfs.get_workspace(basepath)
+            self.add_virtual(basepath)
+        else:
+            self.add_directory(basepath)
         self.body.dirtree.grid(row=0, column=0, sticky='nsew')
+        self.body.dirtree.bind('<<TreeviewSelect>>', self.select_file)
 
         # Scrollbar focus
         self.set_yscroll(self.body.dirtree)
 
+    def select_file(self, event=None):
+        '''
+        Make the selected file the one under review.
+        '''
+        selection = self.body.dirtree.selection()
+        if selection and self.body.dirtree.tag_has('file', selection[0]):
+            self.winfo_toplevel().review_file.set(selection[0])
+
+    def add_manifest(self, rootdir, manifest):
+        '''
+        Add files listed in a workspace manifest (without walking the tree).
+        '''
+        for relpath in manifest.paths:
+            parent_iid = ''
+            parts = relpath.split('/')
+            for depth in range(1, len(parts)):
+                fullpath = str(rootdir.joinpath(*parts[:depth]))
+                if not self.body.dirtree.exists(fullpath):
+                    self.body.dirtree.insert(
+                            parent_iid, 'end',
+                            iid=fullpath, text=parts[depth - 1],
+                            image=self.folder)
+                parent_iid = fullpath
+            self.body.dirtree.insert(
+                    parent_iid, 'end',
+                    iid=rootdir / relpath, text=parts[-1],
+                    image=self.file, tags=('file',))
+
+    def add_virtual(self, rootdir, relpath='', parent_iid=''):
+        '''
+        Add members of a virtual workspace without writing them to disk.
+        '''
+        for name in self.vfs.listdir(relpath):
+            member = f'{relpath}/{name}' if relpath else name
+            fullpath = rootdir / member
+            if self.vfs.isdir(member):
+                subdir = self.body.dirtree.insert(
+                        parent_iid, 'end',
+                        iid=fullpath, text=name,
+                        image=self.folder)
+                self.add_virtual(rootdir, member, subdir)
+            else:
+                self.body.dirtree.insert(
+                        parent_iid, 'end',
+                        iid=fullpath, text=name,
+                        image=self.file, tags=('file',))
+
     def add_directory(self, rootdir, parent_iid=''):
         for fullpath in sorted(rootdir.iterdir()):
+            if fullpath.name == '.dcheck':
+                continue
             if fullpath.is_dir():
                 subdir = self.body.dirtree.insert(
                         parent_iid, 'end',
@@ -378,11 +442,10 @@ class FileList(WorkspacePanel):
                         image=self.folder)
                 self.add_directory(fullpath, subdir)
             if fullpath.is_file():
-                # TODO: Should iid of file be scancode-toolkit checksum
                 self.body.dirtree.insert(
                         parent_iid, 'end',
                         iid=fullpath, text=fullpath.name,
-                        image=self.file)
+                        image=self.file, tags=('file',))
 
 
 class FileContents(WorkspacePanel):
@@ -404,8 +467,11 @@ class FileContents(WorkspacePanel):
 
         # Scrollbar focus
         self.set_yscroll(self.body.content)
-        # TODO: Get this from bind+globalString
-        self.open_file('/var/cache/dcheck/extracted/tdc_2.0-1/tdc-2.0/tdc.c')
+
+        # Follow file selection (FileList)
+        review_file = self.winfo_toplevel().review_file
+        review_file.trace_add(
+                'write', lambda *args: self.open_file(review_file.get()))
 
     def open_file(self, path):
         '''
@@ -414,9 +480,13 @@ class FileContents(WorkspacePanel):
         self.body.content.config(state='normal')
         self.body.content.delete('1.0', 'end')
 
-        # TODO: This should use the inspect module
-        with open(path, 'r') as fh:
-            self.body.content.insert('insert', fh.read())
+        try:
+            content = dcheck.core.inspect.read_file(path)
+        except OSError as e:
+            logging.error('Unable to read %s: %s', path, e)
+        else:
+            self.body.content.insert(
+                    'insert', content.decode('utf-8', errors='replace'))
         self.body.content.config(state='disabled')
 
 
@@ -430,8 +500,56 @@ class FileInfo(WorkspacePanel):
         # Set panel heading
         self.set_title(t('pane_file_info'))
 
-        # Plop stuff into the display
-        # TODO
+        # Manifest and d/copyright details of the file under review
+        self.fields = {}
+        for row, field in enumerate(
+                dcheck.core.manifest.FileInfo._fields
+                + ('license', 'copyright', 'detected', 'copies')):
+            label = tkinter.ttk.Label(self.body, text=t(f'file_info_{field}'))
+            label.grid(row=row, column=0, sticky='nw', padx=4)
+            self.fields[field] = tkinter.ttk.Label(self.body, text='')
+            self.fields[field].grid(row=row, column=1, sticky='nw')
+
+        # Follow file selection (FileList)
+        review_file = self.winfo_toplevel().review_file
+        review_file.trace_add(
+                'write', lambda *args: self.show_file(review_file.get()))
+
+    def show_file(self, path):
+        '''
+        Show manifest, d/copyright, detected license, and copies details of a
+        file.
+        '''
+        basepath = pathlib.Path(self.winfo_toplevel().review_basepath.get())
+        manifest = dcheck.core.manifest.get_manifest(basepath)
+        licenses = dcheck.core.dep5.get_licenses(basepath)
+        try:
+            relpath = str(pathlib.Path(path).relative_to(basepath))
+        except ValueError:
+            relpath = None
+        info = manifest.get(relpath) if manifest and relpath else None
+        stanza = licenses.get(relpath) if licenses and relpath else None
+        found = dcheck.checks.detect.lookup_many([info.sha256])[0] \
+            if info else None
+        copies = []
+        if info:
+            # Copies were found after ingest (see inspect.analyze_workspace)
+            seen = dcheck.checks.copies.get_copies(basepath).get(relpath)
+            copies = dcheck.checks.copies.reviewed_copies(
+                    basepath, {relpath: seen}).get(relpath, []) if seen else []
+        for field, label in self.fields.items():
+            value = getattr(info, field, getattr(stanza, field, ''))
+            if field == 'detected':
+                value = ', '.join(found['licenses'] + found['spdx']) \
+                    if found else ''
+            if field == 'copies':
+                value = '\n'.join(
+                        f'{x.package} ({x.path}, {x.similarity:.0%}, '
+                        f'{x.reviewer})'
+                        for x in copies)
+            if field == 'mode' and info:
+                value = f'{value:04o}'
+            label.config(text=value)
 
 
 class PersistentFiles(WorkspacePanel):
@@ -466,9 +584,12 @@ class PersistentFiles(WorkspacePanel):
         '''
         newtab = tkinter.Text(self.body.pages, wrap='word')
 
-        # TODO: This should use the inspect module
-        with open(self.pageroot / page, 'r') as fh:
-            newtab.insert('insert', fh.read())
+        try:
+            content = dcheck.core.inspect.read_file(self.pageroot / page)
+        except OSError as e:
+            logging.error('Unable to read %s: %s', page, e)
+        else:
+            newtab.insert('insert', content.decode('utf-8', errors='replace'))
         newtab.config(state='disabled')
 
         self.pages[page] = newtab
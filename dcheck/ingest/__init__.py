@@ -0,0 +1,3 @@
+'''
+DCheck Ingest Daemon
+'''
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+'''
+Primary entry point for the background ingest daemon.
+'''
+# DCheck
+import dcheck.core.bootstrap
+import dcheck.ingest.daemon
+
+
+def main():
+    '''
+    Watch pending_dir and prepare new uploads until interrupted.
+    '''
+    dcheck.core.bootstrap.start()
+    dcheck.ingest.daemon.IngestDaemon().run()
+
+
+if __name__ == '__main__':
+    main()
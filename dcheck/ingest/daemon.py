@@ -0,0 +1,163 @@
+'''
+Background Ingest
+
+Verify and extract new uploads in pending_dir before anyone opens them.
+Ready workspaces are then analyzed (see dcheck.core.inspect.analyze_workspace)
+one at a time, without holding up further uploads.
+'''
+# Python
+import concurrent.futures
+import logging
+import pathlib
+import time
+
+# DCheck
+import dcheck.core.config
+import dcheck.core.deb822
+import dcheck.core.incoming
+import dcheck.core.inspect
+import dcheck.core.store
+import dcheck.core.watch
+
+
+class IngestDaemon:
+    '''
+    Watch a pending directory and ingest new changes files with a pool of
+    workers, recording progress with set_ingest_status().
+    '''
+    def __init__(self, path=None, workers=None):
+        self.path = path or dcheck.core.config.get('pending_dir')
+        self.workers = workers or dcheck.core.config.get(
+                'ingest_daemon_workers')
+        self.interval = dcheck.core.config.get('ingest_poll_interval')
+        self.pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers)
+        # Analysis uses a process pool of its own (see checks.runner)
+        self.analysis = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.active = {}
+        self.listed = {}  # changes: (mtime, names of files it lists)
+        self.retry = set()
+        self.last_gc = time.monotonic()
+
+    def scan(self, arrived=()):
+        '''
+        Queue every changes file which is neither extracted nor known bad.
+        Failed uploads are retried once their changes file changes, or once
+        a file it lists arrives (names in arrived).
+        '''
+        arrived = set(arrived)
+        index = dcheck.core.incoming.get_index(self.path)
+        index.refresh()
+        for changes, info in index.page(sort='age', reverse=True):
+            if info['extracted']:
+                continue
+            listed = self.listed_files(changes, info['mtime'])
+            if changes in self.active:
+                # The running ingest may have missed the new file
+                if not arrived.isdisjoint(listed):
+                    self.retry.add(changes)
+                continue
+            status = dcheck.core.inspect.ingest_status(changes)
+            if status and status['status'] == 'failed' \
+                    and status['mtime'] == info['mtime'] \
+                    and changes not in self.retry \
+                    and arrived.isdisjoint(listed):
+                continue
+
+            logging.info('Queueing %s', changes)
+            self.retry.discard(changes)
+            dcheck.core.inspect.set_ingest_status(
+                    changes, 'queued', info['mtime'])
+            job = self.pool.submit(self.ingest, changes, info['mtime'])
+            self.active[changes] = job
+            job.add_done_callback(
+                    lambda job, changes=changes: self.active.pop(changes))
+
+    def listed_files(self, changes, mtime) -> set:
+        '''
+        Return names of the files listed in a changes file (unverified).
+        '''
+        if (known := self.listed.get(changes)) and known[0] == mtime:
+            return known[1]
+        try:
+            with open(pathlib.Path(self.path) / changes, 'r',
+                      encoding='utf-8', errors='replace') as fh:
+                data = dcheck.core.deb822.parse_one(fh)
+            names = set(data.checksums('Files').names)
+        except (OSError, ValueError):
+            names = set()
+        self.listed[changes] = (mtime, names)
+        return names
+
+    def awaited(self, names) -> bool:
+        '''
+        Return whether any of names is listed by a known changes file.
+        '''
+        return any(not listed.isdisjoint(names)
+                   for mtime, listed in list(self.listed.values()))
+
+    def ingest(self, changes, mtime) -> bool:
+        '''
+        Verify and extract a single changes file.
+        '''
+        dcheck.core.inspect.set_ingest_status(changes, 'ingesting', mtime)
+        try:
+            ready = dcheck.core.inspect.open_changes(changes, self.path)
+        except Exception:
+            logging.exception('Unable to ingest %s', changes)
+            ready = False
+        dcheck.core.inspect.set_ingest_status(
+                changes, 'ready' if ready else 'failed', mtime)
+        logging.info(
+                'Ingest of %s %s', changes, 'ready' if ready else 'failed')
+        if ready:
+            self.listed.pop(changes, None)
+            self.analysis.submit(self.analyze, changes)
+        return ready
+
+    def analyze(self, changes):
+        '''
+        Analyze the workspace of an ingested changes file.
+        '''
+        workspace_dir = pathlib.Path(dcheck.core.config.get('workspace_dir'))
+        try:
+            dcheck.core.inspect.analyze_workspace(
+                    workspace_dir / changes[:changes.rindex('_')])
+        except Exception:
+            logging.exception('Unable to analyze %s', changes)
+
+    def collect_garbage(self):
+        '''
+        Periodically remove unreferenced blobs from the workspace store.
+        '''
+        interval = dcheck.core.config.get('store_gc_interval')
+        if not interval or time.monotonic() - self.last_gc < interval:
+            return
+        self.last_gc = time.monotonic()
+        if dcheck.core.config.get('workspace_store'):
+            dcheck.core.store.gc()
+
+    def run(self):
+        '''
+        Ingest existing uploads, then wait for new ones until interrupted.
+        '''
+        watcher = dcheck.core.watch.watcher(self.path, self.interval)
+        logging.info('Watching %s with %s', self.path, type(watcher).__name__)
+        try:
+            self.scan()
+            while True:
+                names = watcher.wait(self.interval)
+                # Rescan on new changes files, lost events, periodically,
+                # and when a file a failed upload was missing arrives
+                rescan = not names or dcheck.core.watch.RESCAN in names
+                if rescan or any(map(dcheck.core.incoming.is_changes, names)) \
+                        or self.awaited(names) \
+                        or self.retry.difference(self.active):
+                    self.scan(names)
+                self.collect_garbage()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.analysis.shutdown(wait=True, cancel_futures=True)
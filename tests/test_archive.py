@@ -0,0 +1,196 @@
+'''
+Archive Tests
+'''
+# Python
+import gzip
+import lzma
+import pytest
+import random
+import shutil
+import subprocess
+import zlib
+
+# DCheck
+import dcheck.core.archive
+
+
+def sample_data(size=1 << 20):
+    '''
+    Return compressible, but not trivially compressible, test data.
+    '''
+    rng = random.Random(size)
+    words = [bytes(rng.choices(b'abcdefghij \n', k=8)) for _ in range(256)]
+    return b''.join(rng.choices(words, k=size // 8))
+
+
+def write_gz(path, data, flush_every=65536):
+    '''
+    Write data as gzip, flushing to a byte boundary every flush_every bytes
+    so it has checkpoints.
+    '''
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    with open(path, 'wb') as fh:
+        for offset in range(0, len(data), flush_every):
+            fh.write(compressor.compress(data[offset:offset + flush_every]))
+            fh.write(compressor.flush(zlib.Z_FULL_FLUSH))
+        fh.write(compressor.flush())
+
+
+def write_xz_streams(path, data, size=65536):
+    '''
+    Write data as concatenated xz streams of size bytes each.
+    '''
+    with open(path, 'wb') as fh:
+        for offset in range(0, len(data), size):
+            fh.write(lzma.compress(data[offset:offset + size]))
+
+
+def read_stream(path, checkpoints=None, spacing=65536):
+    '''
+    Return all data of decompress_stream() from a compressed file.
+    '''
+    with open(path, 'rb') as fh:
+        reader = dcheck.core.archive.decompress_stream(
+                fh, path, 4096, 2, checkpoints, spacing)
+        try:
+            return reader.read()
+        finally:
+            reader.close()
+
+
+def check_seeking(path, data, index):
+    '''
+    Read data at various offsets (forwards and backwards) through a
+    CheckpointReader.
+    '''
+    offsets = [0, len(data) // 2, 100, len(data) - 10, 70000, 700000]
+    with dcheck.core.archive.CheckpointReader(path, index) as fh:
+        for offset in offsets:
+            assert fh.seek(offset) == offset
+            assert fh.read(5000) == data[offset:offset + 5000]
+        fh.seek(len(data) + 10)
+        assert fh.read(10) == b''
+
+
+def test_checkpoints_gz(tmp_path):
+    '''
+    Checkpoints of a gzip file allow seeking without reading from the start.
+    '''
+    data = sample_data()
+    path = tmp_path / 'test.tar.gz'
+    write_gz(path, data)
+    index = dcheck.core.archive.checkpoints(path, 65536)
+    assert index['format'] == 'gz'
+    assert index['size'] == len(data)
+    assert len(index['points']) >= len(data) // 65536 - 1
+    check_seeking(path, data, index)
+
+
+def test_checkpoints_xz(tmp_path):
+    '''
+    Checkpoints of concatenated xz streams allow seeking.
+    '''
+    data = sample_data()
+    path = tmp_path / 'test.tar.xz'
+    write_xz_streams(path, data)
+    index = dcheck.core.archive.checkpoints(path, 65536)
+    assert index['format'] == 'xz'
+    assert index['size'] == len(data)
+    assert len(index['points']) == len(data) // 65536
+    check_seeking(path, data, index)
+
+
+def test_checkpoints_while_reading(tmp_path):
+    '''
+    Checkpoints recorded while decompressing match those of a separate pass.
+    '''
+    data = sample_data()
+    write_gz(tmp_path / 'test.tar.gz', data)
+    write_xz_streams(tmp_path / 'test.tar.xz', data)
+    for name in ['test.tar.gz', 'test.tar.xz']:
+        found = {}
+        assert read_stream(tmp_path / name, found) == data
+        assert found == dcheck.core.archive.checkpoints(
+                tmp_path / name, 65536)
+
+
+def test_checkpoints_unsupported(tmp_path):
+    '''
+    Files with several gzip members or no checkpoints have none recorded.
+    '''
+    data = sample_data()
+    path = tmp_path / 'test.tar.gz'
+    path.write_bytes(gzip.compress(data) + gzip.compress(data))
+    found = {}
+    assert read_stream(path, found) == data * 2
+    assert found == {}
+    assert dcheck.core.archive.checkpoints(path) is None
+    assert dcheck.core.archive.checkpoints(tmp_path / 'test.tar') is None
+
+
+@pytest.mark.skipif(not shutil.which('xz'), reason='xz is not installed')
+def test_multi_block_xz(tmp_path):
+    '''
+    Blocks of multi-threaded xz files are decompressed in parallel.
+    '''
+    data = sample_data(1 << 21)
+    path = tmp_path / 'test.tar.xz'
+    with open(path, 'wb') as fh:
+        subprocess.run(['xz', '-T2', '--block-size=65536', '-c'],
+                       input=data + data, stdout=fh, check=True)
+    found = {}
+    assert read_stream(path, found) == data + data
+    assert len(found['points']) == len(data) * 2 // 65536
+    check_seeking(path, data + data, found)
+
+
+@pytest.mark.skipif(not shutil.which('xz'), reason='xz is not installed')
+def test_xz_block_size_missing(tmp_path):
+    '''
+    Later xz blocks without their compressed size are decompressed
+    sequentially.
+    '''
+    data = sample_data(1 << 20)
+    compressed = bytearray(subprocess.run(
+            ['xz', '-T2', '--block-size=65536', '-c'],
+            input=data, capture_output=True, check=True).stdout)
+    # Drop the compressed size from the headers of the third and fourth
+    # blocks, padding the header to the same length
+    offset = 12
+    for number in range(4):
+        length = (compressed[offset] + 1) * 4
+        header = compressed[offset:offset + length - 4]
+        size, pos = dcheck.core.archive.read_vli(header, 2)
+        if number >= 2:
+            header = header[:1] + bytes([header[1] & ~0x40]) + header[pos:]
+            header = header.ljust(length - 4, b'\0')
+            compressed[offset:offset + length] = header + zlib.crc32(
+                    header).to_bytes(4, 'little')
+        offset += (length + size + 3 & ~3) + 8
+    path = tmp_path / 'test.tar.xz'
+    path.write_bytes(compressed)
+    found = {}
+    assert read_stream(path, found) == data
+    assert len(found['points']) == len(data) // 65536
+    check_seeking(path, data, found)
+
+
+def test_multi_frame_zstd(tmp_path):
+    '''
+    Frames of multi-frame zstd files are decompressed in parallel, and a
+    frame too large to read whole sequentially.
+    '''
+    zstandard = pytest.importorskip('zstandard')
+    data = sample_data(1 << 21)
+    compressor = zstandard.ZstdCompressor()
+    path = tmp_path / 'test.tar.zst'
+    path.write_bytes(b''.join(
+            compressor.compress(data[x:x + 65536])
+            for x in range(0, len(data), 65536)))
+    assert read_stream(path) == data
+    frame_size = dcheck.core.archive.MAX_FRAME_SIZE
+    try:
+        dcheck.core.archive.MAX_FRAME_SIZE = 4096
+        assert read_stream(path) == data
+    finally:
+        dcheck.core.archive.MAX_FRAME_SIZE = frame_size
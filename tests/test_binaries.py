@@ -0,0 +1,72 @@
+'''
+Binary File Check Tests
+'''
+# Python
+import gzip
+import pytest
+import random
+
+# DCheck
+import dcheck.checks.binaries
+from dcheck.checks.binaries import identify
+
+
+@pytest.mark.parametrize('head, kind', [
+        (b'\x7fELF\x02\x01\x01', 'elf'),
+        (b'MZ\x90\x00', 'pe'),
+        (b'\xcf\xfa\xed\xfe\x07\x00\x00\x01', 'mach-o'),
+        (b'\xca\xfe\xba\xbe\x00\x00\x00\x34', 'java-class'),
+        (b'\xca\xfe\xba\xbe\x00\x00\x00\x02', 'mach-o'),
+        (b'\x00asm\x01\x00\x00\x00', 'wasm'),
+        (b'dex\n035\x00', 'dex'),
+        (b'!<arch>\n', 'ar'),
+        (b'wOF2\x00\x01\x00\x00', 'font'),
+        (b'OTTO\x00\x0a\x00\x80', 'font'),
+        (b'\x00\x01\x00\x00\x00\x0a\x00\x80\x00\x03', 'font'),
+        (b'\x00\x01\x00\x00\x00\x0a\x00\x40\x00\x03', None),
+        (b'PK\x03\x04' + b'\x00' * 26 + b'META-INF/MANIFEST.MF', 'jar'),
+        (b'PK\x03\x04' + b'\x00' * 26 + b'AndroidManifest.xml', 'jar'),
+        (b'PK\x03\x04' + b'\x00' * 26 + b'docs/readme.txt', 'container'),
+        (b'\x89PNG\r\n\x1a\n', 'container'),
+        (b'OggS\x00\x02', 'container'),
+        (b'\x1f\x8b\x08\x00', 'container'),
+        (b'\x00\x00\x00\x00', None),
+        (b'', None),
+        ])
+def test_identify(head, kind):
+    '''
+    Binary data is identified by its leading bytes.
+    '''
+    assert identify(head) == kind
+
+
+def test_profile():
+    '''
+    Profiles tell compiled code, opaque data, and minified text apart.
+    '''
+    rng = random.Random(1)
+    profile = dcheck.checks.binaries.profile
+    assert profile(b'\x7fELF' + bytes(1000)).kind == 'elf'
+    assert profile(rng.randbytes(1 << 16)).kind == 'opaque'
+    assert profile(gzip.compress(rng.randbytes(1 << 16))).kind \
+        == 'container'
+    assert profile(bytes(range(4)) * 1000).kind is None
+
+    text = profile(b'int main(void)\n{\n    return 0;\n}\n' * 100)
+    assert not text.binary
+    assert text.line_length < dcheck.checks.binaries.MINIFIED_LINE_LENGTH
+    minified = profile(b'var a=1;function b(c){return c+a}' * 1000)
+    assert minified.line_length >= dcheck.checks.binaries.MINIFIED_LINE_LENGTH
+    assert minified.whitespace <= dcheck.checks.binaries.MINIFIED_WHITESPACE
+
+
+def test_sample():
+    '''
+    Large data is sampled in evenly spread blocks, including its end.
+    '''
+    data = random.Random(2).randbytes(4096 + 15 * 10000)
+    blocks = dcheck.checks.binaries.sample(data, 4096, 16)
+    assert len(blocks) == 16
+    assert all(len(x) == 4096 for x in blocks)
+    assert blocks[0] == data[:4096] and blocks[-1] == data[-4096:]
+    assert dcheck.checks.binaries.sample(b'small', 4096, 16) == [b'small']
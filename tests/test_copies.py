@@ -0,0 +1,151 @@
+'''
+Embedded Code Copy Tests
+'''
+# Python
+import pytest
+import random
+
+# DCheck
+import dcheck.checks
+import dcheck.checks.copies
+import dcheck.core.config
+import dcheck.core.data
+import dcheck.core.manifest
+import dcheck.i18n
+from dcheck.checks.copies import Copy, fingerprint, similarity
+
+
+def sample_code(lines=400, seed=1) -> bytes:
+    '''
+    Return C-like source code with distinct lines.
+    '''
+    rng = random.Random(seed)
+    return b''.join(
+            b'    value_%d = compute(%d, %d);\n'
+            % (number, rng.randrange(1000), rng.randrange(1000))
+            for number in range(lines))
+
+
+@pytest.fixture
+def workspace_dir(tmp_path, monkeypatch):
+    '''
+    Return a workspace_dir with data kept in sqlite and checklists loaded.
+    '''
+    dcheck.core.config.loaded_configuration = dict(
+            dcheck.core.config.DEFAULT_CONFIGURATION,
+            workspace_dir=str(tmp_path), data_engine='sqlite',
+            sqlite_path=str(tmp_path / 'data.sqlite'), check_workers=1)
+    monkeypatch.setenv('DEBEMAIL', 'reviewer@example.org')
+    dcheck.i18n.load_translations('en')
+    dcheck.core.data.connect_storage()
+    dcheck.checks.load_checklists()
+    return tmp_path
+
+
+def add_workspace(workspace_dir, name, files):
+    '''
+    Create a workspace of {path: data} with a .changes, and build its
+    manifest.
+    '''
+    workspace = workspace_dir / name
+    files = dict(files, **{f'source/{name}_source.changes': b'Source: x\n'})
+    for path, data in files.items():
+        (workspace / path).parent.mkdir(parents=True, exist_ok=True)
+        (workspace / path).write_bytes(data)
+    dcheck.core.manifest.save(
+            workspace, dcheck.core.manifest.build(workspace, workers=1))
+    return workspace
+
+
+def test_fingerprint_normalized():
+    '''
+    Whitespace and comments do not change fingerprints.
+    '''
+    code = sample_code()
+    reformatted = b'/* Vendored copy\n * of a library\n */\n' \
+        + code.replace(b'    ', b'\t').replace(b' = ', b'=') \
+        .replace(b';\n', b'; // note\n', 10)
+    assert fingerprint(code, 'a.c') == fingerprint(reformatted, 'a.c')
+    assert len(fingerprint(code, 'a.c')) > 10
+
+
+def test_fingerprint_syntax():
+    '''
+    Comment markers of one language are code in another.
+    '''
+    code = b'int f(int *p, int n) {\n    *p = n;\n    --n;\n' \
+        b'#if X\n    return n;\n#endif\n}\n'
+    for line in [b'    *p = n;\n', b'    --n;\n', b'#if X\n']:
+        assert fingerprint(code, 'f.c') \
+            != fingerprint(code.replace(line, b''), 'f.c')
+    assert fingerprint(b'x = 1\n# note\n', 'f.py') \
+        == fingerprint(b'x = 1\n', 'f.py')
+    assert fingerprint(b'select 1;\n-- note\n', 'f.sql') \
+        == fingerprint(b'select 1;\n', 'f.sql')
+    assert fingerprint(b'# Title\ntext\n', 'README.md') \
+        != fingerprint(b'text\n', 'README.md')
+
+
+def test_similarity():
+    '''
+    Small edits keep most chunks; unrelated code shares none.
+    '''
+    code = sample_code()
+    lines = code.splitlines(keepends=True)
+    edited = b''.join(lines[:200] + [b'    patched();\n'] + lines[200:])
+    assert similarity(fingerprint(code, 'a.c'), fingerprint(code, 'a.c')) \
+        == 1.0
+    assert similarity(
+            fingerprint(code, 'a.c'), fingerprint(edited, 'a.c')) >= 0.8
+    assert similarity(
+            fingerprint(code, 'a.c'),
+            fingerprint(sample_code(seed=2), 'a.c')) < 0.1
+    assert similarity([], fingerprint(code, 'a.c')) == 0.0
+
+
+def test_reviewed_copies(workspace_dir):
+    '''
+    Only copies whose contents were approved in another package count as
+    already reviewed.
+    '''
+    code = sample_code()
+    lines = code.splitlines(keepends=True)
+    edited = b''.join(lines[:200] + [b'    patched();\n'] + lines[200:])
+    alpha = add_workspace(workspace_dir, 'alpha_1.0-1', {
+            'src/lib.c': code, 'src/other.c': sample_code(seed=2)})
+    assert dcheck.checks.copies.index_workspace(alpha) == 2
+    check = dcheck.checks.get_check('binaries.PrebuiltBinary')(alpha)
+    check.change_file('src/lib.c')
+    check.save_review('approve')
+
+    beta = add_workspace(workspace_dir, 'beta_2.0-1', {
+            'vendor/lib.c': edited, 'vendor/other.c': sample_code(seed=2)})
+    copies = dcheck.checks.copies.find_copies(beta)
+    assert sorted(copies) == ['vendor/lib.c', 'vendor/other.c']
+    dcheck.checks.copies.save_copies(beta, copies)
+    assert dcheck.checks.copies.get_copies(beta) == copies
+
+    reviewed = dcheck.checks.copies.reviewed_copies(beta, copies)
+    assert list(reviewed) == ['vendor/lib.c']
+    found, = reviewed['vendor/lib.c']
+    assert (found.package, found.path, found.reviewer) \
+        == ('alpha_1.0-1', 'src/lib.c', 'reviewer@example.org')
+    assert found.similarity >= 0.8
+    assert dcheck.checks.copies.reviewed_copies(alpha, {'src/lib.c': [
+            Copy('alpha_1.0-1', 'src/lib.c', 1.0, copies[
+                'vendor/lib.c'][0].sha256)]}) == {}
+
+
+def test_index_counts(workspace_dir, monkeypatch):
+    '''
+    Places beyond MAX_SEEN are neither kept nor counted as indexed.
+    '''
+    monkeypatch.setattr(dcheck.checks.copies, 'MAX_SEEN', 1)
+    files = {'src/lib.c': sample_code()}
+    alpha = add_workspace(workspace_dir, 'alpha_1.0-1', files)
+    beta = add_workspace(workspace_dir, 'beta_1.0-1', files)
+    assert dcheck.checks.copies.index_workspace(alpha) == 1
+    assert dcheck.checks.copies.index_workspace(alpha) == 0
+    assert dcheck.checks.copies.index_workspace(beta) == 0
+    assert [x.package for x in dcheck.checks.copies.find_copies(beta)[
+            'src/lib.c']] == ['alpha_1.0-1']
@@ -0,0 +1,86 @@
+'''
+Ingest Daemon Tests
+'''
+# Python
+import concurrent.futures
+import os
+import pytest
+
+# DCheck
+import dcheck.core.config
+import dcheck.core.data
+import dcheck.core.inspect
+import dcheck.ingest.daemon
+
+CHANGES = 'foo_1.0-1_source.changes'
+
+CHANGES_DATA = '''\
+Format: 1.8
+Source: foo
+Version: 1.0-1
+Files:
+ d41d8cd98f00b204e9800998ecf8427e 0 devel optional foo_1.0-1.dsc
+ d41d8cd98f00b204e9800998ecf8427e 0 devel optional foo_1.0.orig.tar.xz
+'''
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    '''
+    Return an IngestDaemon for a pending directory with one failed upload,
+    recording ingests instead of running them in the pool.
+    '''
+    pending = tmp_path / 'pending'
+    pending.mkdir()
+    (pending / CHANGES).write_text(CHANGES_DATA)
+    dcheck.core.config.loaded_configuration = dict(
+            dcheck.core.config.DEFAULT_CONFIGURATION,
+            workspace_dir=str(tmp_path / 'workspace'),
+            pending_dir=str(pending), data_engine='sqlite',
+            sqlite_path=str(tmp_path / 'data.sqlite'))
+    (tmp_path / 'workspace').mkdir()
+    dcheck.core.data.connect_storage()
+
+    daemon = dcheck.ingest.daemon.IngestDaemon()
+    daemon.ingested = []
+
+    def ingest(changes, mtime):
+        daemon.ingested.append(changes)
+        dcheck.core.inspect.set_ingest_status(changes, 'failed', mtime)
+        return False
+
+    def submit(function, *args):
+        job = concurrent.futures.Future()
+        job.set_result(function(*args))
+        return job
+    monkeypatch.setattr(daemon, 'ingest', ingest)
+    monkeypatch.setattr(daemon.pool, 'submit', submit)
+    yield daemon
+    daemon.pool.shutdown()
+    daemon.analysis.shutdown()
+
+
+def test_failed_not_retried(daemon):
+    daemon.scan()
+    daemon.scan(['unrelated.tar.xz'])
+    assert daemon.ingested == [CHANGES]
+    assert not daemon.awaited(['unrelated.tar.xz'])
+
+
+def test_retry_on_listed_file(daemon):
+    daemon.scan()
+    assert daemon.awaited(['foo_1.0.orig.tar.xz'])
+    daemon.scan(['foo_1.0.orig.tar.xz'])
+    assert daemon.ingested == [CHANGES, CHANGES]
+
+
+def test_retry_after_active(daemon):
+    daemon.active[CHANGES] = concurrent.futures.Future()
+    daemon.scan(['foo_1.0-1.dsc'])
+    assert daemon.retry == {CHANGES}
+    del daemon.active[CHANGES]
+    mtime = os.stat(os.path.join(daemon.path, CHANGES)).st_mtime
+    dcheck.core.inspect.set_ingest_status(CHANGES, 'failed', mtime)
+    daemon.scan()
+    assert daemon.ingested == [CHANGES]
+    assert not daemon.retry
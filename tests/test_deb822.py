@@ -0,0 +1,96 @@
+'''
+deb822 Parser Tests
+'''
+# Python
+import pytest
+
+# DCheck
+import dcheck.core.deb822
+
+CHANGES = '''\
+-----BEGIN PGP SIGNED MESSAGE-----
+Hash: SHA256
+
+- Format: 1.8
+Source: tdc
+Version: 2.0-1
+Description:
+ tdc - test package
+# Comments are skipped
+Changes:
+ tdc (2.0-1) unstable; urgency=medium
+ .
+   * Initial release.
+Checksums-Sha256:
+ %s 10 tdc_2.0-1.dsc
+ %s 2000 tdc_2.0.orig.tar.gz
+Files:
+ %s 10 misc optional tdc_2.0-1.dsc
+
+-----BEGIN PGP SIGNATURE-----
+
+iQIzBAEBCAAdFiEE
+-----END PGP SIGNATURE-----
+''' % ('ab' * 32, 'cd' * 32, 'ef' * 16)
+
+
+def test_clearsigned():
+    '''
+    PGP armor is removed and dash-escaped lines are restored.
+    '''
+    paragraphs = dcheck.core.deb822.parse(CHANGES)
+    assert len(paragraphs) == 1
+    changes = paragraphs[0]
+    assert changes['Source'] == 'tdc'
+    assert changes.lines('Changes') == [
+            'tdc (2.0-1) unstable; urgency=medium', '', '* Initial release.']
+    assert changes['Format'] == '1.8'
+    assert 'Hash' not in changes
+    assert 'iQIzBAEBCAAdFiEE' not in ''.join(changes.raw)
+
+
+def test_fields():
+    '''
+    Field names are case-insensitive and keep their original spelling.
+    '''
+    changes = dcheck.core.deb822.parse_one(CHANGES.encode())
+    assert changes['version'] == changes['VERSION'] == '2.0-1'
+    assert changes['Description'] == '\ntdc - test package'
+    assert list(changes) == [
+            'Format', 'Source', 'Version', 'Description', 'Changes',
+            'Checksums-Sha256', 'Files']
+    assert changes.get('Missing') is None
+    with pytest.raises(KeyError):
+        changes['Missing']
+
+
+def test_checksums():
+    '''
+    Checksum fields are parsed into compact lists; extra columns are kept.
+    '''
+    changes = dcheck.core.deb822.parse_one(CHANGES)
+    checksums = changes.checksums('Checksums-Sha256')
+    assert list(checksums) == [
+            ('ab' * 32, 10, 'tdc_2.0-1.dsc'),
+            ('cd' * 32, 2000, 'tdc_2.0.orig.tar.gz')]
+    files = changes.checksums('Files')
+    assert files[0] == ('ef' * 16, 10, 'tdc_2.0-1.dsc')
+    assert files.extra == [('misc', 'optional')]
+    assert len(changes.checksums('Checksums-Sha1')) == 0
+    with pytest.raises(ValueError):
+        dcheck.core.deb822.ChecksumList([f'{"ab" * 32} 10'])
+    with pytest.raises(ValueError):
+        dcheck.core.deb822.ChecksumList([
+                f'{"ab" * 32} 10 a', f'{"ab" * 20} 10 b'])
+
+
+def test_paragraphs():
+    '''
+    Paragraphs are split by blank lines, and empty data has none.
+    '''
+    data = 'Source: tdc\n\n\n\nPackage: tdc\nArchitecture: any\n\n'
+    paragraphs = dcheck.core.deb822.parse(data)
+    assert [dict(x) for x in paragraphs] == [
+            {'Source': 'tdc'}, {'Package': 'tdc', 'Architecture': 'any'}]
+    assert dcheck.core.deb822.parse('') == []
+    assert len(dcheck.core.deb822.parse_one('')) == 0
@@ -0,0 +1,156 @@
+'''
+DEP-5 Tests
+'''
+# Python
+import pytest
+
+# DCheck
+import dcheck.core.config
+import dcheck.core.dep5
+import dcheck.core.manifest
+
+COPYRIGHT = '''\
+Format: https://www.debian.org/doc/packaging-manuals/copyright-format/1.0/
+
+Files: *
+Copyright: 2020 Upstream Author
+License: MIT
+
+Files: src/*
+Copyright: 2021 Upstream Author
+License: GPL-2+
+
+Files: debian/*
+Copyright: 2022 Debian Maintainer
+License: GPL-2+
+'''
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    '''
+    Return an empty workspace with a default configuration.
+    '''
+    dcheck.core.config.loaded_configuration = dict(
+            dcheck.core.config.DEFAULT_CONFIGURATION,
+            workspace_dir=str(tmp_path))
+    path = tmp_path / 'tdc_2.0-1'
+    (path / 'source').mkdir(parents=True)
+    (path / 'source' / 'tdc_2.0-1.dsc').write_text('Source: tdc\n')
+    return path
+
+
+def add_files(workspace, paths):
+    '''
+    Create files in a workspace, then build its manifest.
+    '''
+    for path, data in paths.items():
+        (workspace / path).parent.mkdir(parents=True, exist_ok=True)
+        (workspace / path).write_text(data)
+    dcheck.core.manifest.save(
+            workspace, dcheck.core.manifest.build(workspace, workers=1))
+
+
+def license_of(licenses, path):
+    stanza = licenses.get(path)
+    return stanza.license if stanza else None
+
+
+def test_non_native_layout(workspace):
+    '''
+    Upstream files below the orig tarball directory match relative to it,
+    and d/copyright from the Debian archive is found at the top.
+    '''
+    add_files(workspace, {
+            'tdc-2.0/README': 'readme',
+            'tdc-2.0/src/x.c': 'int x;',
+            'debian/copyright': COPYRIGHT,
+            'debian/rules': 'rules'})
+    licenses = dcheck.core.dep5.get_licenses(workspace)
+    assert (licenses.root, licenses.copyright_path) \
+        == ('tdc-2.0/', 'debian/copyright')
+    assert license_of(licenses, 'tdc-2.0/README') == 'MIT'
+    assert license_of(licenses, 'tdc-2.0/src/x.c') == 'GPL-2+'
+    assert license_of(licenses, 'debian/rules') == 'GPL-2+'
+    assert license_of(licenses, 'source/tdc_2.0-1.dsc') is None
+
+
+def test_native_layout(workspace):
+    '''
+    Native packages have d/copyright within the source tree directory.
+    '''
+    add_files(workspace, {
+            'tdc-2.0/README': 'readme',
+            'tdc-2.0/src/x.c': 'int x;',
+            'tdc-2.0/debian/copyright': COPYRIGHT})
+    licenses = dcheck.core.dep5.get_licenses(workspace)
+    assert licenses.root == 'tdc-2.0/'
+    assert license_of(licenses, 'tdc-2.0/src/x.c') == 'GPL-2+'
+    assert license_of(licenses, 'tdc-2.0/debian/copyright') == 'GPL-2+'
+    assert license_of(licenses, 'tdc-2.0/README') == 'MIT'
+
+
+def test_no_top_level_directory(workspace):
+    '''
+    Tarballs without a top-level directory unpack into the workspace.
+    '''
+    add_files(workspace, {
+            'README': 'readme',
+            'src/x.c': 'int x;',
+            'debian/copyright': COPYRIGHT})
+    licenses = dcheck.core.dep5.get_licenses(workspace)
+    assert licenses.root == ''
+    assert license_of(licenses, 'src/x.c') == 'GPL-2+'
+    assert license_of(licenses, 'README') == 'MIT'
+
+
+def test_no_copyright(workspace):
+    '''
+    Workspaces without a machine-readable d/copyright have no license map.
+    '''
+    add_files(workspace, {'tdc-2.0/README': 'readme'})
+    assert dcheck.core.dep5.get_licenses(workspace) is None
+    add_files(workspace, {'debian/copyright': 'Not machine-readable\n'})
+    assert dcheck.core.dep5.get_licenses(workspace) is None
+
+
+def test_matcher():
+    '''
+    The last stanza with a matching pattern wins, whichever kind of
+    pattern matches.
+    '''
+    matcher = dcheck.core.dep5.Matcher([
+            ['*'],
+            ['src/*', 'lib/*.c'],
+            ['*.h', './docs/manual.txt'],
+            ['src/vendor/*', 'data/?.bin'],
+            ['src/vendor/keep.c'],
+            ])
+    assert matcher.match('README') == 0
+    assert matcher.match('src/main.c') == 1
+    assert matcher.match('src/main.h') == 2
+    assert matcher.match('lib/x/y.c') == 1
+    assert matcher.match('lib/y.h') == 2
+    assert matcher.match('docs/manual.txt') == 2
+    assert matcher.match('src/vendor/x.h') == 3
+    assert matcher.match('src/vendor/keep.c') == 4
+    assert matcher.match('data/a.bin') == 3
+    assert matcher.match('data/ab.bin') == 0
+
+
+def test_matcher_literals():
+    '''
+    Patterns without wildcards only match themselves, and escaped
+    wildcards are literal.
+    '''
+    matcher = dcheck.core.dep5.Matcher([
+            ['README', 'odd\\*name', 'x.y+z'], ['src/*/test/*']])
+    assert matcher.match('README') == 0
+    assert matcher.match('README.md') is None
+    assert matcher.match('odd*name') == 0
+    assert matcher.match('oddname') is None
+    assert matcher.match('x.y+z') == 0
+    assert matcher.match('xzy+z') is None
+    assert matcher.match('src/a/b/test/c') == 1
+    assert matcher.match('src/test/c') is None
+    assert dcheck.core.dep5.Matcher([]).match('README') is None
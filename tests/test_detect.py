@@ -0,0 +1,65 @@
+'''
+License Detection Tests
+'''
+# DCheck
+import dcheck.checks.detect
+from dcheck.checks.detect import Automaton
+
+
+def naive_search(patterns, data) -> set:
+    return {number for number, x in enumerate(patterns) if x in data}
+
+
+def test_automaton():
+    '''
+    All patterns found in data are reported, including overlapping
+    patterns and patterns within other patterns.
+    '''
+    patterns = [b'he', b'she', b'his', b'hers', b'e', b'xyz']
+    automaton = Automaton(patterns)
+    for data in [b'ushers', b'this is his', b'hhhhe', b'', b'xy', b'xyzxyz']:
+        assert automaton.search(data) == naive_search(patterns, data)
+
+
+def test_automaton_bytes():
+    '''
+    Matching works on any bytes, including bytes outside ASCII.
+    '''
+    patterns = [b'\x00\xff', b'\xff\xff\x00', 'café'.encode()]
+    automaton = Automaton(patterns)
+    assert automaton.search(b'\xff\xff\x00\xff') == {0, 1}
+    assert automaton.search(memoryview('un café'.encode())) == {2}
+    assert automaton.search(b'cafe') == set()
+
+
+def test_detect():
+    '''
+    Notices are found across line breaks and comment markers, along with
+    SPDX identifiers and copyright statements.
+    '''
+    data = (b'/*\n'
+            b' * Copyright (C) 2020 Upstream Author\n'
+            b' * SPDX-License-Identifier: GPL-2.0-or-later\n'
+            b' *\n'
+            b' * This program is free software; you can redistribute it\n'
+            b' * under the terms of the GNU General Public License as\n'
+            b' * published by the Free Software Foundation; either version 2\n'
+            b' * of the License, or (at your option) any later version.\n'
+            b' */\n')
+    found = dcheck.checks.detect.detect(data, 65536)
+    assert found['licenses'] == ['GPL', 'GPL-2+']
+    assert found['spdx'] == ['GPL-2.0-or-later']
+    assert found['copyright'] == ['Copyright (C) 2020 Upstream Author']
+    assert dcheck.checks.detect.detect(b'int x;\n', 65536) == {
+            'licenses': [], 'spdx': [], 'copyright': []}
+
+
+def test_windows():
+    '''
+    Only the head and tail of large files are scanned.
+    '''
+    data = b'MIT' + b'x' * 100 + b'end'
+    assert dcheck.checks.detect.windows(data, 0) == [data]
+    assert dcheck.checks.detect.windows(data, 60) == [data]
+    assert dcheck.checks.detect.windows(data, 10) == [
+            data[:10], data[-10:]]
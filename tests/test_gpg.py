@@ -0,0 +1,71 @@
+'''
+Signature Verification Tests
+'''
+# Python
+import pytest
+
+# DCheck
+import dcheck.core.config
+import dcheck.core.data
+import dcheck.core.gpg
+
+
+class Unsigned:
+    '''
+    Result of gnupg verify_file() for a file without a valid signature.
+    '''
+    valid = False
+    fingerprint = None
+    data = b''
+    username = None
+    status = 'no signature found'
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    '''
+    Return a SignatureService for an empty GPG home, counting verifications.
+    '''
+    dcheck.core.config.loaded_configuration = dict(
+            dcheck.core.config.DEFAULT_CONFIGURATION, data_engine='sqlite',
+            sqlite_path=str(tmp_path / 'data.sqlite'))
+    dcheck.core.data.connect_storage()
+    (tmp_path / 'home').mkdir(mode=0o700)
+    service = dcheck.core.gpg.SignatureService(
+            gnupghome=str(tmp_path / 'home'))
+    service.verified = []
+    monkeypatch.setattr(
+            service.gpg, 'verify_file',
+            lambda *args, **kwargs: service.verified.append(1) or Unsigned())
+    return service
+
+
+def test_keyboxd_version(tmp_path):
+    home = tmp_path / 'home'
+    (home / 'public-keys.d').mkdir(parents=True)
+    versions = {dcheck.core.gpg.keyring_version(home)}
+    for name in ['pubring.db', 'pubring.db-wal']:
+        (home / 'public-keys.d' / name).write_bytes(b'keys')
+        versions.add(dcheck.core.gpg.keyring_version(home))
+    assert len(versions) == 3
+
+
+def test_memo_bounded(service, tmp_path, monkeypatch):
+    monkeypatch.setattr(dcheck.core.gpg, 'memo_size', 3)
+    paths = []
+    for number in range(5):
+        paths.append(tmp_path / f'{number}.dsc')
+        paths[-1].write_text(str(number))
+        service.verify(paths[-1])
+    assert len(service.memo) == 3
+    assert len(service.verified) == 5
+
+    # Recently used results are kept, the least recently used dropped
+    service.verify(paths[2])
+    service.verify(paths[0])
+    assert len(service.verified) == 6
+    service.verify(paths[2])
+    service.verify(paths[4])
+    assert len(service.verified) == 6
+    service.verify(paths[3])
+    assert len(service.verified) == 7
@@ -0,0 +1,93 @@
+'''
+Package Inspection Tests
+'''
+# Python
+import hashlib
+import pytest
+import threading
+import time
+
+# DCheck
+import dcheck.core.config
+import dcheck.core.inspect
+
+
+@pytest.fixture(autouse=True)
+def configuration():
+    '''
+    Use the default configuration without the verification cache.
+    '''
+    dcheck.core.config.loaded_configuration = dict(
+            dcheck.core.config.DEFAULT_CONFIGURATION, verify_cache=False)
+
+
+def test_verify_checksums(tmp_path):
+    '''
+    Every file is verified and reported by path.
+    '''
+    files = []
+    for number in range(6):
+        path = tmp_path / f'file{number}'
+        path.write_bytes(b'data %d' % number)
+        files.append((path, hashlib.sha256(b'data %d' % number).hexdigest()))
+    files.append((tmp_path / 'file0', hashlib.md5(b'data 0').hexdigest()))
+    results = dcheck.core.inspect.verify_checksums(files, workers=3)
+    assert results == {path: True for path, checksum in files}
+
+    files[2] = (files[2][0], hashlib.sha256(b'other').hexdigest())
+    results = dcheck.core.inspect.verify_checksums(files[2:3], workers=3)
+    assert results == {files[2][0]: False}
+
+
+def test_bounded_pool():
+    '''
+    No more than workers files are handled at once.
+    '''
+    lock = threading.Lock()
+    active = []
+    most = []
+
+    def verify(path, expected, cancel):
+        with lock:
+            active.append(path)
+            most.append(len(active))
+        time.sleep(0.01)
+        with lock:
+            active.remove(path)
+        return True
+
+    files = [(f'file{x}', None) for x in range(20)]
+    results = dcheck.core.inspect._verify_concurrently(verify, files, 3)
+    assert results == {f'file{x}': True for x in range(20)}
+    assert max(most) == 3
+
+
+def test_cancel_on_mismatch():
+    '''
+    The first mismatch stops running workers and skips queued files; the
+    mismatch is reported as False and skipped files as None.
+    '''
+    started = []
+    stopped = []
+
+    def verify(path, expected, cancel):
+        started.append(path)
+        if path == 'bad':
+            time.sleep(0.05)
+            return False
+        if not cancel.wait(10):
+            return True
+        stopped.append(path)
+        return None
+
+    files = [('slow0', None), ('slow1', None), ('bad', None)] \
+        + [(f'queued{x}', None) for x in range(10)]
+    begin = time.monotonic()
+    results = dcheck.core.inspect._verify_concurrently(verify, files, 3)
+    assert time.monotonic() - begin < 5
+    assert results['bad'] is False
+    # Workers may pick up a queued file before it is cancelled, but stop
+    assert {'slow0', 'slow1'} <= set(stopped)
+    assert all(results[path] is None for path, expected in files
+               if path != 'bad')
+    assert len(started) < len(files)
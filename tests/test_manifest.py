@@ -0,0 +1,69 @@
+'''
+Manifest Tests
+'''
+# Python
+import hashlib
+
+# DCheck
+import dcheck.core.manifest
+
+
+def make_manifest(files):
+    '''
+    Return a Manifest of {path: (data, mode)}.
+    '''
+    manifest = dcheck.core.manifest.Manifest()
+    for path, (data, mode) in files.items():
+        manifest.append(path, len(data), mode, hashlib.sha256(data).digest(),
+                        False, 'text/plain', 'us-ascii')
+    return manifest
+
+
+def test_diff():
+    '''
+    Files are compared by path, contents, and mode.
+    '''
+    old = make_manifest({
+            'README': (b'readme', 0o644),
+            'src/a.c': (b'int a;', 0o644),
+            'src/b.c': (b'int b;', 0o644),
+            'configure': (b'#!/bin/sh', 0o644),
+            'removed': (b'gone', 0o644)})
+    new = make_manifest({
+            'added': (b'new', 0o644),
+            'configure': (b'#!/bin/sh', 0o755),
+            'src/b.c': (b'int b = 1;', 0o644),
+            'src/a.c': (b'int a;', 0o644),
+            'README': (b'readme', 0o644)})
+    changes = dcheck.core.manifest.diff(old, new)
+    assert changes.added == ['added']
+    assert sorted(changes.modified) == ['configure', 'src/b.c']
+    assert changes.removed == ['removed']
+    assert sorted(changes.unchanged) == ['README', 'src/a.c']
+
+
+def test_diff_identical():
+    '''
+    A manifest has no differences to itself.
+    '''
+    manifest = make_manifest({'README': (b'readme', 0o644)})
+    changes = dcheck.core.manifest.diff(manifest, manifest)
+    assert changes == ([], [], [], ['README'])
+
+
+def test_round_trip():
+    '''
+    Manifests are rebuilt from their saved form, including single byte ids
+    of manifests saved before ids were widened.
+    '''
+    manifest = make_manifest({
+            'README': (b'readme', 0o644), 'x.c': (b'int x;', 0o755)})
+    saved = manifest.to_dict()
+    loaded = dcheck.core.manifest.Manifest.from_dict(saved)
+    assert list(loaded) == list(manifest)
+
+    legacy = dict(saved, mime_ids='AAA=', encoding_ids='AAA=')
+    del legacy['id_type']
+    loaded = dcheck.core.manifest.Manifest.from_dict(legacy)
+    assert list(loaded) == list(manifest)
+    assert loaded.mime_ids.typecode == 'H'
@@ -0,0 +1,52 @@
+'''
+Review State Tests
+'''
+# DCheck
+from dcheck.core.reviews import APPROVED, REJECTED, UNREVIEWED, ReviewState
+
+
+def test_pack():
+    '''
+    States are packed four to a byte and read back by position.
+    '''
+    state = ReviewState(10)
+    assert len(state.data) == 3
+    assert list(state.items()) == []
+    state.set(0, APPROVED)
+    state.set(3, REJECTED)
+    state.set(4, APPROVED)
+    state.set(9, REJECTED)
+    assert [state.get(x) for x in range(10)] == [
+            APPROVED, UNREVIEWED, UNREVIEWED, REJECTED, APPROVED,
+            UNREVIEWED, UNREVIEWED, UNREVIEWED, UNREVIEWED, REJECTED]
+    assert list(state.items()) == [
+            (0, APPROVED), (3, REJECTED), (4, APPROVED), (9, REJECTED)]
+
+
+def test_overwrite():
+    '''
+    Setting a state replaces the previous state without touching others.
+    '''
+    state = ReviewState(4)
+    for number in range(4):
+        state.set(number, REJECTED)
+    state.set(2, APPROVED)
+    state.set(1, UNREVIEWED)
+    assert list(state.items()) == [(0, REJECTED), (2, APPROVED), (3, REJECTED)]
+
+
+def test_encode():
+    '''
+    Encoded states decode to the same states, resized to the manifest.
+    '''
+    state = ReviewState(7)
+    state.set(6, APPROVED)
+    decoded = ReviewState.decode(7, state.encode())
+    assert list(decoded.items()) == [(6, APPROVED)]
+    assert decoded.data == state.data
+
+    # Manifests which grew or shrank since the state was saved
+    assert list(ReviewState.decode(20, state.encode()).items()) \
+        == [(6, APPROVED)]
+    assert len(ReviewState.decode(20, state.encode()).data) == 5
+    assert list(ReviewState.decode(4, state.encode()).items()) == []
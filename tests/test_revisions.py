@@ -0,0 +1,46 @@
+'''
+Package Revision Tests
+'''
+# Python
+import pytest
+
+# DCheck
+from dcheck.core.revisions import compare_versions
+
+
+@pytest.mark.parametrize('older, newer', [
+        ('1.0', '1.1'),
+        ('1.0-1', '1.0-2'),
+        ('1.0-9', '1.0-10'),
+        ('1.9', '1.10'),
+        ('1.0~rc1', '1.0'),
+        ('1.0~rc1', '1.0~rc2'),
+        ('1.0~~', '1.0~'),
+        ('1.0', '1.0a'),
+        ('1.0a', '1.0+'),
+        ('1.0', '1.0.1'),
+        ('2.0', '1:1.0'),
+        ('1:2.0-1', '2:0.1-1'),
+        ('1.0-1', '1.0-1+b1'),
+        ('1.0-1~bpo1', '1.0-1'),
+        ('1.2-3-4', '1.2-3-5'),
+        ])
+def test_order(older, newer):
+    '''
+    Versions sort as dpkg sorts them.
+    '''
+    assert compare_versions(older, newer) < 0
+    assert compare_versions(newer, older) > 0
+
+
+@pytest.mark.parametrize('first, second', [
+        ('1.0', '1.0'),
+        ('0:1.0', '1.0'),
+        ('1.0', '1.0-'),
+        ('1.01', '1.1'),
+        ])
+def test_equal(first, second):
+    '''
+    Versions which only differ in notation are equal.
+    '''
+    assert compare_versions(first, second) == 0
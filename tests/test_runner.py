@@ -0,0 +1,154 @@
+'''
+Check Runner Tests
+'''
+# Python
+import pytest
+
+# DCheck
+import dcheck.checks
+import dcheck.checks.cache
+import dcheck.checks.runner
+import dcheck.core.config
+import dcheck.core.data
+import dcheck.core.manifest
+import dcheck.i18n
+
+CHECK = 'binaries.PrebuiltBinary'
+UNCACHED = 'integrity.ReadableCopyright'
+ELF = b'\x7fELF\x02\x01\x01' + bytes(1000)
+
+
+@pytest.fixture
+def workspace_dir(tmp_path):
+    '''
+    Return a workspace_dir with data kept in sqlite and checklists loaded.
+    '''
+    dcheck.core.config.loaded_configuration = dict(
+            dcheck.core.config.DEFAULT_CONFIGURATION,
+            workspace_dir=str(tmp_path), data_engine='sqlite',
+            sqlite_path=str(tmp_path / 'data.sqlite'), check_workers=2)
+    dcheck.i18n.load_translations('en')
+    dcheck.core.data.connect_storage()
+    dcheck.checks.load_checklists()
+    return tmp_path
+
+
+def add_workspace(workspace_dir, name, files):
+    '''
+    Create a workspace of {path: data} and build its manifest.
+    '''
+    workspace = workspace_dir / name
+    for path, data in files.items():
+        (workspace / path).parent.mkdir(parents=True, exist_ok=True)
+        (workspace / path).write_bytes(data)
+    dcheck.core.manifest.save(
+            workspace, dcheck.core.manifest.build(workspace, workers=1))
+    return workspace
+
+
+def recheck(workspace, file_checks=(CHECK,)) -> dict:
+    '''
+    Return {filename: result} of recheck() of a workspace for one check,
+    or {(check_id, filename): result} for several, making sure each file is
+    reported once per check.
+    '''
+    results = list(dcheck.checks.runner.recheck(
+            workspace, package_checks=[], file_checks=list(file_checks)))
+    assert len(results) == len({x[:2] for x in results})
+    if len(file_checks) == 1:
+        return {filename: result for check_id, filename, result in results}
+    return {(check_id, filename): result
+            for check_id, filename, result in results}
+
+
+def poison(workspace, filename, result):
+    '''
+    Replace the cached result of a workspace file.
+    '''
+    sha256 = dcheck.core.manifest.get_manifest(workspace).get(filename).sha256
+    dcheck.checks.cache.store(dcheck.checks.get_check(CHECK), sha256, result)
+
+
+def test_recheck(workspace_dir):
+    '''
+    Only added and modified files are checked again; unchanged files take
+    their results from the cache unless they were never checked.
+    '''
+    old = add_workspace(workspace_dir, 'tdc_1.0-1', {
+            'README': b'readme', 'a.c': b'int a;', 'b.c': b'int b;',
+            'blob': ELF})
+    assert recheck(old) == {
+            'README': True, 'a.c': True, 'b.c': True, 'blob': False}
+
+    new = add_workspace(workspace_dir, 'tdc_1.0-2', {
+            'README': b'readme, changed', 'a.c': b'int a;', 'b.c': b'int b;',
+            'blob': ELF, 'added': ELF})
+    poison(new, 'a.c', False)
+    dcheck.core.data.delete(dcheck.checks.cache.cache_key(
+            dcheck.checks.get_check(CHECK),
+            dcheck.core.manifest.get_manifest(new).get('b.c').sha256))
+    assert recheck(new) == {
+            'README': True, 'a.c': False, 'b.c': True, 'blob': False,
+            'added': False}
+
+
+def test_recheck_uncached(workspace_dir):
+    '''
+    Without a previous revision or with caching disabled, all files are
+    checked.
+    '''
+    old = add_workspace(workspace_dir, 'tdc_1.0-1', {
+            'a.c': b'int a;', 'blob': ELF})
+    assert recheck(old) == {'a.c': True, 'blob': False}
+    new = add_workspace(workspace_dir, 'tdc_1.0-2', {
+            'a.c': b'int a;', 'blob': ELF})
+    poison(new, 'a.c', False)
+    assert recheck(new) == {'a.c': False, 'blob': False}
+
+    dcheck.core.config.loaded_configuration['result_cache'] = False
+    assert recheck(new) == {'a.c': True, 'blob': False}
+
+
+def test_recheck_mixed(workspace_dir, monkeypatch):
+    '''
+    Checks which are not cached run against every file, while cached checks
+    still only run against changed files.
+    '''
+    checks = (CHECK, UNCACHED)
+    calls = []
+    run = dcheck.checks.runner.run
+
+    def recording_run(workspace, package_checks, file_checks, files=None,
+                      *args, **kwargs):
+        calls.append((file_checks, files))
+        return run(workspace, package_checks, file_checks, files, *args,
+                   **kwargs)
+
+    monkeypatch.setattr(dcheck.checks.runner, 'run', recording_run)
+    old = add_workspace(workspace_dir, 'tdc_1.0-1', {
+            'a.c': b'int a;', 'blob': ELF})
+    recheck(old, checks)
+    new = add_workspace(workspace_dir, 'tdc_1.0-2', {
+            'a.c': b'int a;', 'blob': ELF, 'b.c': b'int b;'})
+    poison(new, 'a.c', False)
+    # Without d/copyright no file is covered by it
+    assert recheck(new, checks) == {
+            (CHECK, 'a.c'): False, (CHECK, 'blob'): False,
+            (CHECK, 'b.c'): True, (UNCACHED, 'a.c'): False,
+            (UNCACHED, 'blob'): False, (UNCACHED, 'b.c'): False}
+    assert calls[-2:] == [([CHECK], ['b.c']), ([UNCACHED], None)]
+
+
+def test_hit_rate(workspace_dir):
+    '''
+    Lookups of checks which are not cached do not count as misses.
+    '''
+    stats = dcheck.checks.cache.stats
+    before = (stats.hits, stats.misses)
+    digests = ['00' * 32, '11' * 32]
+    dcheck.checks.cache.lookup_many(dcheck.checks.get_check(UNCACHED), digests)
+    assert (stats.hits, stats.misses) == before
+    check = dcheck.checks.get_check(CHECK)
+    dcheck.checks.cache.store(check, digests[0], True)
+    assert dcheck.checks.cache.lookup_many(check, digests) == [True, None]
+    assert (stats.hits, stats.misses) == (before[0] + 1, before[1] + 1)